@@ -1,20 +1,119 @@
 import os
 import abc
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 import yaml
 import re
+from search.config import BASE_DIR
+from search.models import Document
+from search.utils import generate_document_id, heading_title, markdown_anchor, text_language
 
 class BaseExtractor(abc.ABC):
-    def __init__(self, output_dir="database"):
+    """Parses the cases of one submodule.
+
+    `parse()` reads each source file once and yields normalized case
+    records, which feed both the database/ entries (`extract()`) and the
+    search index (`search.indexer`).
+    """
+
+    # Submodule directory, relative to the repository root
+    submodule = ""
+    # database/ subdirectory the entries are written to
+    subdir = ""
+    # README the cases are parsed from, first existing name wins; None for
+    # submodules whose cases are read from cases/*/case.yml
+    readme_names: Optional[Tuple[str, ...]] = ("README.md",)
+
+    def __init__(self, output_dir="database", base_dir: Path = BASE_DIR):
         self.output_dir = output_dir
+        self.base_dir = Path(base_dir)
+        self._anchors: Dict[str, int] = {}
 
     @abc.abstractmethod
-    def extract(self):
-        """Perform extraction and return count of items extracted."""
+    def parse(self) -> Iterator[Tuple[str, Document]]:
+        """Yield (filename_hint, document) for each case."""
         pass
 
+    def extract(self):
+        """Write every parsed case as a database entry. Returns the count."""
+        count = 0
+        for filename_hint, document in self.parse():
+            self.save_document(document, filename_hint, self.subdir)
+            count += 1
+        return count
+
+    @property
+    def root(self) -> Path:
+        return self.base_dir / self.submodule
+
+    def readme_path(self) -> Optional[Path]:
+        for name in self.readme_names or ():
+            path = self.root / name
+            if path.exists():
+                return path
+        return None
+
+    def source_paths(self) -> List[Path]:
+        """Files and directories parse() reads, so the indexer skips them."""
+        if self.readme_names is None:
+            return [self.root / "cases"]
+        path = self.readme_path()
+        return [path] if path else []
+
+    def read_readme(self) -> Optional[Tuple[Path, str]]:
+        """The README path and content, or None (with a warning) if missing."""
+        readme_path = self.readme_path()
+        if readme_path is None:
+            print(f"Warning: No README found in {self.root}.")
+            return None
+        self._anchors = {}
+        with open(readme_path, 'r', encoding='utf-8') as f:
+            return readme_path, f.read()
+
+    def readme_case(
+        self,
+        readme_path: Path,
+        heading: str,
+        metadata: Dict,
+        description: str,
+        prompt: str,
+        image_path: str = ""
+    ) -> Document:
+        """Build the record of a case parsed from a README section.
+
+        `heading` is the case's heading line, which gives the document its
+        anchor and id. `image_path` is the image as referenced in the
+        README; a relative path that exists in the submodule becomes the
+        document's local image, so the indexer makes thumbnails of it.
+        """
+        document = Document.from_entry(metadata, description, prompt)
+        path = str(readme_path.relative_to(self.base_dir))
+        title = heading_title(heading)
+        document.anchor = markdown_anchor(title, self._anchors)
+        document.id = generate_document_id(self.submodule, "case", f"{path}#{document.anchor}")
+        document.type = "case"
+        document.submodule = self.submodule
+        document.path = path
+        document.language = text_language(document.title)
+        if image_path and not image_path.startswith("http"):
+            local_image = (readme_path.parent / image_path).resolve()
+            if local_image.is_file() and self.root.resolve() in local_image.parents:
+                document.image = str(local_image.relative_to(self.base_dir.resolve()))
+        return document
+
+    @staticmethod
+    def heading_at(content: str, position: int) -> str:
+        """The line of `content` starting at `position`."""
+        end = content.find("\n", position)
+        return content[position:end if end != -1 else len(content)]
+
     def save_entry(self, metadata: Dict, description: str, prompt: str, filename_hint: str, subdir: str = ""):
         """Helper to save a database entry."""
+        document = Document.from_entry(metadata, description, prompt)
+        return self.save_document(document, filename_hint, subdir)
+
+    def save_document(self, document: Document, filename_hint: str, subdir: str = ""):
+        """Write a document as a database entry."""
         # Clean filename
         slug = re.sub(r'[^a-zA-Z0-9]', '-', filename_hint.lower()).strip('-')
         slug = re.sub(r'-+', '-', slug)
@@ -35,12 +134,12 @@ class BaseExtractor(abc.ABC):
         # Let's overwrite to ensure updates propagate.
         
         content = "---\n"
-        content += yaml.dump(metadata, sort_keys=False)
+        content += yaml.dump(document.entry_metadata(), sort_keys=False)
         content += "---\n\n"
         content += "## Description\n"
-        content += f"{description}\n\n"
+        content += f"{document.description}\n\n"
         content += "## Prompt\n"
-        content += f"{prompt}\n"
+        content += f"{document.prompt}\n"
         
         with open(filepath, 'w') as f:
             f.write(content)
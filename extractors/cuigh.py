@@ -1,18 +1,15 @@
-import os
 import re
 from . import BaseExtractor
 
 class CuighExtractor(BaseExtractor):
-    def extract(self):
-        readme_path = "awesome-nano-banana-prompts-cuigh/README.md"
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-nano-banana-prompts-cuigh"
+    subdir = "cuigh"
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Regex to find cases
         # Pattern: ### Case \d+: [Title](Link) (by [Author](Link))
@@ -28,6 +25,7 @@ class CuighExtractor(BaseExtractor):
             
             # Extract Image
             image_url = ""
+            img_path = ""
             img_match = re.search(r'<img src="(.*?)"', body)
             if img_match:
                 img_path = img_match.group(1)
@@ -52,7 +50,5 @@ class CuighExtractor(BaseExtractor):
                 "tags": ["cuigh", f"case-{case_id}"]
             }
             
-            self.save_entry(metadata, description, prompt, f"cuigh-{case_id}-{title}", subdir="cuigh")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"cuigh-{case_id}-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, img_path)
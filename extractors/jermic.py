@@ -1,21 +1,16 @@
-import os
 import re
 from . import BaseExtractor
 
 class JermicExtractor(BaseExtractor):
-    def extract(self):
-        base_dir = "awesome-aiart-pics-prompts-Jermic"
-        readme_path = os.path.join(base_dir, "README.md")
-        if os.path.exists(os.path.join(base_dir, "README_EN.md")):
-            readme_path = os.path.join(base_dir, "README_EN.md")
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-aiart-pics-prompts-Jermic"
+    subdir = "jermic"
+    readme_names = ("README_EN.md", "README.md")
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Logic for Jermic:
         # Structure sections: ## Author Name
@@ -33,6 +28,7 @@ class JermicExtractor(BaseExtractor):
             try:
                 # Extract Title
                 title_match = re.search(r'### \[(.*?)\]\(.*?\)', section)
+                heading = self.heading_at(section, title_match.start()) if title_match else ""
                 title = title_match.group(1) if title_match else "Unknown Title"
                 
                 # Extract Author from line like **作者**: [@Name](link) or **Author**:
@@ -67,12 +63,11 @@ class JermicExtractor(BaseExtractor):
                     "tags": ["jermic", "aiart"]
                 }
                 
-                # Use title for filename but clean it
-                self.save_entry(metadata, description, prompt, f"jermic-{title}", subdir="jermic")
-                count += 1
-                
+                document = self.readme_case(readme_path, heading, metadata, description, prompt, image_url)
+
             except Exception as e:
                 print(f"Skipping section due to error: {e}")
                 continue
-            
-        return count
+
+            # Use title for filename but clean it
+            yield f"jermic-{title}", document
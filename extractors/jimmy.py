@@ -1,19 +1,15 @@
-import os
 import re
 from . import BaseExtractor
 
 class JimmyLvExtractor(BaseExtractor):
-    def extract(self):
-        base_dir = "awesome-nano-banana-JimmyLv"
-        readme_path = os.path.join(base_dir, "README.md")
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-nano-banana-JimmyLv"
+    subdir = "jimmylv"
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Logic for JimmyLv:
         # Headers: ### Case X: Title (by @Author)
@@ -49,7 +45,5 @@ class JimmyLvExtractor(BaseExtractor):
                 "tags": ["jimmylv", f"case-{case_id}"]
             }
             
-            self.save_entry(metadata, description, prompt, f"jimmylv-{case_id}-{title}", subdir="jimmylv")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"jimmylv-{case_id}-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, image_url)
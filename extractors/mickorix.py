@@ -1,21 +1,16 @@
-import os
 import re
 from . import BaseExtractor
 
 class MickorixExtractor(BaseExtractor):
-    def extract(self):
-        base_dir = "awesome-nanobanana-images-mickorix"
-        readme_path = os.path.join(base_dir, "README.md")
-        if os.path.exists(os.path.join(base_dir, "README_en.md")):
-            readme_path = os.path.join(base_dir, "README_en.md")
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-nanobanana-images-mickorix"
+    subdir = "mickorix"
+    readme_names = ("README_en.md", "README.md")
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Logic for Mickorix:
         # ### 例 X: [Title](link) (by [@Author](link))
@@ -45,6 +40,7 @@ class MickorixExtractor(BaseExtractor):
             
             # Extract Image (Output column)
             image_url = ""
+            img_path = ""
             # Often images are in local 'images/' folder. Need to prefix repo URL.
             img_match = re.search(r'<img src="(.*?)"', body)
             if img_match:
@@ -69,7 +65,5 @@ class MickorixExtractor(BaseExtractor):
                 "tags": ["mickorix", f"case-{case_id}"]
             }
             
-            self.save_entry(metadata, description, prompt, f"mickorix-{case_id}-{title}", subdir="mickorix")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"mickorix-{case_id}-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, img_path)
@@ -1,25 +1,23 @@
 import os
 import re
-import yaml
-import glob
 import json
+from search.cases import extract_case_data
 from . import BaseExtractor
 
 class SuperMakerExtractor(BaseExtractor):
-    def extract(self):
-        repo_path = "awesome-nano-banana-Super-Maker-AI"
-        readme_path = os.path.join(repo_path, "README.md")
-        if not os.path.exists(readme_path):
-            return 0
-            
-        with open(readme_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    submodule = "awesome-nano-banana-Super-Maker-AI"
+    subdir = "super_maker"
+
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Regex to find cases
         case_pattern = r'### Case \d+: (.*?) \(by (.*?)\)'
         
         matches = list(re.finditer(case_pattern, content))
-        count = 0
         
         for i, match in enumerate(matches):
             title = match.group(1).strip()
@@ -55,61 +53,41 @@ class SuperMakerExtractor(BaseExtractor):
                     "tags": ["SuperMaker"]
                 }
                 
-                self.save_entry(metadata, description="", prompt=prompt_text, filename_hint=title, subdir="super_maker")
-                count += 1
-                
-        return count
+                heading = self.heading_at(content, match.start())
+                yield title, self.readme_case(readme_path, heading, metadata, "", prompt_text, img_match.group(1) if img_match else "")
 
 class MusetExtractor(BaseExtractor):
-    def extract(self):
-        cases_dir = "awesome-nano-banana-pro-muset-ai/cases"
-        case_files = glob.glob(os.path.join(cases_dir, "*", "case.yml"))
+    submodule = "awesome-nano-banana-pro-muset-ai"
+    subdir = "muset_ai"
+    readme_names = None
+
+    def parse(self):
+        cases_dir = self.root / "cases"
+        case_files = sorted(cases_dir.glob(os.path.join("*", "case.yml")))
         
-        count = 0
         for case_file in case_files:
-            try:
-                with open(case_file, 'r', encoding='utf-8') as f:
-                    case_data = yaml.safe_load(f)
-                    
-                dir_path = os.path.dirname(case_file)
-                attr_file = os.path.join(dir_path, "ATTRIBUTION.yml")
-                
-                author = "Unknown"
-                if os.path.exists(attr_file):
-                    with open(attr_file, 'r', encoding='utf-8') as f:
-                        attr_data = yaml.safe_load(f)
-                        if attr_data:
-                            author = attr_data.get('prompt_author', 'Unknown')
-                
-                title = case_data.get('title', 'Untitled')
-                prompt = case_data.get('prompt', '')
-                
-                if isinstance(prompt, str):
-                    metadata = {
-                        "title": title,
-                        "author": author,
-                        "repo_url": "https://github.com/muset-ai/awesome-nano-banana-pro-muset-ai",
-                        "tags": ["MusetAI"]
-                    }
-                    self.save_entry(metadata, description="", prompt=prompt.strip(), filename_hint=title, subdir="muset_ai")
-                    count += 1
-            except Exception:
+            # Same parser as the search indexer, so both sinks see the same case
+            document = extract_case_data(case_file.parent, self.submodule)
+            if document is None:
                 continue
-                
-        return count
+            
+            document.title = document.title or "Untitled"
+            document.prompt = document.prompt.strip()
+            document.repo_url = "https://github.com/muset-ai/awesome-nano-banana-pro-muset-ai"
+            document.tags = ["MusetAI"]
+            yield document.title, document
 
 class YouMindExtractor(BaseExtractor):
-    def extract(self):
-        repo_path = "awesome-nano-banana-pro-prompts-YouMind-OpenLab"
-        readme_path = os.path.join(repo_path, "README.md")
-        if not os.path.exists(readme_path):
-            return 0
-            
-        with open(readme_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    submodule = "awesome-nano-banana-pro-prompts-YouMind-OpenLab"
+    subdir = "youmind"
+
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
             
         matches = list(re.finditer(r'### No\. \d+: (.*)', content))
-        count = 0
         
         for i, match in enumerate(matches):
             title = match.group(1).strip()
@@ -134,7 +112,5 @@ class YouMindExtractor(BaseExtractor):
                     "tags": ["YouMind"]
                 }
                 
-                self.save_entry(metadata, description="", prompt=prompt_text, filename_hint=title, subdir="youmind")
-                count += 1
-                
-        return count
+                heading = self.heading_at(content, match.start())
+                yield title, self.readme_case(readme_path, heading, metadata, "", prompt_text)
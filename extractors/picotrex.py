@@ -1,21 +1,16 @@
-import os
 import re
 from . import BaseExtractor
 
 class PicoTrexExtractor(BaseExtractor):
-    def extract(self):
-        base_dir = "Awesome-Nano-Banana-images-PicoTrex"
-        readme_path = os.path.join(base_dir, "README.md")
-        if os.path.exists(os.path.join(base_dir, "README_en.md")):
-            readme_path = os.path.join(base_dir, "README_en.md")
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "Awesome-Nano-Banana-images-PicoTrex"
+    subdir = "picotrex"
+    readme_names = ("README_en.md", "README.md")
 
-        with open(readme_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Logic for PicoTrex:
         # Almost identical to Mickorix
@@ -40,6 +35,7 @@ class PicoTrexExtractor(BaseExtractor):
             
             # Extract Image
             image_url = ""
+            img_path = ""
             img_match = re.search(r'<img src="(.*?)"', body)
             if img_match:
                 img_path = img_match.group(1)
@@ -63,7 +59,5 @@ class PicoTrexExtractor(BaseExtractor):
                 "tags": ["picotrex", f"case-{case_id}"]
             }
             
-            self.save_entry(metadata, description, prompt, f"picotrex-{case_id}-{title}", subdir="picotrex")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"picotrex-{case_id}-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, img_path)
@@ -0,0 +1,79 @@
+"""One parse pass over the submodules, fanned out to several sinks.
+
+Each extractor parses its sources once; every case record it yields goes
+to each sink: DatabaseSink writes the database/ entries, SearchSink
+collects the documents for Meilisearch.
+"""
+
+from typing import Dict, Iterable, List, Optional
+from search.models import Document
+from . import BaseExtractor
+from .cuigh import CuighExtractor
+from .hilda import HildaExtractor
+from .jermic import JermicExtractor
+from .jimmy import JimmyLvExtractor
+from .mickorix import MickorixExtractor
+from .new_extractors import SuperMakerExtractor, MusetExtractor, YouMindExtractor
+from .picotrex import PicoTrexExtractor
+from .zerolu import ZeroLuExtractor, MurattasdemirExtractor
+
+# Source names (as accepted by `manage_db.py extract --source`) and their
+# extractors, in extraction order
+EXTRACTORS = {
+    "hilda": HildaExtractor,
+    "cuigh": CuighExtractor,
+    "jermic": JermicExtractor,
+    "jimmy": JimmyLvExtractor,
+    "mickorix": MickorixExtractor,
+    "picotrex": PicoTrexExtractor,
+    "zerolu": ZeroLuExtractor,
+    "murattasdemir": MurattasdemirExtractor,
+    "supermaker": SuperMakerExtractor,
+    "muset": MusetExtractor,
+    "youmind": YouMindExtractor,
+}
+
+
+def extractor_for(submodule_path: str, output_dir: str = "database") -> Optional[BaseExtractor]:
+    """The extractor of a submodule, or None if it has none."""
+    for extractor_class in EXTRACTORS.values():
+        if extractor_class.submodule == submodule_path:
+            return extractor_class(output_dir=output_dir)
+    return None
+
+
+class DatabaseSink:
+    """Writes case records as database/ entries."""
+
+    def __init__(self):
+        self.written = 0
+
+    def add(self, extractor: BaseExtractor, filename_hint: str, document: Document) -> None:
+        extractor.save_document(document, filename_hint, extractor.subdir)
+        self.written += 1
+
+
+class SearchSink:
+    """Collects case records as search documents."""
+
+    def __init__(self, documents: Optional[List[Document]] = None):
+        self.documents = documents if documents is not None else []
+
+    def add(self, extractor: BaseExtractor, filename_hint: str, document: Document) -> None:
+        self.documents.append(document)
+
+
+def run_extractor(extractor: BaseExtractor, sinks: Iterable) -> int:
+    """Parse one extractor's sources and send every record to each sink."""
+    count = 0
+    for filename_hint, document in extractor.parse():
+        for sink in sinks:
+            sink.add(extractor, filename_hint, document)
+        count += 1
+    return count
+
+
+def run_extractors(names: Iterable[str], sinks: Iterable, output_dir: str = "database") -> Dict[str, int]:
+    """Run the named extractors into the sinks. Returns records per source."""
+    sinks = list(sinks)
+    return {name: run_extractor(EXTRACTORS[name](output_dir=output_dir), sinks) for name in names}
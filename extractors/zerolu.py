@@ -1,18 +1,15 @@
-import os
 import re
 from . import BaseExtractor
 
 class ZeroLuExtractor(BaseExtractor):
-    def extract(self):
-        readme_path = "awesome-nanobanana-pro-ZeroLu/README.md"
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-nanobanana-pro-ZeroLu"
+    subdir = "zerolu"
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
 
         # Logic for ZeroLu:
         # ### 1.1. Title
@@ -29,6 +26,7 @@ class ZeroLuExtractor(BaseExtractor):
             
             # Extract Image
             image_url = ""
+            img_path = ""
             img_match = re.search(r'<img .*?src="(.*?)"', body)
             if img_match:
                 img_path = img_match.group(1)
@@ -59,22 +57,18 @@ class ZeroLuExtractor(BaseExtractor):
                 "tags": ["zerolu"]
             }
             
-            self.save_entry(metadata, description, prompt, f"zerolu-{title}", subdir="zerolu")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"zerolu-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, img_path)
 
 class MurattasdemirExtractor(BaseExtractor):
-    def extract(self):
-        readme_path = "awesome-nanobanana-pro-murattasdemir/README.md"
-        count = 0
-        
-        if not os.path.exists(readme_path):
-             print(f"Warning: File {readme_path} not found.")
-             return 0
+    submodule = "awesome-nanobanana-pro-murattasdemir"
+    subdir = "murattasdemir"
 
-        with open(readme_path, 'r') as f:
-            content = f.read()
+    def parse(self):
+        readme = self.read_readme()
+        if readme is None:
+            return
+        readme_path, content = readme
             
         # Logic is very similar to ZeroLu
         case_pattern = re.compile(r'### \d+\.\d+\. (.*?)\n(.*?)(?=### |\Z)', re.DOTALL)
@@ -84,6 +78,7 @@ class MurattasdemirExtractor(BaseExtractor):
             body = match.group(2)
             
             image_url = ""
+            img_path = ""
             img_match = re.search(r'<img .*?src="(.*?)"', body)
             if img_match:
                 img_path = img_match.group(1)
@@ -112,7 +107,5 @@ class MurattasdemirExtractor(BaseExtractor):
                 "tags": ["murattasdemir"]
             }
             
-            self.save_entry(metadata, description, prompt, f"murattasdemir-{title}", subdir="murattasdemir")
-            count += 1
-            
-        return count
+            heading = self.heading_at(content, match.start())
+            yield f"murattasdemir-{title}", self.readme_case(readme_path, heading, metadata, description, prompt, img_path)
@@ -5,19 +5,37 @@ import click
 import yaml
 import re
 import json
+import sqlite3
+import errno
+import gzip
+import io
+import threading
+import email.utils
 import http.server
-import socketserver
 import webbrowser
-from extractors.hilda import HildaExtractor
-from extractors.cuigh import CuighExtractor
-from extractors.jermic import JermicExtractor
-from extractors.jimmy import JimmyLvExtractor
-from extractors.mickorix import MickorixExtractor
-from extractors.picotrex import PicoTrexExtractor
-from extractors.zerolu import ZeroLuExtractor, MurattasdemirExtractor
-from extractors.new_extractors import SuperMakerExtractor, MusetExtractor, YouMindExtractor
+from collections import OrderedDict
+from extractors.pipeline import EXTRACTORS, DatabaseSink, run_extractor
+from search.dedup import assign_duplicate_groups
+from search.profiling import Profiler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 DATABASE_DIR = "database"
+SEARCH_INDEX_FILE = "search_index.json"
+SEARCH_INDEX_GRAM = 3
+SEARCH_DB_FILE = "search.db"
+SEARCH_DB_VERSION = 3
+PACKS_DIR = "packs"
+PACK_SIZE = 24  # Matches the viewer's default page size
+
+# Static server settings
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_MAX_BYTES = 8 * 1024 * 1024
+COMPRESS_CACHE_ENTRIES = 512
 
 def parse_frontmatter(content):
     """
@@ -35,6 +53,276 @@ def parse_frontmatter(content):
             return None, content
     return None, content
 
+def parse_entry_body(body):
+    """
+    Splits an entry body into its Description and Prompt sections.
+    Returns (description, prompt)
+    """
+    description = ""
+    prompt = ""
+
+    desc_match = re.search(r'## Description\s+(.*?)(?=## Prompt|\Z)', body, re.DOTALL | re.IGNORECASE)
+    if desc_match:
+        description = desc_match.group(1).strip()
+
+    prompt_match = re.search(r'## Prompt\s+(.*)\Z', body, re.DOTALL | re.IGNORECASE)
+    if prompt_match:
+        prompt = prompt_match.group(1).strip()
+
+    return description, prompt
+
+# Runs of Chinese, Japanese and Korean characters, which unicode61 would
+# otherwise index as one token per run
+CJK_RUN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+')
+
+def cjk_bigrams(run):
+    """
+    Overlapping bigrams of a CJK run, plus its last character so that every
+    character starts a token: '一只猫' -> ['一只', '只猫', '猫'].
+    """
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+def segment_cjk(text):
+    """Splits the CJK runs of text into bigram tokens for the FTS5 index."""
+    if not text:
+        return text
+    return CJK_RUN.sub(lambda match: ' ' + ' '.join(cjk_bigrams(match.group(0))) + ' ', text)
+
+def open_search_db(create=True):
+    """
+    Opens the SQLite full-text database next to index.json.
+    Returns None if it does not exist or is outdated (and create is False)
+    or if this SQLite build lacks FTS5. Without create, the database is
+    opened read-only and its schema is left alone.
+    """
+    db_path = os.path.join(DATABASE_DIR, SEARCH_DB_FILE)
+    if not create:
+        if not os.path.exists(db_path):
+            return None
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == SEARCH_DB_VERSION:
+                conn.row_factory = sqlite3.Row
+                return conn
+        except sqlite3.Error:
+            pass
+        conn.close()
+        return None
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    # Used by the triggers that keep entries_fts in sync
+    conn.create_function('segment_cjk', 1, segment_cjk, deterministic=True)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SEARCH_DB_VERSION:
+            conn.executescript("""
+                DROP TABLE IF EXISTS entries_fts;
+                DROP TABLE IF EXISTS entries;
+            """)
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                title TEXT,
+                author TEXT,
+                tags TEXT,
+                description TEXT,
+                prompt TEXT,
+                duplicate_group TEXT
+            );
+            -- Contentless: the index holds segment_cjk() of the entries columns
+            CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                title, author, tags, description, prompt,
+                content='',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+            );
+            CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                INSERT INTO entries_fts(rowid, title, author, tags, description, prompt)
+                VALUES (new.id, segment_cjk(new.title), segment_cjk(new.author), segment_cjk(new.tags), segment_cjk(new.description), segment_cjk(new.prompt));
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                INSERT INTO entries_fts(entries_fts, rowid, title, author, tags, description, prompt)
+                VALUES ('delete', old.id, segment_cjk(old.title), segment_cjk(old.author), segment_cjk(old.tags), segment_cjk(old.description), segment_cjk(old.prompt));
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_au
+            AFTER UPDATE OF title, author, tags, description, prompt ON entries BEGIN
+                INSERT INTO entries_fts(entries_fts, rowid, title, author, tags, description, prompt)
+                VALUES ('delete', old.id, segment_cjk(old.title), segment_cjk(old.author), segment_cjk(old.tags), segment_cjk(old.description), segment_cjk(old.prompt));
+                INSERT INTO entries_fts(rowid, title, author, tags, description, prompt)
+                VALUES (new.id, segment_cjk(new.title), segment_cjk(new.author), segment_cjk(new.tags), segment_cjk(new.description), segment_cjk(new.prompt));
+            END;
+            PRAGMA user_version = {SEARCH_DB_VERSION};
+        """)
+    except sqlite3.OperationalError as e:
+        click.echo(f"Warning: full-text search database unavailable ({e}).")
+        conn.close()
+        return None
+    return conn
+
+def upsert_search_entry(conn, entry, description, prompt, stat):
+    """Inserts or refreshes one entry in the full-text database."""
+    conn.execute(
+        """
+        INSERT INTO entries (path, mtime_ns, size, metadata, title, author, tags, description, prompt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            mtime_ns = excluded.mtime_ns,
+            size = excluded.size,
+            metadata = excluded.metadata,
+            title = excluded.title,
+            author = excluded.author,
+            tags = excluded.tags,
+            description = excluded.description,
+            prompt = excluded.prompt
+        """,
+        (
+            entry['path'],
+            stat.st_mtime_ns,
+            stat.st_size,
+            json.dumps(entry, default=str),
+            str(entry.get('title') or ''),
+            str(entry.get('author') or ''),
+            ' '.join(str(tag) for tag in entry.get('tags') or []),
+            description,
+            prompt,
+        ),
+    )
+
+def build_fts_query(query):
+    """
+    Turns free text into an FTS5 query: every word must match, and the
+    last word of the query also matches as a prefix. CJK runs become a
+    phrase of the bigrams segment_cjk() indexes, so they match anywhere
+    inside a longer run; a single CJK character matches as a prefix.
+    """
+    quoted = []
+    for term in re.findall(r'\w+', query.lower()):
+        for piece in re.split(f'({CJK_RUN.pattern})', term):
+            if not piece:
+                continue
+            if not CJK_RUN.fullmatch(piece):
+                quoted.append(f'"{piece}"')
+            elif len(piece) == 1:
+                quoted.append(f'"{piece}"*')
+            else:
+                quoted.append('"' + ' '.join(cjk_bigrams(piece)[:-1]) + '"')
+    if not quoted:
+        return None
+    if not quoted[-1].endswith('*'):
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def write_body_packs(index_data, bodies, pack_size=PACK_SIZE):
+    """
+    Writes pre-parsed description/prompt content in fixed-size packs.
+
+    Pack N holds the entries at index.json offsets [N * pack_size,
+    (N + 1) * pack_size), so the viewer can fetch a whole page of bodies in
+    one request. Unchanged packs are not rewritten, keeping their ETags
+    stable for browser caches. Returns the number of packs written.
+    """
+    packs_dir = os.path.join(DATABASE_DIR, PACKS_DIR)
+    os.makedirs(packs_dir, exist_ok=True)
+
+    pack_count = 0
+    for start in range(0, len(index_data), pack_size):
+        pack = {
+            'offset': start,
+            'entries': [
+                {'path': entry['path'], 'description': description, 'prompt': prompt}
+                for entry, (description, prompt) in zip(
+                    index_data[start:start + pack_size], bodies[start:start + pack_size]
+                )
+            ],
+        }
+        payload = json.dumps(pack, ensure_ascii=False, separators=(',', ':'))
+        pack_path = os.path.join(packs_dir, f"pack-{pack_count:05d}.json")
+
+        existing = None
+        if os.path.exists(pack_path):
+            with open(pack_path, 'r') as f:
+                existing = f.read()
+        if existing != payload:
+            with open(pack_path, 'w') as f:
+                f.write(payload)
+        pack_count += 1
+
+    # Drop packs left over from a larger database
+    for pack_path in glob.glob(os.path.join(packs_dir, "pack-*.json")):
+        number = os.path.basename(pack_path)[5:-5]
+        if number.isdigit() and int(number) >= pack_count:
+            os.remove(pack_path)
+
+    manifest = {
+        'version': 1,
+        'pack_size': pack_size,
+        'count': len(index_data),
+        'packs': pack_count,
+    }
+    with open(os.path.join(packs_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return pack_count
+
+def searchable_fields(entry):
+    """
+    Returns the pre-lowercased title, author and tag strings that the
+    viewer filter matches against.
+    """
+    fields = [entry.get('title'), entry.get('author')]
+    fields.extend(entry.get('tags') or [])
+    return [str(field).lower() for field in fields if field]
+
+def build_search_index(index_data, gram=SEARCH_INDEX_GRAM):
+    """
+    Builds the client-side n-gram index used by viewer.html.
+
+    Entries are addressed by their position in index.json. Each n-gram maps
+    to a sorted, delta-encoded posting list of the entries containing it, and
+    `text` holds each entry's pre-lowercased fields joined with \\u0001 so the
+    viewer can verify candidates without lowercasing on every keystroke.
+    """
+    postings = {}
+    texts = []
+
+    for offset, entry in enumerate(index_data):
+        fields = searchable_fields(entry)
+        texts.append('\u0001'.join(fields))
+
+        grams = set()
+        for field in fields:
+            for i in range(len(field) - gram + 1):
+                grams.add(field[i:i + gram])
+        for token in grams:
+            postings.setdefault(token, []).append(offset)
+
+    encoded = {}
+    for token, offsets in postings.items():
+        previous = 0
+        deltas = []
+        for offset in offsets:
+            deltas.append(offset - previous)
+            previous = offset
+        encoded[token] = deltas
+
+    return {
+        'version': 1,
+        'gram': gram,
+        'count': len(index_data),
+        'text': texts,
+        'postings': encoded,
+    }
+
+def report_profile(profiler):
+    """Write a --profile run's files and print its stage timings."""
+    report_path = profiler.stop()
+    if report_path:
+        click.echo(f"\n{profiler.timer.summary()}")
+        click.echo(f"Profile written to {report_path.with_suffix('.prof')} (report: {report_path})")
+
 @click.group()
 def cli():
     """Manage the Nano Banana text database."""
@@ -151,157 +439,218 @@ def validate():
         exit(1)
 
 @cli.command()
-@click.option('--source', type=click.Choice(['hilda', 'cuigh', 'jermic', 'jimmy', 'mickorix', 'picotrex', 'zerolu', 'murattasdemir', 'supermaker', 'muset', 'youmind', 'all']), default='all', help='Source to extract from')
-def extract(source):
-    """Extract prompts from submodules."""
+@click.option('--source', type=click.Choice([*EXTRACTORS, 'all']), default='all', help='Source to extract from')
+@click.option('--profile', is_flag=True, help='Write a cProfile file and per-source timings to PROFILE_DIR.')
+def extract(source, profile):
+    """Extract prompts from submodules.
+
+    `python -m search index --write-database` writes the same entries while
+    indexing, from the same parse.
+    """
     click.echo(f"Extracting data from {source}...")
     
     total = 0
+    sink = DatabaseSink()
+    profiler = Profiler('extract', enabled=profile).start()
     
-    if source in ['hilda', 'all']:
-        click.echo("Running HildaExtractor...")
-        extractor = HildaExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from HildaM.")
-        total += count
-        
-    if source in ['cuigh', 'all']:
-        click.echo("Running CuighExtractor...")
-        extractor = CuighExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from Cuigh.")
-        total += count
-
-    if source in ['jermic', 'all']:
-        click.echo("Running JermicExtractor...")
-        extractor = JermicExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from Jermic.")
-        total += count
-        
-    if source in ['jimmy', 'all']:
-        click.echo("Running JimmyLvExtractor...")
-        extractor = JimmyLvExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from JimmyLv.")
-        total += count
-
-    if source in ['mickorix', 'all']:
-        click.echo("Running MickorixExtractor...")
-        extractor = MickorixExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from Mickorix.")
-        total += count
-        
-    if source in ['picotrex', 'all']:
-        click.echo("Running PicoTrexExtractor...")
-        extractor = PicoTrexExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from PicoTrex.")
-        total += count
-        
-    if source in ['zerolu', 'all']:
-        click.echo("Running ZeroLuExtractor...")
-        extractor = ZeroLuExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from ZeroLu.")
-        total += count
-        
-    if source in ['murattasdemir', 'all']:
-        click.echo("Running MurattasdemirExtractor...")
-        extractor = MurattasdemirExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from Murattasdemir.")
-        total += count
-
-    if source in ['supermaker', 'all']:
-        click.echo("Running SuperMakerExtractor...")
-        extractor = SuperMakerExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from SuperMaker.")
-        total += count
-
-    if source in ['muset', 'all']:
-        click.echo("Running MusetExtractor...")
-        extractor = MusetExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from MusetAI.")
-        total += count
-
-    if source in ['youmind', 'all']:
-        click.echo("Running YouMindExtractor...")
-        extractor = YouMindExtractor()
-        count = extractor.extract()
-        click.echo(f"Extracted {count} entries from YouMind.")
+    for name, extractor_class in EXTRACTORS.items():
+        if source not in [name, 'all']:
+            continue
+        profiler.stage(name)
+        click.echo(f"Running {extractor_class.__name__}...")
+        count = run_extractor(extractor_class(output_dir=DATABASE_DIR), [sink])
+        click.echo(f"Extracted {count} entries from {name}.")
         total += count
         
     click.echo(f"Total extracted: {total}")
+    report_profile(profiler)
 
 @cli.command()
-def index():
+@click.option('--profile', is_flag=True, help='Write a cProfile file and per-stage timings to PROFILE_DIR.')
+def index(profile):
     """Generate a JSON index of all database entries."""
     click.echo("Generating index...")
-    files = glob.glob(os.path.join(DATABASE_DIR, "**", "*.md"), recursive=True)
+    profiler = Profiler('manage-db-index', enabled=profile).start('parse')
+    files = sorted(glob.glob(os.path.join(DATABASE_DIR, "**", "*.md"), recursive=True))
     index_data = []
+    # (description, prompt) for each entry, aligned with index_data
+    bodies = []
+
+    # The full-text database doubles as a parse cache: files whose mtime and
+    # size are unchanged reuse their stored entry instead of being re-read.
+    conn = open_search_db()
+    cached = {}
+    if conn:
+        for row in conn.execute("SELECT path, mtime_ns, size, metadata, description, prompt FROM entries"):
+            cached[row['path']] = row
+    seen = set()
+    updated = 0
     
     for file_path in files:
         if os.path.basename(file_path).startswith('.'):
             continue
+
+        # Add relative path from database dir
+        rel_path = os.path.relpath(file_path, DATABASE_DIR)
+        stat = os.stat(file_path)
+        row = cached.get(rel_path)
+        if row and row['mtime_ns'] == stat.st_mtime_ns and row['size'] == stat.st_size:
+            index_data.append(json.loads(row['metadata']))
+            bodies.append((row['description'], row['prompt']))
+            seen.add(rel_path)
+            continue
             
         with open(file_path, 'r') as f:
             content = f.read()
-            metadata, _ = parse_frontmatter(content)
+            metadata, body = parse_frontmatter(content)
             
             if metadata:
                 entry = metadata.copy()
-                # Add relative path from database dir
-                rel_path = os.path.relpath(file_path, DATABASE_DIR)
                 entry['path'] = rel_path
                 entry['language'] = metadata.get('language', 'en')
                 index_data.append(entry)
+                seen.add(rel_path)
+
+                description, prompt = parse_entry_body(body)
+                bodies.append((description, prompt))
+                if conn:
+                    upsert_search_entry(conn, entry, description, prompt, stat)
+                    updated += 1
             else:
                 # Fallback for failed parsing?
                 pass
 
+    # Group near-duplicate prompts (the submodules mirror each other's cases)
+    profiler.stage('dedup')
+    prompts = [{'path': entry['path'], 'prompt': prompt} for entry, (_, prompt) in zip(index_data, bodies)]
+    group_count = assign_duplicate_groups(prompts, text_fields=('prompt',), id_field='path')
+    for entry, grouped in zip(index_data, prompts):
+        entry['canonical_id'] = grouped['canonical_id']
+        entry['duplicate_group'] = grouped['duplicate_group']
+    click.echo(f"Found {group_count} groups of near-duplicate prompts")
+
+    if conn:
+        profiler.stage('full-text database')
+        removed = [path for path in cached if path not in seen]
+        conn.executemany("DELETE FROM entries WHERE path = ?", [(path,) for path in removed])
+        conn.executemany(
+            "UPDATE entries SET duplicate_group = ? WHERE path = ? AND duplicate_group IS NOT ?",
+            [(entry['duplicate_group'], entry['path'], entry['duplicate_group']) for entry in index_data],
+        )
+        conn.commit()
+        conn.close()
+        click.echo(f"Full-text database updated: {updated} changed, {len(removed)} removed")
+
+    profiler.stage('index.json')
     index_path = os.path.join(DATABASE_DIR, "index.json")
     with open(index_path, 'w') as f:
         json.dump(index_data, f, indent=2)
         
     click.echo(f"Index generated with {len(index_data)} entries at {index_path}")
 
+    profiler.stage('search index')
+    search_index = build_search_index(index_data)
+    search_index_path = os.path.join(DATABASE_DIR, SEARCH_INDEX_FILE)
+    with open(search_index_path, 'w') as f:
+        json.dump(search_index, f, ensure_ascii=False, separators=(',', ':'))
+
+    click.echo(f"Search index generated with {len(search_index['postings'])} {SEARCH_INDEX_GRAM}-grams at {search_index_path}")
+
+    profiler.stage('body packs')
+    pack_count = write_body_packs(index_data, bodies)
+    click.echo(f"Wrote {pack_count} body packs of {PACK_SIZE} entries to {os.path.join(DATABASE_DIR, PACKS_DIR)}")
+    report_profile(profiler)
+
 @cli.command()
 @click.argument('query')
-def search(query):
+@click.option('--limit', default=20, show_default=True, help='Maximum number of results to show.')
+@click.option('--collapse', is_flag=True, help='Show one result per group of near-duplicate prompts.')
+def search(query, limit, collapse):
     """Search the database index."""
-    index_path = os.path.join(DATABASE_DIR, "index.json")
-    if not os.path.exists(index_path):
-        click.echo("Index not found. Run 'python manage_db.py index' first.")
-        return
+    conn = open_search_db(create=False)
+    if conn:
+        fts_query = build_fts_query(query)
+        results = []
+        total = 0
+        if fts_query:
+            counted = "DISTINCT COALESCE(entries.duplicate_group, entries.path)" if collapse else "*"
+            try:
+                total = conn.execute(
+                    f"""
+                    SELECT count({counted}) FROM entries_fts
+                    JOIN entries ON entries.id = entries_fts.rowid
+                    WHERE entries_fts MATCH ?
+                    """,
+                    (fts_query,),
+                ).fetchone()[0]
+                rows = conn.execute(
+                    """
+                    SELECT entries.path, entries.metadata, entries.duplicate_group FROM entries_fts
+                    JOIN entries ON entries.id = entries_fts.rowid
+                    WHERE entries_fts MATCH ?
+                    ORDER BY bm25(entries_fts, 10.0, 5.0, 5.0, 1.0, 1.0)
+                    """,
+                    (fts_query,),
+                )
+                groups = set()
+                for row in rows:
+                    group = row['duplicate_group'] or row['path']
+                    if collapse and group in groups:
+                        continue
+                    groups.add(group)
+                    results.append(json.loads(row['metadata']))
+                    if len(results) >= limit:
+                        break
+            except sqlite3.OperationalError as e:
+                click.echo(f"Invalid search query: {e}")
+                return
+        conn.close()
+    else:
+        index_path = os.path.join(DATABASE_DIR, "index.json")
+        if not os.path.exists(index_path):
+            click.echo("Index not found. Run 'python manage_db.py index' first.")
+            return
 
-    with open(index_path, 'r') as f:
-        index_data = json.load(f)
-        
-    query = query.lower()
-    results = []
-    
-    for entry in index_data:
-        # Search in title, author, and tags
-        match = False
-        if query in entry.get('title', '').lower():
-            match = True
-        elif query in entry.get('author', '').lower():
-            match = True
-        elif any(query in tag.lower() for tag in entry.get('tags', [])):
-            match = True
+        with open(index_path, 'r') as f:
+            index_data = json.load(f)
             
-        if match:
-            results.append(entry)
+        query = query.lower()
+        results = []
+        
+        for entry in index_data:
+            # Search in title, author, and tags
+            match = False
+            if query in entry.get('title', '').lower():
+                match = True
+            elif query in entry.get('author', '').lower():
+                match = True
+            elif any(query in tag.lower() for tag in entry.get('tags', [])):
+                match = True
+                
+            if match:
+                results.append(entry)
+
+        if collapse:
+            groups = set()
+            collapsed = []
+            for entry in results:
+                group = entry.get('duplicate_group', entry.get('path'))
+                if group not in groups:
+                    groups.add(group)
+                    collapsed.append(entry)
+            results = collapsed
+
+        total = len(results)
+        results = results[:limit]
             
     if not results:
         click.echo("No results found.")
         return
         
-    click.echo(f"Found {len(results)} results:")
+    if total > len(results):
+        click.echo(f"Found {total} results, showing the top {len(results)}:")
+    else:
+        click.echo(f"Found {total} results:")
     click.echo("-" * 86)
     click.echo(f"{'TITLE':<40} | {'AUTHOR':<20} | {'PATH':<20}")
     click.echo("-" * 86)
@@ -317,47 +666,314 @@ def search(query):
         click.echo(f"{title:<40} | {author:<20} | {path:<20}")
 
 @cli.command()
-@click.option('--port', default=8000, help='Port to serve on.')
-def serve(port):
-    """Start the Web Viewer."""
-    class NanoBananaRequestHandler(http.server.SimpleHTTPRequestHandler):
-        def do_GET(self):
-            if self.path == '/':
-                self.path = '/viewer.html'
+def duplicates():
+    """List groups of near-duplicate entries."""
+    index_path = os.path.join(DATABASE_DIR, "index.json")
+    if not os.path.exists(index_path):
+        click.echo("Index not found. Run 'python manage_db.py index' first.")
+        return
+
+    with open(index_path, 'r') as f:
+        index_data = json.load(f)
+
+    groups = {}
+    for entry in index_data:
+        groups.setdefault(entry.get('duplicate_group', entry['path']), []).append(entry)
+    groups = {key: members for key, members in groups.items() if len(members) > 1}
+
+    if not groups:
+        click.echo("No near-duplicate entries found.")
+        return
+
+    duplicate_count = sum(len(members) - 1 for members in groups.values())
+    click.echo(f"Found {len(groups)} groups ({duplicate_count} redundant entries):")
+    for canonical, members in sorted(groups.items()):
+        click.echo(f"\n{canonical}")
+        for entry in members:
+            if entry['path'] != canonical:
+                click.echo(f"  ~ {entry['path']}")
+
+class CompressionCache:
+    """Thread-safe LRU of compressed file bodies keyed by (path, etag, encoding)."""
+
+    def __init__(self, max_entries=COMPRESS_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class NanoBananaServer(http.server.ThreadingHTTPServer):
+    """Threaded viewer server; one slow client no longer blocks the others."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, handler, cache_max_age=300):
+        super().__init__(server_address, handler)
+        self.cache_max_age = cache_max_age
+        self.compression_cache = CompressionCache()
+
+class NanoBananaRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Static file handler with ETag/Last-Modified revalidation, gzip/brotli
+    negotiation (preferring precompressed .br/.gz siblings), single byte
+    ranges and sendfile-based transfers.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        try:
+            return super().do_GET()
+        except BrokenPipeError:
+            # Client disconnected, ignore
+            pass
+        except ConnectionResetError:
+            # Client disconnected, ignore
+            pass
+
+    def list_directory(self, path):
+        self.send_error(404, "No permission to list directory")
+        return None
+
+    def accepted_encodings(self):
+        """Returns the encodings the client accepts with a non-zero q-value."""
+        accepted = set()
+        for part in self.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = part.strip().partition(';')
+            coding = coding.strip().lower()
+            if not coding:
+                continue
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            if q > 0:
+                accepted.add(coding)
+        if '*' in accepted:
+            accepted.update(('br', 'gzip'))
+        return accepted
+
+    def not_modified(self, etag, mtime):
+        """Evaluates If-None-Match (preferred) or If-Modified-Since."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            # Compressed representations carry the encoding as an ETag suffix
+            current = {etag, etag[:-1] + '-gzip"', etag[:-1] + '-br"'}
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag.startswith('W/'):
+                    tag = tag[2:]
+                if tag == '*' or tag in current:
+                    return True
+            return False
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
             try:
-                return http.server.SimpleHTTPRequestHandler.do_GET(self)
-            except BrokenPipeError:
-                # Client disconnected, ignore
-                pass
-            except ConnectionResetError:
-                # Client disconnected, ignore
-                pass
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
 
-        def list_directory(self, path):
-            self.send_error(404, "No permission to list directory")
+    def parse_range(self, size, etag):
+        """
+        Returns (start, end) for a satisfiable single byte range, None to
+        serve the whole file, or 'unsatisfiable'.
+        """
+        header = self.headers.get('Range')
+        if not header or not header.startswith('bytes=') or ',' in header:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range.strip() != etag:
             return None
 
-    handler = NanoBananaRequestHandler
-    
-    # Custom class to allow address reuse
-    class ReusableTCPServer(socketserver.TCPServer):
-        allow_reuse_address = True
+        start_str, _, end_str = header[6:].strip().partition('-')
+        try:
+            if start_str:
+                start = int(start_str)
+                end = int(end_str) if end_str else size - 1
+            else:
+                suffix = int(end_str)
+                if suffix == 0:
+                    return 'unsatisfiable'
+                start = max(0, size - suffix)
+                end = size - 1
+        except ValueError:
+            return None
+
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, min(end, size - 1)
+
+    def send_cache_headers(self, path, etag, mtime):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(mtime))
+        # The viewer page and generated indexes change on every re-index, so
+        # they are always revalidated; everything else may be reused briefly.
+        if path.endswith(('.html', '.json')):
+            self.send_header('Cache-Control', 'no-cache')
+        else:
+            self.send_header('Cache-Control', f'public, max-age={self.server.cache_max_age}')
+
+    def compressed_variant(self, path, ctype, fs, etag):
+        """
+        Picks a compressed representation of the file.
+        Returns (encoding, file_object, length) or None for identity.
+        """
+        accepted = self.accepted_encodings()
+
+        # Precompressed siblings win if they are at least as new as the source
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding not in accepted:
+                continue
+            try:
+                variant = open(path + suffix, 'rb')
+            except OSError:
+                continue
+            vs = os.fstat(variant.fileno())
+            if vs.st_mtime_ns >= fs.st_mtime_ns:
+                return encoding, variant, vs.st_size
+            variant.close()
+
+        if not ctype.startswith(COMPRESSIBLE_TYPES):
+            return None
+        if not COMPRESS_MIN_BYTES <= fs.st_size <= COMPRESS_MAX_BYTES:
+            return None
+
+        if 'br' in accepted and brotli is not None:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return None
+
+        key = (path, etag, encoding)
+        body = self.server.compression_cache.get(key)
+        if body is None:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            body = brotli.compress(raw) if encoding == 'br' else gzip.compress(raw, compresslevel=6)
+            self.server.compression_cache.put(key, body)
+        return encoding, io.BytesIO(body), len(body)
 
+    def send_head(self):
+        if self.path == '/':
+            self.path = '/viewer.html'
+
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            ctype = self.guess_type(path)
+            etag = f'"{fs.st_mtime_ns:x}-{fs.st_size:x}"'
+            self.send_range = None
+
+            if self.not_modified(etag, fs.st_mtime):
+                f.close()
+                self.send_response(304)
+                self.send_cache_headers(path, etag, fs.st_mtime)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return None
+
+            # Ranges apply to the identity representation only
+            byte_range = self.parse_range(fs.st_size, etag)
+            if byte_range == 'unsatisfiable':
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{fs.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            variant = None if byte_range else self.compressed_variant(path, ctype, fs, etag)
+            if variant:
+                f.close()
+                encoding, f, length = variant
+                self.send_response(200)
+                self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(length))
+                etag = etag[:-1] + f'-{encoding}"'
+                self.send_range = (0, length)
+            elif byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{fs.st_size}')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_range = (start, end - start + 1)
+            else:
+                self.send_response(200)
+                self.send_header('Content-Length', str(fs.st_size))
+                self.send_range = (0, fs.st_size)
+
+            self.send_header('Content-Type', ctype)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_cache_headers(path, etag, fs.st_mtime)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, io.BytesIO):
+            outputfile.write(source.getvalue())
+            return
+
+        offset, count = self.send_range
+        if count == 0:
+            return
+        # Headers are already written unbuffered, so the socket can take the
+        # file directly; socket.sendfile() uses os.sendfile() where available.
+        self.connection.sendfile(source, offset, count)
+
+@cli.command()
+@click.option('--port', default=8000, help='Port to serve on.')
+@click.option('--host', default='', help='Address to bind (default: all interfaces).')
+@click.option('--max-age', default=300, show_default=True, help='Cache-Control max-age in seconds for entry files and assets.')
+@click.option('--no-browser', is_flag=True, help='Do not open a browser (headless use).')
+def serve(port, host, max_age, no_browser):
+    """Start the Web Viewer."""
     url = f"http://localhost:{port}/viewer.html"
     click.echo(f"Starting server at {url}")
     click.echo("Press Ctrl+C to stop.")
     
-    # Auto open browser
-    webbrowser.open(url)
-    
     try:
-        with ReusableTCPServer(("", port), handler) as httpd:
+        with NanoBananaServer((host, port), NanoBananaRequestHandler, cache_max_age=max_age) as httpd:
+            # Auto open browser
+            if not no_browser:
+                webbrowser.open(url)
             try:
                 httpd.serve_forever()
             except KeyboardInterrupt:
                 click.echo("\nServer stopped.")
     except OSError as e:
-        if e.errno == 48:
+        if e.errno == errno.EADDRINUSE:
             click.echo(f"\nError: Port {port} is already in use.")
             click.echo(f"Try using a different port: python manage_db.py serve --port {port+1}")
         else:
@@ -82,7 +82,7 @@ export INDEX_NAME="nano_banana_index"
 
 # Run indexing
 echo -e "${YELLOW}Running search indexer...${NC}"
-uv run python -m search index
+uv run python -m search index --skip-if-current
 
 # Start file watcher in background
 echo -e "${YELLOW}Starting file watcher for auto re-indexing...${NC}"
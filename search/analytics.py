@@ -0,0 +1,246 @@
+"""Query analytics: an in-memory event buffer flushed to SQLite in batches.
+
+Request handlers only append a tuple to a bounded deque, which is O(1) and
+needs no lock. A background thread drains the deque into SQLite every few
+seconds, or sooner once a batch worth of events has accumulated. If the
+writer falls behind, the oldest unflushed events are dropped rather than
+slowing requests down.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from .config import (
+    ANALYTICS_DB,
+    ANALYTICS_ENABLED,
+    ANALYTICS_BUFFER_SIZE,
+    ANALYTICS_FLUSH_INTERVAL,
+    ANALYTICS_RETENTION_DAYS,
+)
+
+FLUSH_BATCH = 500
+MAX_QUERY_LENGTH = 200
+_PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    query TEXT NOT NULL,
+    result_count INTEGER,
+    latency_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS query_events_ts ON query_events (ts);
+CREATE INDEX IF NOT EXISTS query_events_query ON query_events (query);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Group trivially different spellings of the same query."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())[:MAX_QUERY_LENGTH]
+
+
+class QueryAnalytics:
+    """Records query events and answers aggregate questions about them."""
+
+    def __init__(
+        self,
+        db_path: Path = ANALYTICS_DB,
+        buffer_size: int = ANALYTICS_BUFFER_SIZE,
+        flush_interval: float = ANALYTICS_FLUSH_INTERVAL,
+        retention_days: int = ANALYTICS_RETENTION_DAYS
+    ):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.flushed = 0
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self._initialized = False
+
+    # Recording (request path)
+
+    def record(
+        self,
+        endpoint: str,
+        query: str,
+        result_count: Optional[int],
+        latency_ms: float
+    ) -> None:
+        """Queue one query event."""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((time.time(), endpoint, query, result_count, latency_ms))
+        if len(self.buffer) >= FLUSH_BATCH:
+            self._wakeup.set()
+
+    # Background flushing
+
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="query-analytics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write out what is left."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing query analytics: {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    def flush(self) -> int:
+        """Write buffered events to SQLite. Returns the number written."""
+        with self._flush_lock:
+            events = []
+            while self.buffer:
+                try:
+                    ts, endpoint, query, result_count, latency_ms = self.buffer.popleft()
+                except IndexError:
+                    break
+                events.append((ts, endpoint, normalize_query(query), result_count, latency_ms))
+            if not events:
+                return 0
+
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO query_events (ts, endpoint, query, result_count, latency_ms) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        events,
+                    )
+                    now = time.time()
+                    if self.retention_days and now - self._last_prune > _PRUNE_INTERVAL:
+                        conn.execute(
+                            "DELETE FROM query_events WHERE ts < ?",
+                            (now - self.retention_days * 86400,),
+                        )
+                        self._last_prune = now
+            finally:
+                conn.close()
+
+            self.flushed += len(events)
+            return len(events)
+
+    # Aggregates
+
+    def _aggregate(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        # Include events still sitting in the buffer
+        self.flush()
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def top_queries(self, endpoint: str = "search", days: float = 7, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most frequent queries."""
+        return self._aggregate(
+            """
+            SELECT query, COUNT(*) AS count, ROUND(AVG(result_count), 1) AS avg_results
+            FROM query_events
+            WHERE endpoint = ? AND ts >= ? AND query != ''
+            GROUP BY query
+            ORDER BY count DESC, query
+            LIMIT ?
+            """,
+            (endpoint, time.time() - days * 86400, limit),
+        )
+
+    def zero_result_queries(self, endpoint: str = "search", days: float = 7, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most frequent queries that returned nothing."""
+        return self._aggregate(
+            """
+            SELECT query, COUNT(*) AS count, MAX(ts) AS last_seen
+            FROM query_events
+            WHERE endpoint = ? AND ts >= ? AND result_count = 0 AND query != ''
+            GROUP BY query
+            ORDER BY count DESC, query
+            LIMIT ?
+            """,
+            (endpoint, time.time() - days * 86400, limit),
+        )
+
+    def latency_by_query(
+        self,
+        endpoint: str = "search",
+        days: float = 7,
+        limit: int = 20,
+        min_count: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Queries with the highest average latency."""
+        return self._aggregate(
+            """
+            SELECT query, COUNT(*) AS count,
+                   ROUND(AVG(latency_ms), 2) AS avg_ms,
+                   ROUND(MAX(latency_ms), 2) AS max_ms
+            FROM query_events
+            WHERE endpoint = ? AND ts >= ?
+            GROUP BY query
+            HAVING COUNT(*) >= ?
+            ORDER BY avg_ms DESC, query
+            LIMIT ?
+            """,
+            (endpoint, time.time() - days * 86400, min_count, limit),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of the recorder itself."""
+        return {"buffered": len(self.buffer), "flushed": self.flushed, "dropped": self.dropped}
+
+
+class _DisabledAnalytics(QueryAnalytics):
+    """Stand-in used when ANALYTICS_ENABLED is off."""
+
+    def record(self, endpoint: str, query: str, result_count: Optional[int], latency_ms: float) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+
+# Global analytics instance
+_analytics: Optional[QueryAnalytics] = None
+
+
+def get_analytics() -> QueryAnalytics:
+    """Get or create the global analytics recorder."""
+    global _analytics
+    if _analytics is None:
+        _analytics = QueryAnalytics() if ANALYTICS_ENABLED else _DisabledAnalytics()
+    return _analytics
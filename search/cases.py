@@ -0,0 +1,86 @@
+"""Case documents read from case.yml and ATTRIBUTION.yml.
+
+Kept apart from indexer.py, which pulls in NumPy and the image stack, so
+the database extractors (and manage_db.py) can parse cases cheaply.
+"""
+
+import json
+import yaml
+from pathlib import Path
+from typing import Optional
+from .config import BASE_DIR
+from .models import Document, CASE_TEXT_FIELDS
+from .utils import generate_document_id, determine_language
+
+
+def extract_case_data(case_path: Path, submodule_name: str) -> Optional[Document]:
+    """Extract case data from case.yml and ATTRIBUTION.yml files."""
+    case_file = case_path / "case.yml"
+    attribution_file = case_path / "ATTRIBUTION.yml"
+    
+    if not case_file.exists():
+        return None
+    
+    try:
+        # Load case.yml
+        with open(case_file, "r", encoding="utf-8") as f:
+            case_data = yaml.safe_load(f) or {}
+        
+        # Load ATTRIBUTION.yml if it exists
+        attribution_data = {}
+        if attribution_file.exists():
+            with open(attribution_file, "r", encoding="utf-8") as f:
+                attribution_data = yaml.safe_load(f) or {}
+        
+        # Extract image file
+        image_file = None
+        image_name = case_data.get("image", "")
+        if image_name:
+            image_path = case_path / image_name
+            if image_path.exists():
+                image_file = str(image_path.relative_to(BASE_DIR))
+        
+        # Build document
+        doc_id = generate_document_id(
+            submodule_name,
+            "case",
+            str(case_path.relative_to(BASE_DIR))
+        )
+        
+        # Determine language
+        title = case_data.get("title", "")
+        title_en = case_data.get("title_en", "")
+        language = determine_language(title, title_en)
+        
+        # Text fields are searched individually (see models.SEARCHABLE_ATTRIBUTES)
+        text_fields = {name: case_data.get(name, "") or "" for name in CASE_TEXT_FIELDS}
+        
+        # Structured (JSON-style) prompts state their intent; index them as text
+        description = case_data.get("description", "") or ""
+        for name, value in text_fields.items():
+            if isinstance(value, (dict, list)):
+                if not description and isinstance(value, dict):
+                    description = value.get("intent", "") or ""
+                text_fields[name] = json.dumps(value, indent=2, ensure_ascii=False)
+        
+        document = Document(
+            id=doc_id,
+            type="case",
+            submodule=submodule_name,
+            path=str(case_path.relative_to(BASE_DIR)),
+            author=case_data.get("author", "") or attribution_data.get("prompt_author", ""),
+            author_link=case_data.get("author_link", "") or attribution_data.get("prompt_author_link", ""),
+            image=image_file,
+            capability_code=case_data.get("capability_code", ""),
+            capability_type=case_data.get("capability_type", ""),
+            language=language,
+            source_links=case_data.get("source_links", []),
+            description=description,
+            **text_fields,
+        )
+        
+        return document
+        
+    except Exception as e:
+        print(f"Error extracting case data from {case_path}: {e}")
+        return None
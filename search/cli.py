@@ -1,8 +1,62 @@
 """CLI interface for the search engine."""
 
+import json
+import os
+import time
 import click
-from .indexer import build_index
-from .search import get_search_engine
+
+
+# The indexer (yaml, Pillow, numpy) and the Meilisearch client are imported
+# on first use, so commands that don't need them start quickly
+
+def build_index(*args, **kwargs):
+    from .indexer import build_index
+    return build_index(*args, **kwargs)
+
+
+def get_search_engine():
+    from .search import get_search_engine
+    return get_search_engine()
+
+
+def acquire_index_lease(options: dict):
+    """Take the indexing lease, waiting for a web job or another run to finish.
+
+    Only one process builds or uploads the index at a time; the caller
+    must release the returned lease.
+    """
+    from .coordination import INDEX_LEASE, Lease
+    from .jobs import new_job_record
+    
+    lease = Lease(INDEX_LEASE)
+    record = new_job_record(options, source="cli")
+    if not lease.acquire(record):
+        click.echo("Waiting for another indexing run to finish...")
+        while not lease.acquire(record):
+            time.sleep(2)
+    lease.keep_alive()
+    return lease
+
+
+def record_index_run(search_engine, documents, fingerprint, commits, changed=True, progress=None):
+    """Save the state and document store of a successful run, and tell web workers if it changed the index."""
+    from .coordination import INDEX_VERSION_SIGNAL, bump_signal
+    from .docstore import write_docstore
+    from .indexer import save_index_state
+    
+    index_version = search_engine.get_index_version()
+    save_index_state({
+        "fingerprint": fingerprint,
+        "index_version": index_version,
+        "document_count": len(documents),
+        "commits": commits,
+    })
+    if progress:
+        progress("docstore")
+    write_docstore(documents, index_version)
+    if changed:
+        # Every web worker re-warms its caches on this signal
+        bump_signal(INDEX_VERSION_SIGNAL)
 
 
 @click.group()
@@ -12,10 +66,30 @@ def cli():
 
 
 @cli.command()
-@click.option("--rebuild", is_flag=True, help="Rebuild the entire index")
-def index(rebuild):
-    """Build or rebuild the search index."""
-    click.echo("Building search index...")
+@click.option("--rebuild", is_flag=True, help="Delete the index and build it from scratch")
+@click.option("--no-thumbnails", is_flag=True, help="Skip thumbnail generation")
+@click.option("--skip-if-current", is_flag=True, help="Do nothing if no source file changed since the last run")
+@click.option("--incremental", is_flag=True, help="Re-index only the files changed in the submodules' git history since the last run")
+@click.option("--write-database", "database_dir", is_flag=False, flag_value="database", default=None, help="Also write the parsed cases as database entries (default directory: database)")
+@click.option("--profile", is_flag=True, help="Write a cProfile file and per-stage timings to PROFILE_DIR")
+def index(rebuild, no_thumbnails, skip_if_current, incremental, database_dir, profile):
+    """Build or rebuild the search index.
+
+    With --incremental, each submodule's commit recorded by the last run is
+    diffed against the one checked out, and only the case directories and
+    markdown files that changed are extracted again. Submodules without
+    usable history are scanned in full; without a usable record of the last
+    run, the whole index is built.
+    """
+    from .indexer import (
+        build_incremental_index,
+        source_fingerprint,
+        submodule_commits,
+        load_index_state
+    )
+    from .models import DOCUMENT_SCHEMA_VERSION
+    from .profiling import Profiler
+    from .search import index_settings
     
     search_engine = get_search_engine()
     
@@ -25,23 +99,217 @@ def index(rebuild):
         click.echo("Make sure Meilisearch is running (docker-compose up -d)")
         return
     
-    # Create index if needed
-    if not search_engine.create_index():
-        click.echo(click.style("Error: Could not create index", fg="red"))
-        return
+    lease = acquire_index_lease({"rebuild": rebuild, "thumbnails": not no_thumbnails, "incremental": incremental})
     
-    # Build index
-    documents = build_index(rebuild=rebuild)
+    # Started after the lease, so waiting for another run is not profiled
+    profiler = Profiler("index", enabled=profile).start()
+    try:
+        # Recorded before extracting, so changes made meanwhile are picked up by the next run
+        commits = submodule_commits()
+        fingerprint = source_fingerprint(index_settings())
+        state = load_index_state()
+        # The index must also be the one recorded, e.g. not a wiped Meilisearch volume
+        index_recorded = (
+            search_engine.is_indexed()
+            and state.get("index_version") == search_engine.get_index_version()
+        )
+        if skip_if_current and not rebuild:
+            if state.get("fingerprint") == fingerprint and index_recorded:
+                click.echo(click.style("Index is current, skipping", fg="green"))
+                return
+        
+        indexed = None
+        if incremental and not rebuild:
+            # Documents of an older schema must all be extracted again
+            if "commits" in state and index_recorded and state.get("schema") == DOCUMENT_SCHEMA_VERSION:
+                indexed = search_engine.get_all_documents()
+            if indexed is None:
+                click.echo("No usable record of the last run, building the full index")
+        
+        click.echo("Updating search index..." if indexed is not None else "Building search index...")
+        
+        # A rebuild starts from an empty index with fresh settings
+        if rebuild and not search_engine.delete_index():
+            click.echo(click.style("Error: Could not delete the index", fg="red"))
+            return
+        
+        # Create index if needed
+        if not search_engine.create_index():
+            click.echo(click.style("Error: Could not create index", fg="red"))
+            return
+        
+        if indexed is not None:
+            documents, changed, removed_ids = build_incremental_index(
+                indexed,
+                state["commits"],
+                current=commits,
+                thumbnails=not no_thumbnails,
+                database_dir=database_dir,
+                progress=profiler
+            )
+            if not (search_engine.index_documents(changed, progress=profiler) and search_engine.delete_documents(removed_ids)):
+                click.echo(click.style("Error: Failed to update the index", fg="red"))
+                return
+            record_index_run(
+                search_engine,
+                documents,
+                fingerprint,
+                commits,
+                changed=bool(changed or removed_ids),
+                progress=profiler
+            )
+            click.echo(click.style(f"Updated {len(changed)} documents, removed {len(removed_ids)}", fg="green"))
+            return
+        
+        # Build index
+        documents = build_index(
+            thumbnails=not no_thumbnails,
+            progress=profiler,
+            database_dir=database_dir
+        )
+        
+        if not documents:
+            click.echo(click.style("No documents found to index", fg="yellow"))
+            return
+        
+        # Index documents, then drop those the sources no longer produce
+        # (e.g. whole README documents now split into cases by an extractor)
+        if search_engine.index_documents(documents, progress=profiler):
+            removed_ids = search_engine.delete_stale_documents(doc["id"] for doc in documents)
+            if removed_ids is None:
+                click.echo(click.style("Error: Failed to delete stale documents", fg="red"))
+                return
+            if removed_ids:
+                click.echo(f"Removed {len(removed_ids)} stale documents")
+            record_index_run(search_engine, documents, fingerprint, commits, progress=profiler)
+            click.echo(click.style(f"Successfully indexed {len(documents)} documents", fg="green"))
+        else:
+            click.echo(click.style("Error: Failed to index documents", fg="red"))
+    finally:
+        report_path = profiler.stop()
+        lease.release()
+        if report_path:
+            click.echo(f"\n{profiler.timer.summary()}")
+            click.echo(f"Profile written to {report_path.with_suffix('.prof')} (report: {report_path})")
+
+
+@cli.command()
+@click.option("--host", default="0.0.0.0", help="Address to bind")
+@click.option("--port", default=8000, type=int, help="Port to bind")
+@click.option(
+    "--workers",
+    default=lambda: int(os.getenv("WEB_CONCURRENCY", "1")),
+    type=int,
+    help="Worker processes (default: WEB_CONCURRENCY or 1)"
+)
+@click.option("--reload", is_flag=True, help="Restart on code changes (development, single worker)")
+def serve(host, port, workers, reload):
+    """Run the web app.
+
+    With several workers, indexing jobs and cache invalidation are
+    coordinated through CACHE_DIR/coordination.db, so CACHE_DIR must be
+    shared by all of them.
+    """
+    import uvicorn
     
-    if not documents:
-        click.echo(click.style("No documents found to index", fg="yellow"))
+    if reload and workers > 1:
+        click.echo(click.style("--reload runs a single worker, ignoring --workers", fg="yellow"))
+        workers = 1
+    uvicorn.run("search.web_app:app", host=host, port=port, workers=workers, reload=reload)
+
+
+@cli.command()
+def migrate():
+    """Migrate an existing index to the current document model.
+
+    Updates the index settings and re-indexes every document, which drops
+    the legacy `content` copy from case documents and replaces whole-file
+    markdown documents with their sections or extracted cases.
+    """
+    from .indexer import source_fingerprint, submodule_commits
+    from .search import index_settings
+    
+    search_engine = get_search_engine()
+    
+    if not search_engine.connect_to_meilisearch():
+        click.echo(click.style("Error: Could not connect to Meilisearch", fg="red"))
         return
     
-    # Index documents
-    if search_engine.index_documents(documents):
-        click.echo(click.style(f"Successfully indexed {len(documents)} documents", fg="green"))
-    else:
-        click.echo(click.style("Error: Failed to index documents", fg="red"))
+    lease = acquire_index_lease({"migrate": True, "thumbnails": True})
+    try:
+        if not search_engine.create_index():
+            click.echo(click.style("Error: Could not update index settings", fg="red"))
+            return
+        
+        commits = submodule_commits()
+        fingerprint = source_fingerprint(index_settings())
+        documents = build_index()
+        if not documents:
+            click.echo(click.style("No documents found to index", fg="yellow"))
+            return
+        
+        if not search_engine.index_documents(documents):
+            click.echo(click.style("Error: Failed to re-index documents", fg="red"))
+            return
+        
+        # Whole-file markdown documents and README files now parsed by an
+        # extractor are no longer produced; only ids reused by a section stay
+        if search_engine.delete_stale_documents(doc["id"] for doc in documents) is None:
+            click.echo(click.style("Error: Failed to delete outdated documents", fg="red"))
+            return
+        
+        record_index_run(search_engine, documents, fingerprint, commits)
+        click.echo(click.style(f"Migrated {len(documents)} documents", fg="green"))
+    finally:
+        lease.release()
+
+
+@cli.command("index-report")
+@click.option("--live", is_flag=True, help="Also index both shapes into scratch indexes to compare time and stored size")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the report as JSON")
+def index_report(live, output):
+    """Compare index size and indexing time before and after the compact document model."""
+    from .migrate import size_report
+    
+    # build_index rewrites the similarity and image hash files the web app
+    # serves, so it runs under the indexing lease like any other build
+    lease = acquire_index_lease({"report": True, "live": live, "thumbnails": False})
+    try:
+        documents = build_index(thumbnails=False)
+        if not documents:
+            click.echo(click.style("No documents found", fg="yellow"))
+            return
+        
+        engine = None
+        if live:
+            engine = get_search_engine()
+            if not engine.connect_to_meilisearch():
+                click.echo(click.style("Error: Could not connect to Meilisearch", fg="red"))
+                return
+        
+        report = size_report(documents, engine)
+    finally:
+        lease.release()
+    payload = report["payload"]
+    saved = payload["legacy_bytes"] - payload["compact_bytes"]
+    
+    click.echo(f"\nDocuments: {payload['documents']}")
+    click.echo(f"Payload (legacy):  {payload['legacy_bytes']:>12,} bytes")
+    click.echo(f"Payload (compact): {payload['compact_bytes']:>12,} bytes")
+    if payload["legacy_bytes"]:
+        click.echo(f"Saved:             {saved:>12,} bytes ({saved / payload['legacy_bytes']:.1%})")
+    
+    for label in ("legacy", "compact"):
+        if label in report:
+            result = report[label]
+            size = result["raw_document_db_size"]
+            size_text = f"{size:,} bytes stored" if size is not None else "stored size not reported"
+            click.echo(f"Indexing ({label}): {result['seconds']:.2f}s, {size_text}")
+    
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"\nReport written to {output}")
 
 
 @cli.command()
@@ -51,7 +319,8 @@ def index(rebuild):
 @click.option("--submodule", help="Filter by submodule name")
 @click.option("--limit", type=int, default=20, help="Number of results to return")
 @click.option("--offset", type=int, default=0, help="Offset for pagination")
-def search(query, lang, field, submodule, limit, offset):
+@click.option("--collapse", is_flag=True, help="Show one result per group of near-duplicate prompts, and per markdown file")
+def search(query, lang, field, submodule, limit, offset, collapse):
     """Search the index."""
     search_engine = get_search_engine()
     
@@ -77,7 +346,8 @@ def search(query, lang, field, submodule, limit, offset):
         language=lang,
         filters=filter_str,
         limit=limit,
-        offset=offset
+        offset=offset,
+        collapse_duplicates=collapse
     )
     
     hits = results.get("hits", [])
@@ -109,7 +379,11 @@ def search(query, lang, field, submodule, limit, offset):
                 prompt = prompt[:100] + "..."
             click.echo(f"   Prompt: {prompt}")
         
-        click.echo(f"   Path: {hit.get('path', '')}")
+        if hit.get("anchor"):
+            click.echo(f"   Section: {' > '.join(hit.get('section_path', []) + [hit.get('title', '')])}")
+            click.echo(f"   Path: {hit.get('path', '')}#{hit['anchor']}")
+        else:
+            click.echo(f"   Path: {hit.get('path', '')}")
         click.echo()
 
 
@@ -177,5 +451,188 @@ def show(case_id):
         click.echo(f"Image: {case.get('image')}")
 
 
+@cli.command()
+@click.argument("case_ids", nargs=-1, required=True)
+@click.option("--limit", default=10, help="Number of similar cases per case")
+def similar(case_ids, limit):
+    """Show cases with prompts similar to the given case IDs."""
+    from .similarity import get_similarity_index
+    
+    similarity_index = get_similarity_index()
+    
+    if similarity_index is None:
+        click.echo(click.style("Similarity index not built yet, run `index` first", fg="red"))
+        return
+    
+    results = similarity_index.most_similar_batch(case_ids, limit=limit)
+    
+    for case_id in case_ids:
+        if case_id not in results:
+            click.echo(click.style(f"Case with ID '{case_id}' not found", fg="yellow"))
+            continue
+        
+        click.echo("\n" + click.style(f"Similar to {case_id}", fg="green", bold=True))
+        for hit in results[case_id]:
+            click.echo(f"  {hit['score']:.3f}  {hit['id']}  {hit['title']}")
+
+
+@cli.command()
+@click.option("--url", default="http://localhost:8000", help="Base URL of the web app")
+@click.option("--duration", default=30.0, help="Seconds to run, after the warm-up")
+@click.option("--concurrency", default=10, help="Closed-loop users, or the in-flight limit with --rate")
+@click.option("--rate", type=float, help="Open loop: start this many requests per second")
+@click.option("--warmup", default=5.0, help="Seconds of unrecorded requests before measuring")
+@click.option("--queries", "query_log", type=click.Path(exists=True, dir_okay=False), help="Replay queries from a log (text or JSON lines)")
+@click.option("--mix", default="search=60,suggestions=25,case=10,submodules=5", help="Endpoint weights")
+@click.option("--zipf", default=1.1, help="Zipf exponent for synthetic query popularity")
+@click.option("--seed", default=0, help="Random seed, for repeatable request sequences")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Compare against earlier results")
+@click.option("--max-regression", default=0.1, help="Allowed latency/throughput regression against --baseline (fraction)")
+def loadtest(url, duration, concurrency, rate, warmup, query_log, mix, zipf, seed, output, baseline, max_regression):
+    """Load-test the web app with replayed or synthetic queries.
+
+    Exits with status 1 if --baseline is given and a metric regressed.
+    """
+    import asyncio
+    from pathlib import Path
+    from .loadtest import Workload, compare_results, discover, load_query_log, run_load_test
+    
+    try:
+        weights = {name.strip(): float(weight) for name, weight in (item.split("=") for item in mix.split(","))}
+    except ValueError:
+        raise click.BadParameter("expected name=weight pairs", param_hint="--mix")
+    
+    discovered_queries, case_ids = asyncio.run(discover(url))
+    if query_log:
+        # A replayed log already carries its own query frequencies
+        workload = Workload(load_query_log(Path(query_log)), case_ids, weights, zipf_exponent=None, seed=seed)
+    else:
+        workload = Workload(discovered_queries, case_ids, weights, zipf_exponent=zipf, seed=seed)
+    
+    mode = f"{rate:g} req/s" if rate else f"{concurrency} users"
+    click.echo(f"Load testing {url} for {duration:g}s at {mode} ({len(workload.queries)} queries, {len(case_ids)} case ids)")
+    results = asyncio.run(run_load_test(url, workload, duration, concurrency=concurrency, rate=rate, warmup=warmup))
+    
+    click.echo(f"\n{'endpoint':<12} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = [("overall", results["overall"])] + list(results["endpoints"].items())
+    for name, summary in rows:
+        click.echo(
+            f"{name:<12} {summary['requests']:>8} {summary['throughput_rps']:>8.1f} "
+            f"{summary['p50_ms'] or 0:>8.1f} {summary['p95_ms'] or 0:>8.1f} {summary['p99_ms'] or 0:>8.1f} "
+            f"{summary['error_rate']:>6.1%}"
+        )
+    if results.get("skipped"):
+        click.echo(click.style(f"{results['skipped']} requests skipped: --concurrency limit reached", fg="yellow"))
+    
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"\nWrote {output}")
+    
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            comparison = compare_results(json.load(f), results, max_regression)
+        regressions = [row for row in comparison if row["regressed"]]
+        click.echo(f"\nCompared with {baseline}:")
+        for row in comparison:
+            marker = click.style("REGRESSED", fg="red") if row["regressed"] else ""
+            click.echo(f"  {row['section']:<12} {row['metric']:<15} {row['baseline']:>10} -> {row['current']:<10} {marker}")
+        if regressions:
+            raise SystemExit(1)
+
+
+@cli.command("meili-stub")
+@click.option("--host", default="127.0.0.1", help="Address to bind")
+@click.option("--port", default=7700, help="Port to bind")
+@click.option("--latency", multiple=True, help="Delay a route: route=seconds (route * for all); repeatable")
+@click.option("--fault", multiple=True, help="Fail a route: route=status[:rate] (status 0 drops the connection); repeatable")
+@click.option("--task-duration", default=0.0, help="Seconds each task takes; 0 completes tasks immediately")
+@click.option("--seed", default=0, help="Random seed for fault rates")
+def meili_stub(host, port, latency, fault, task_duration, seed):
+    """Run an in-memory Meilisearch stand-in for tests and offline work."""
+    from .meili_stub import MeiliStub, ROUTES
+
+    routes = {name for _, _, name in ROUTES} | {"*"}
+
+    def route_of(option: str, value: str) -> tuple:
+        route, _, setting = value.partition("=")
+        if route not in routes or not setting:
+            raise click.BadParameter(f"expected route=value with route one of {', '.join(sorted(routes))}", param_hint=option)
+        return route, setting
+
+    stub = MeiliStub(host=host, port=port, task_duration=task_duration, seed=seed)
+    try:
+        for value in latency:
+            route, seconds = route_of("--latency", value)
+            stub.set_latency(route, float(seconds))
+        for value in fault:
+            route, setting = route_of("--fault", value)
+            status, _, rate = setting.partition(":")
+            stub.inject_fault(route, status=int(status) or None, rate=float(rate or 1.0))
+    except ValueError:
+        raise click.BadParameter("expected numeric values", param_hint="--latency/--fault")
+
+    click.echo(f"Meilisearch stub listening on http://{host}:{port} (set MEILISEARCH_URL to use it)")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+# Cold import budgets of the entry points: time limit in milliseconds, and
+# heavy modules that must only be imported on first use
+IMPORT_BUDGETS = {
+    "search.cli": (150, ["yaml", "numpy", "PIL", "meilisearch", "fastapi"]),
+    "search.web_app": (1500, ["yaml", "numpy", "PIL"]),
+    # Run from the repository root; `manage_db.py search` is used in loops
+    "manage_db": (250, ["numpy", "PIL", "meilisearch", "search.indexer"]),
+}
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+@cli.command("import-budget")
+@click.option("--runs", default=3, help="Cold imports per module; the fastest counts")
+def import_budget(runs):
+    """Check the cold import time and import footprint of the entry points.
+
+    Exits with status 1 if a module is over its time budget or imports a
+    module it should load lazily.
+    """
+    import subprocess
+    import sys
+    
+    failed = False
+    for module, (budget_ms, lazy_modules) in IMPORT_BUDGETS.items():
+        probes = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", _IMPORT_PROBE.format(module=module)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            probes.append(json.loads(output.strip().splitlines()[-1]))
+        
+        best_ms = min(probe["ms"] for probe in probes)
+        loaded = set(probes[0]["modules"])
+        eager = [name for name in lazy_modules if name in loaded]
+        ok = best_ms <= budget_ms and not eager
+        failed = failed or not ok
+        
+        status = click.style("ok", fg="green") if ok else click.style("FAIL", fg="red")
+        click.echo(f"{status}  {module}: {best_ms:.0f} ms (budget {budget_ms} ms)")
+        if eager:
+            click.echo(f"      imported eagerly: {', '.join(eager)}")
+    
+    if failed:
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
     cli()
@@ -29,6 +29,67 @@ SUPPORTED_FILE_TYPES = {
     "images": [".png", ".jpg", ".jpeg", ".webp"]
 }
 
+# Markdown files are indexed as one document per heading section; longer
+# sections are split at paragraph boundaries
+MARKDOWN_SECTION_MAX_CHARS = int(os.getenv("MARKDOWN_SECTION_MAX_CHARS", "8000"))
+
+# Derived data generated at indexing time
+CACHE_DIR = Path(os.getenv("CACHE_DIR", str(BASE_DIR / ".cache")))
+
+# Thumbnail configuration
+THUMBNAIL_DIR = Path(os.getenv("THUMBNAIL_DIR", str(CACHE_DIR / "thumbnails")))
+THUMBNAIL_SIZES = (160, 320, 640)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "0")) or None  # None: one per CPU
+
+# Fingerprint and submodule commits of the sources the current index was built from
+INDEX_STATE_FILE = CACHE_DIR / "index_state.json"
+
+# Local copy of the indexed documents for lookups by id (see docstore.py)
+DOCSTORE_ENABLED = os.getenv("DOCSTORE_ENABLED", "true").lower() in ("1", "true", "yes")
+DOCSTORE_FILE = Path(os.getenv("DOCSTORE_FILE", str(CACHE_DIR / "documents.db")))
+
+# Indexing jobs started from the web app, most recent last
+INDEX_JOB_HISTORY_FILE = CACHE_DIR / "index_jobs.json"
+INDEX_JOB_HISTORY_SIZE = int(os.getenv("INDEX_JOB_HISTORY_SIZE", "20"))
+
+# Cross-process coordination of web workers and the CLI (see coordination.py)
+COORDINATION_DB = CACHE_DIR / "coordination.db"
+INDEX_LEASE_TTL = float(os.getenv("INDEX_LEASE_TTL", "30"))  # seconds
+
+# Profiles of `--profile` runs and profiled requests (see profiling.py)
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(CACHE_DIR / "profiles")))
+
+# Token for request profiling and the /api/admin endpoints; empty disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Seconds between index status refreshes pushed to /api/index-status/stream
+INDEX_STATUS_INTERVAL = float(os.getenv("INDEX_STATUS_INTERVAL", "2"))
+
+# Perceptual image hashes of case images, used for visual similarity
+IMAGE_HASH_FILE = CACHE_DIR / "image_hashes.json"
+
+# "More like this" prompt vectors; 0 components stores plain TF-IDF vectors
+SIMILARITY_DIR = CACHE_DIR / "similarity"
+SIMILARITY_COMPONENTS = int(os.getenv("SIMILARITY_COMPONENTS", "128"))
+
+# Share one upstream call among identical concurrent lookups (see singleflight.py)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Query analytics
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() in ("1", "true", "yes")
+ANALYTICS_DB = Path(os.getenv("ANALYTICS_DB", str(BASE_DIR / ".data" / "analytics.db")))
+ANALYTICS_BUFFER_SIZE = int(os.getenv("ANALYTICS_BUFFER_SIZE", "10000"))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))
+ANALYTICS_RETENTION_DAYS = int(os.getenv("ANALYTICS_RETENTION_DAYS", "90"))
+
+# Cache warm-up at startup and after re-indexing
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_QUERY_COUNT = int(os.getenv("WARMUP_QUERY_COUNT", "50"))
+WARMUP_QUERIES = [q.strip() for q in os.getenv("WARMUP_QUERIES", "").split(",") if q.strip()]
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+WARMUP_POLL_INTERVAL = float(os.getenv("WARMUP_POLL_INTERVAL", "30"))
+
 # Language mappings
 LANGUAGE_MAPPINGS = {
     "zh": "Chinese",
@@ -0,0 +1,191 @@
+"""Coordination between the processes of one deployment, through SQLite.
+
+With several web workers (`python -m search serve --workers N`), plus the
+CLI run by the file watcher, every process has its own module globals. Two
+things have to be shared:
+
+- A lease on indexing, so only one process indexes at a time. The holder
+  renews it while it works and publishes its job record in it, so the
+  other processes can report that job's progress. A lease whose holder
+  died expires after its TTL.
+- Signals: counters any process can bump and every process polls cheaply.
+  The index version signal is bumped after every successful indexing run,
+  so all workers drop and re-warm their caches together.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .config import COORDINATION_DB, INDEX_LEASE_TTL
+
+INDEX_LEASE = "indexing"
+INDEX_VERSION_SIGNAL = "index_version"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS signals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_initialized = set()
+
+
+def _connect(db_path: Path = COORDINATION_DB) -> sqlite3.Connection:
+    # Autocommit mode, so leases can take the write lock with BEGIN IMMEDIATE
+    if db_path not in _initialized:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    if db_path not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized.add(db_path)
+    return conn
+
+
+class Lease:
+    """A named lease held by at most one process at a time."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = INDEX_LEASE_TTL,
+        db_path: Path = COORDINATION_DB
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.db_path = db_path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self, data: Optional[Dict[str, Any]] = None) -> bool:
+        """Take the lease unless another owner holds it and it has not expired."""
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT owner, expires_at FROM leases WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at, data) VALUES (?, ?, ?, ?)",
+                (self.name, self.owner, now + self.ttl, json.dumps(data)),
+            )
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def renew(self, data: Optional[Dict[str, Any]] = None) -> bool:
+        """Extend the lease, replacing its data if given. False if it was lost."""
+        conn = _connect(self.db_path)
+        try:
+            if data is None:
+                cursor = conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+                    (time.time() + self.ttl, self.name, self.owner),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE leases SET expires_at = ?, data = ? WHERE name = ? AND owner = ?",
+                    (time.time() + self.ttl, json.dumps(data), self.name, self.owner),
+                )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self) -> None:
+        self.stop_renewing()
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+        finally:
+            conn.close()
+
+    def holder(self) -> Optional[Dict[str, Any]]:
+        """The current holder as {"owner", "expires_at", "data"}, or None if free."""
+        conn = _connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT owner, expires_at, data FROM leases WHERE name = ? AND expires_at > ?",
+                (self.name, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {"owner": row[0], "expires_at": row[1], "data": json.loads(row[2]) if row[2] else None}
+
+    def keep_alive(self) -> None:
+        """Renew the lease from a background thread until it is released."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._renew_loop, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop_renewing(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not self.renew():
+                    print(f"Lost the {self.name} lease")
+                    return
+            except Exception as e:
+                print(f"Error renewing the {self.name} lease: {e}")
+
+
+def bump_signal(name: str, db_path: Path = COORDINATION_DB) -> int:
+    """Increment a signal. Returns its new value."""
+    conn = _connect(db_path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO signals (name, value, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1, updated_at = excluded.updated_at",
+                (name, time.time()),
+            )
+            return conn.execute("SELECT value FROM signals WHERE name = ?", (name,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def read_signal(name: str, db_path: Path = COORDINATION_DB) -> int:
+    """Current value of a signal; 0 if it was never bumped."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM signals WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def clear_signal(name: str, db_path: Path = COORDINATION_DB) -> None:
+    conn = _connect(db_path)
+    try:
+        conn.execute("DELETE FROM signals WHERE name = ?", (name,))
+    finally:
+        conn.close()
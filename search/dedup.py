@@ -0,0 +1,150 @@
+"""Near-duplicate detection using MinHash signatures and LSH banding.
+
+Signatures use one-permutation hashing: every shingle is hashed once and
+lands in one of NUM_BINS bins, keeping the minimum per bin. Empty bins are
+filled by rotation densification. Candidate pairs come from LSH banding and
+are confirmed against the full signature, so a run is linear in the size
+of the corpus.
+"""
+
+import re
+import unicodedata
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SHINGLE_SIZE = 5
+NUM_BINS = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_BINS // BANDS
+SIMILARITY_THRESHOLD = 0.8
+
+_EMPTY_BIN = 1 << 32
+# Offset added per bin of distance when densifying, keeps borrowed values distinct
+_DENSIFY_OFFSET = 1 << 33
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, width and punctuation so trivial edits do not matter."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"[\W_]+", " ", text)
+    return text.strip()
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Hash the character shingles of normalized text.
+
+    Character shingles work for both whitespace-separated and CJK text.
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < size:
+        return set()
+    return {
+        zlib.crc32(normalized[i:i + size].encode("utf-8"))
+        for i in range(len(normalized) - size + 1)
+    }
+
+
+def minhash_signature(hashes: Iterable[int]) -> Optional[Tuple[int, ...]]:
+    """Compute a densified one-permutation MinHash signature."""
+    signature = [_EMPTY_BIN] * NUM_BINS
+    for value in hashes:
+        bin_index = value % NUM_BINS
+        bin_value = value // NUM_BINS
+        if bin_value < signature[bin_index]:
+            signature[bin_index] = bin_value
+
+    filled = [i for i, value in enumerate(signature) if value != _EMPTY_BIN]
+    if not filled:
+        return None
+
+    if len(filled) < NUM_BINS:
+        # Each empty bin borrows from the next filled bin to its right (circularly)
+        densified = list(signature)
+        next_filled = filled[0] + NUM_BINS
+        for i in range(NUM_BINS - 1, -1, -1):
+            if signature[i] != _EMPTY_BIN:
+                next_filled = i
+            else:
+                distance = next_filled - i
+                densified[i] = signature[next_filled % NUM_BINS] + distance * _DENSIFY_OFFSET
+        signature = densified
+
+    return tuple(signature)
+
+
+def estimate_similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimate Jaccard similarity from two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+
+def find_duplicate_clusters(
+    texts: Sequence[str],
+    threshold: float = SIMILARITY_THRESHOLD
+) -> List[List[int]]:
+    """Cluster near-duplicate texts.
+
+    Returns clusters of two or more positions into `texts`.
+    """
+    signatures = [minhash_signature(shingle_hashes(text)) for text in texts]
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(BANDS):
+        start = band * ROWS_PER_BAND
+        buckets: Dict[Tuple[int, ...], int] = {}
+        for i, signature in enumerate(signatures):
+            if signature is None:
+                continue
+            key = signature[start:start + ROWS_PER_BAND]
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            # Compare against the bucket's first member only; other bands
+            # catch the pairs this misses, and bucket cost stays linear.
+            root_a, root_b = find(first), find(i)
+            if root_a != root_b and estimate_similarity(signatures[first], signature) >= threshold:
+                parent[root_b] = root_a
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def assign_duplicate_groups(
+    documents: List[Dict],
+    text_fields: Sequence[str] = ("prompt", "prompt_en"),
+    id_field: str = "id",
+    threshold: float = SIMILARITY_THRESHOLD
+) -> int:
+    """Set `canonical_id` and `duplicate_group` on every document.
+
+    The canonical document of a cluster is the one with the most text
+    (ties broken by id) and its id doubles as the group id. Documents
+    without duplicates are their own canonical document. Returns the number
+    of clusters found.
+    """
+    texts = [
+        " ".join(str(doc.get(field) or "") for field in text_fields)
+        for doc in documents
+    ]
+
+    for doc in documents:
+        doc["canonical_id"] = doc[id_field]
+        doc["duplicate_group"] = doc[id_field]
+
+    clusters = find_duplicate_clusters(texts, threshold)
+    for members in clusters:
+        canonical = min(members, key=lambda i: (-len(texts[i]), str(documents[i][id_field])))
+        canonical_id = documents[canonical][id_field]
+        for i in members:
+            documents[i]["canonical_id"] = canonical_id
+            documents[i]["duplicate_group"] = canonical_id
+
+    return len(clusters)
@@ -0,0 +1,163 @@
+"""Read-only local copy of the indexed documents, for lookups by id.
+
+Every indexing run also writes the documents it indexed to a SQLite file
+keyed by id, one zlib-compressed JSON record per document, tagged with the
+Meilisearch index version it matches. The web app opens it read-only and
+memory-mapped, so case lookups skip the Meilisearch round trip. The file
+is replaced atomically, and readers reopen it when its mtime changes.
+
+If the index changes some other way, the stored version no longer
+matches: the warm-up (see warmup.py) marks the store stale and lookups go
+to Meilisearch until the next indexing run rewrites it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from .config import DOCSTORE_ENABLED, DOCSTORE_FILE
+from .models import Document
+
+# Bumped when the file layout changes; older files are ignored
+DOCSTORE_VERSION = 1
+# Bytes of the file SQLite maps into memory instead of reading
+MMAP_SIZE = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE documents (
+    id TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def write_docstore(
+    documents: Iterable[Any],
+    index_version: Optional[str],
+    path: Path = DOCSTORE_FILE
+) -> int:
+    """Replace the store with `documents`. Returns the number written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    temp.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(str(temp))
+    try:
+        # A scratch file until the rename: no journal, no fsync per write
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(_SCHEMA)
+        rows = []
+        for doc in documents:
+            data = doc.to_dict() if isinstance(doc, Document) else doc
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            rows.append((data["id"], zlib.compress(body)))
+        conn.executemany("INSERT OR REPLACE INTO documents (id, body) VALUES (?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("version", str(DOCSTORE_VERSION)),
+                ("index_version", index_version or ""),
+                ("document_count", str(len(rows))),
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(temp, path)
+    return len(rows)
+
+
+class DocumentStore:
+    """Read-only, memory-mapped view of a store file."""
+
+    def __init__(self, path: Path = DOCSTORE_FILE):
+        # immutable: the file is only ever replaced, never written in place
+        self.conn = sqlite3.connect(
+            f"{path.resolve().as_uri()}?mode=ro&immutable=1",
+            uri=True,
+            check_same_thread=False
+        )
+        self.conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if meta.get("version") != str(DOCSTORE_VERSION):
+            raise ValueError(f"Unsupported document store version: {meta.get('version')}")
+        self.index_version = meta.get("index_version") or None
+        self.document_count = int(meta.get("document_count", 0))
+        # Set when the index's version no longer matches (see check_docstore)
+        self.stale = False
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """The document with this id, or None if the store doesn't have it."""
+        with self._lock:
+            row = self.conn.execute("SELECT body FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def get_many(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """The stored documents among `doc_ids`, by id."""
+        found = {}
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT id, body FROM documents WHERE id IN ({placeholders})", chunk
+                ).fetchall()
+            for doc_id, body in rows:
+                found[doc_id] = json.loads(zlib.decompress(body))
+        return found
+
+
+_docstore: Optional[DocumentStore] = None
+_docstore_mtime: Optional[float] = None
+
+
+def get_docstore(path: Path = DOCSTORE_FILE) -> Optional[DocumentStore]:
+    """Get the document store, reopening it when the indexer replaces the file.
+
+    Returns None if it is disabled, not written yet, stale or unreadable.
+    """
+    global _docstore, _docstore_mtime
+    if not DOCSTORE_ENABLED:
+        return None
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+
+    if _docstore is None or mtime != _docstore_mtime:
+        try:
+            _docstore = DocumentStore(path)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error opening document store: {e}")
+            _docstore = None
+        _docstore_mtime = mtime
+    if _docstore is None or _docstore.stale:
+        return None
+    return _docstore
+
+
+def check_docstore(index_version: Optional[str]) -> Dict[str, Any]:
+    """Mark the store stale unless it matches the current index version."""
+    store = get_docstore()
+    if store is None:
+        return {"enabled": DOCSTORE_ENABLED, "available": False}
+    store.stale = index_version is not None and store.index_version != index_version
+    if store.stale:
+        print("Document store does not match the index, serving cases from Meilisearch")
+    return {
+        "enabled": True,
+        "available": not store.stale,
+        "documents": store.document_count,
+        "index_version": store.index_version,
+    }
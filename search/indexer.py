@@ -1,204 +1,495 @@
 """Indexer module for extracting and indexing content from submodules."""
 
-import yaml
+import hashlib
+import json
+import os
+import subprocess
 from pathlib import Path
-from typing import List, Dict, Optional
-from .config import SUBMODULES_DIR, GITMODULES_FILE, BASE_DIR
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from .config import SUBMODULES_DIR, GITMODULES_FILE, BASE_DIR, INDEX_STATE_FILE, MARKDOWN_SECTION_MAX_CHARS
+from .dedup import assign_duplicate_groups
+from .cases import extract_case_data
+from .models import Document, DOCUMENT_SCHEMA_VERSION
+from .phash import write_image_index
+from .similarity import build_similarity_index
+from .thumbnails import generate_thumbnails
 from .utils import (
     parse_gitmodules,
-    extract_markdown_text,
-    generate_document_id,
-    determine_language
+    clean_markdown,
+    split_markdown_sections,
+    generate_document_id
 )
 
+# Types of the section documents extracted from markdown files
+MARKDOWN_TYPES = ("readme", "documentation")
+
 
 def scan_submodules() -> List[Dict]:
     """Scan and return list of submodules from .gitmodules."""
     return parse_gitmodules(GITMODULES_FILE)
 
 
-def extract_case_data(case_path: Path, submodule_name: str) -> Optional[Dict]:
-    """Extract case data from case.yml and ATTRIBUTION.yml files."""
-    case_file = case_path / "case.yml"
-    attribution_file = case_path / "ATTRIBUTION.yml"
-    
-    if not case_file.exists():
-        return None
-    
-    try:
-        # Load case.yml
-        with open(case_file, "r", encoding="utf-8") as f:
-            case_data = yaml.safe_load(f) or {}
-        
-        # Load ATTRIBUTION.yml if it exists
-        attribution_data = {}
-        if attribution_file.exists():
-            with open(attribution_file, "r", encoding="utf-8") as f:
-                attribution_data = yaml.safe_load(f) or {}
-        
-        # Extract image file
-        image_file = None
-        image_name = case_data.get("image", "")
-        if image_name:
-            image_path = case_path / image_name
-            if image_path.exists():
-                image_file = str(image_path.relative_to(BASE_DIR))
-        
-        # Build document
-        doc_id = generate_document_id(
-            submodule_name,
-            "case",
-            str(case_path.relative_to(BASE_DIR))
-        )
-        
-        # Determine language
-        title = case_data.get("title", "")
-        title_en = case_data.get("title_en", "")
-        language = determine_language(title, title_en)
-        
-        # Build content string for full-text search
-        content_parts = [
-            case_data.get("title", ""),
-            case_data.get("title_en", ""),
-            case_data.get("prompt", ""),
-            case_data.get("prompt_en", ""),
-            case_data.get("alt_text", ""),
-            case_data.get("alt_text_en", ""),
-            case_data.get("prompt_note", ""),
-            case_data.get("prompt_note_en", ""),
-            case_data.get("reference_note", ""),
-            case_data.get("reference_note_en", ""),
-        ]
-        content = " ".join(filter(None, content_parts))
-        
-        document = {
-            "id": doc_id,
-            "type": "case",
-            "submodule": submodule_name,
-            "path": str(case_path.relative_to(BASE_DIR)),
-            "title": title or "",
-            "title_en": title_en or "",
-            "prompt": case_data.get("prompt", "") or "",
-            "prompt_en": case_data.get("prompt_en", "") or "",
-            "author": case_data.get("author", "") or attribution_data.get("prompt_author", "") or "",
-            "author_link": case_data.get("author_link", "") or attribution_data.get("prompt_author_link", "") or "",
-            "image": image_file or "",
-            "capability_code": case_data.get("capability_code", "") or "",
-            "capability_type": case_data.get("capability_type", "") or "",
-            "content": content,
-            "language": language,
-            "source_links": case_data.get("source_links", []) or [],
-        }
-        
-        return document
-        
-    except Exception as e:
-        print(f"Error extracting case data from {case_path}: {e}")
-        return None
-
+def extract_markdown_sections(md_path: Path, submodule_name: str) -> List[Document]:
+    """Extract a markdown file as one document per heading section.
 
-def extract_markdown_content(md_path: Path, submodule_name: str) -> Optional[Dict]:
-    """Extract content from markdown file."""
+    Each section document carries the heading as its title, the GitHub
+    anchor of the heading, the titles of the enclosing headings
+    (`section_path`) and its 1-based position in the file. Sections with no
+    text of their own are left out; their titles still appear in the
+    section paths below them.
+    """
     if not md_path.exists():
-        return None
+        return []
     
     try:
-        content = extract_markdown_text(md_path)
+        with open(md_path, "r", encoding="utf-8") as f:
+            sections = split_markdown_sections(f.read())
         
-        if not content:
-            return None
+        doc_type = "readme" if md_path.name.lower() == "readme.md" else "documentation"
+        path = str(md_path.relative_to(BASE_DIR))
         
-        doc_id = generate_document_id(
-            submodule_name,
-            "readme" if md_path.name.lower() == "readme.md" else "documentation",
-            str(md_path.relative_to(BASE_DIR))
-        )
+        # Text before the first heading is titled after the file
+        file_title = next((section["title"] for section in sections if section["title"]), md_path.stem)
         
-        # Try to extract title from first heading
-        title = ""
-        lines = content.split("\n")
-        for line in lines[:10]:  # Check first 10 lines
-            if line.startswith("#"):
-                title = line.lstrip("#").strip()
-                break
-        
-        document = {
-            "id": doc_id,
-            "type": "readme" if md_path.name.lower() == "readme.md" else "documentation",
-            "submodule": submodule_name,
-            "path": str(md_path.relative_to(BASE_DIR)),
-            "title": title,
-            "title_en": title,
-            "prompt": "",
-            "prompt_en": "",
-            "author": "",
-            "author_link": "",
-            "image": "",
-            "capability_code": "",
-            "capability_type": "",
-            "content": content,
-            "language": "en",  # Default to English for markdown
-            "source_links": [],
-        }
+        documents = []
+        for section in sections:
+            content = clean_markdown(section["text"])
+            if not content:
+                continue
+            
+            title = section["title"] or file_title
+            for part, chunk in enumerate(split_long_text(content, MARKDOWN_SECTION_MAX_CHARS)):
+                # A section's first part keeps the section id; the file's
+                # preamble keeps the id the whole file used to have
+                key = f"{path}#{section['anchor']}" if section["anchor"] else path
+                if part:
+                    key = f"{key}:{part}"
+                documents.append(Document(
+                    id=generate_document_id(submodule_name, doc_type, key),
+                    type=doc_type,
+                    submodule=submodule_name,
+                    path=path,
+                    title=title,
+                    title_en=title,
+                    content=chunk,
+                    anchor=section["anchor"],
+                    section_path=section["parents"],
+                    section_position=len(documents) + 1,
+                    language="en",  # Default to English for markdown
+                ))
         
-        return document
+        return documents
         
     except Exception as e:
         print(f"Error extracting markdown from {md_path}: {e}")
-        return None
+        return []
+
+
+def split_long_text(text: str, max_chars: int) -> List[str]:
+    """Split text at paragraph boundaries into chunks of at most `max_chars`.
+
+    A single paragraph longer than `max_chars` is kept whole.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        if current and len(current) + 2 + len(paragraph) > max_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def group_sections(documents: List[Document]) -> None:
+    """Put the sections of each markdown file in one duplicate group.
+
+    Collapsed searches (distinct on `duplicate_group`) then return one
+    section per file, the best matching one.
+    """
+    first_section: Dict[str, str] = {}
+    for doc in documents:
+        if doc["type"] in MARKDOWN_TYPES:
+            doc["duplicate_group"] = first_section.setdefault(doc["path"], doc["id"])
+
 
+def build_index(
+    thumbnails: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    database_dir: Optional[str] = None
+) -> List[Document]:
+    """Build index by scanning all submodules and extracting content.
 
-def build_index(rebuild: bool = False) -> List[Dict]:
-    """Build index by scanning all submodules and extracting content."""
+    `progress` is called with ("extract", submodules_done, submodules_total,
+    submodule_name, documents_from_submodule) after each submodule and with
+    (stage_name,) before each post-processing stage. With `database_dir`,
+    the case records parsed by the extractors are also written there as
+    database entries, in the same pass.
+    """
     documents = []
     submodules = scan_submodules()
     
     print(f"Found {len(submodules)} submodules")
     
-    for submodule in submodules:
-        submodule_name = submodule.get("name", "")
-        submodule_path = submodule.get("path", "")
+    for position, submodule in enumerate(submodules, 1):
+        extracted_before = len(documents)
+        extract_submodule(submodule, documents, database_dir)
+        if progress:
+            progress("extract", position, len(submodules), submodule.get("name", ""), len(documents) - extracted_before)
+    
+    print(f"Extracted {len(documents)} documents")
+
+    # Mirrored collections repeat many prompts; group them so search can collapse them
+    if progress:
+        progress("dedup")
+    group_count = assign_duplicate_groups(documents)
+    group_sections(documents)
+    print(f"Found {group_count} groups of near-duplicate prompts")
+
+    if progress:
+        progress("similarity")
+    similarity_count = build_similarity_index(documents)
+    print(f"Built prompt similarity vectors for {similarity_count} cases")
+
+    if thumbnails:
+        if progress:
+            progress("thumbnails")
+        thumbnail_count = generate_thumbnails(documents)
+        print(f"Thumbnails ready for {thumbnail_count} documents")
+        hashed_count = write_image_index(documents)
+        print(f"Wrote perceptual hashes for {hashed_count} images")
+    return documents
+
+
+def extract_submodule(submodule: Dict, documents: List[Document], database_dir: Optional[str] = None) -> None:
+    """Extract the documents of one submodule into `documents`.
+
+    A submodule with an extractor (see extractors.pipeline) gets one
+    document per case it parses, including cases listed in a README; the
+    files the extractor reads are not indexed again.
+    """
+    # Imported here: the extractors themselves import this module
+    from extractors.pipeline import DatabaseSink, SearchSink, extractor_for, run_extractor
+    
+    submodule_name = submodule.get("name", "")
+    submodule_path = submodule.get("path", "")
+    
+    if not submodule_path:
+        return
+    
+    full_path = BASE_DIR / submodule_path
+    
+    if not full_path.exists():
+        print(f"Submodule path does not exist: {full_path}")
+        return
+    
+    print(f"Processing submodule: {submodule_name}")
+    
+    parsed = set()
+    extractor = extractor_for(submodule_path, output_dir=database_dir or "database")
+    if extractor is not None:
+        sinks = [SearchSink(documents)]
+        if database_dir:
+            sinks.append(DatabaseSink())
+        run_extractor(extractor, sinks)
+        parsed = {path.resolve() for path in extractor.source_paths()}
+    
+    # Process cases directory if it exists
+    cases_dir = full_path / "cases"
+    if cases_dir.exists() and cases_dir.is_dir() and cases_dir.resolve() not in parsed:
+        case_dirs = [d for d in cases_dir.iterdir() if d.is_dir() and d.name.isdigit()]
         
+        for case_dir in case_dirs:
+            case_doc = extract_case_data(case_dir, submodule_name)
+            if case_doc:
+                documents.append(case_doc)
+    
+    # Process README files
+    readme_files = [
+        full_path / "README.md",
+        full_path / "README_en.md",
+        full_path / "README_zh.md",
+    ]
+    
+    for readme_file in readme_files:
+        if readme_file.exists() and readme_file.resolve() not in parsed:
+            documents.extend(extract_markdown_sections(readme_file, submodule_name))
+    
+    # Process other markdown files in root
+    for md_file in full_path.glob("*.md"):
+        if md_file.name.lower() not in ["readme.md", "readme_en.md", "readme_zh.md"] and md_file.resolve() not in parsed:
+            documents.extend(extract_markdown_sections(md_file, submodule_name))
+
+
+def source_fingerprint(settings: Optional[Dict[str, Any]] = None) -> str:
+    """Fingerprint the files build_index reads, from their paths, sizes and mtimes.
+
+    Only stats files, so checking whether the index is current costs a
+    directory walk rather than a full extraction. DOCUMENT_SCHEMA_VERSION,
+    the section size limit and `settings` (the index settings) are folded
+    in, so a changed document model also counts as a change.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "schema": DOCUMENT_SCHEMA_VERSION,
+        "section_max_chars": MARKDOWN_SECTION_MAX_CHARS,
+        "settings": settings or {},
+    }, sort_keys=True).encode("utf-8"))
+
+    for submodule in scan_submodules():
+        submodule_path = submodule.get("path", "")
         if not submodule_path:
             continue
-        
         full_path = BASE_DIR / submodule_path
-        
         if not full_path.exists():
-            print(f"Submodule path does not exist: {full_path}")
             continue
-        
-        print(f"Processing submodule: {submodule_name}")
-        
-        # Process cases directory if it exists
+
+        paths = list(full_path.glob("*.md"))
         cases_dir = full_path / "cases"
-        if cases_dir.exists() and cases_dir.is_dir():
-            case_dirs = [d for d in cases_dir.iterdir() if d.is_dir() and d.name.isdigit()]
-            
-            for case_dir in case_dirs:
-                case_doc = extract_case_data(case_dir, submodule_name)
-                if case_doc:
-                    documents.append(case_doc)
-        
-        # Process README files
-        readme_files = [
-            full_path / "README.md",
-            full_path / "README_en.md",
-            full_path / "README_zh.md",
-        ]
+        if cases_dir.is_dir():
+            # Case directories hold case.yml, ATTRIBUTION.yml and the image
+            paths.extend(
+                path
+                for case_dir in cases_dir.iterdir() if case_dir.is_dir() and case_dir.name.isdigit()
+                for path in case_dir.iterdir() if path.is_file()
+            )
+
+        for path in sorted(paths):
+            stat = path.stat()
+            digest.update(f"{path.relative_to(BASE_DIR)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def load_index_state(path: Path = INDEX_STATE_FILE) -> Dict[str, Any]:
+    """State recorded by the last successful indexing run, or {}."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index_state(state: Dict[str, Any], path: Path = INDEX_STATE_FILE) -> None:
+    """Record the state of a successful indexing run, with the document schema it used."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump({**state, "schema": DOCUMENT_SCHEMA_VERSION}, f, indent=2)
+    os.replace(temp, path)
+
+
+def _git(work_tree: Path, *args: str) -> Optional[str]:
+    """Output of a git command run in `work_tree`, or None if it fails."""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(work_tree), *args],
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def submodule_commits() -> Dict[str, str]:
+    """Commit checked out in each submodule, by submodule path.
+
+    Submodules that are not git work trees (e.g. copied into a container
+    without their .git) and ones with uncommitted changes are left out, so
+    the next incremental run scans them in full.
+    """
+    commits = {}
+    for submodule in scan_submodules():
+        submodule_path = submodule.get("path", "")
+        full_path = BASE_DIR / submodule_path
+        if not submodule_path or not full_path.exists():
+            continue
+        # A directory that isn't a work tree of its own would report the parent repository
+        output = _git(full_path, "rev-parse", "--show-toplevel", "HEAD")
+        if not output:
+            continue
+        top_level, head = output.splitlines()
+        if Path(top_level).resolve() != full_path.resolve():
+            continue
+        if _git(full_path, "status", "--porcelain") == "":
+            commits[submodule_path] = head
+    return commits
+
+
+def changed_files(submodule_path: str, old: str, new: str) -> Optional[List[str]]:
+    """Files changed between two commits of a submodule, relative to it.
+
+    None if the diff cannot be computed, e.g. `old` is not in a shallow
+    clone's history any more.
+    """
+    if old == new:
+        return []
+    output = _git(BASE_DIR / submodule_path, "diff", "--name-only", "--no-renames", old, new)
+    if output is None:
+        return None
+    return [line for line in output.splitlines() if line]
+
+
+def change_scopes(submodule_path: str, files: List[str]) -> List[str]:
+    """Paths (relative to BASE_DIR) to re-extract for a submodule's changed files.
+
+    A scope is a case directory, a root markdown file, or a source of the
+    submodule's extractor, which is re-parsed as a whole. Other files do
+    not produce documents.
+    """
+    # Imported here: the extractors themselves import this module
+    from extractors.pipeline import extractor_for
+    
+    full_path = BASE_DIR / submodule_path
+    extractor = extractor_for(submodule_path)
+    sources = [path.relative_to(BASE_DIR) for path in extractor.source_paths()] if extractor else []
+    if extractor and extractor.readme_names is not None:
+        # The README is matched by its listed names, so a new one is noticed too
+        sources = [full_path.relative_to(BASE_DIR) / name for name in extractor.readme_names]
+    
+    scopes = set()
+    for name in files:
+        path = Path(submodule_path) / name
+        parts = Path(name).parts
+        source = next((source for source in sources if path == source or source in path.parents), None)
+        if source is not None:
+            scopes.add(str(source))
+        elif len(parts) >= 3 and parts[0] == "cases" and parts[1].isdigit():
+            scopes.add(str(Path(submodule_path, "cases", parts[1])))
+        elif len(parts) == 1 and name.lower().endswith(".md"):
+            scopes.add(str(path))
+    return sorted(scopes)
+
+
+def extract_scope(submodule: Dict, scope: str, documents: List[Document], database_dir: Optional[str] = None) -> None:
+    """Extract the documents of one change scope (see change_scopes) into `documents`."""
+    from extractors.pipeline import DatabaseSink, SearchSink, extractor_for, run_extractor
+    
+    submodule_name = submodule.get("name", "")
+    submodule_path = submodule.get("path", "")
+    path = BASE_DIR / scope
+    
+    extractor = extractor_for(submodule_path, output_dir=database_dir or "database")
+    if extractor is not None:
+        sources = {str(source.relative_to(BASE_DIR)) for source in extractor.source_paths()}
+        if extractor.readme_names is not None:
+            sources.update(str(Path(submodule_path, name)) for name in extractor.readme_names)
+        if scope in sources:
+            sinks = [SearchSink(documents)]
+            if database_dir:
+                sinks.append(DatabaseSink())
+            run_extractor(extractor, sinks)
+            return
+    
+    if path.is_dir():
+        case_doc = extract_case_data(path, submodule_name)
+        if case_doc:
+            documents.append(case_doc)
+    elif path.is_file():
+        documents.extend(extract_markdown_sections(path, submodule_name))
+
+
+def in_scope(document: Dict, scopes: List[str]) -> bool:
+    """Whether a document was extracted from one of the scopes."""
+    path = document.get("path") or ""
+    return any(path == scope or path.startswith(scope + "/") for scope in scopes)
+
+
+def build_incremental_index(
+    indexed: List[Dict],
+    commits: Dict[str, str],
+    current: Optional[Dict[str, str]] = None,
+    thumbnails: bool = True,
+    database_dir: Optional[str] = None,
+    progress: Optional[Callable[..., None]] = None
+) -> Tuple[List[Document], List[Document], List[str]]:
+    """Update the indexed documents for the submodule files changed since `commits`.
+
+    `indexed` is the current content of the index and `commits` the
+    submodule commits it was built from, `current` the ones checked out
+    now (default: submodule_commits()). Each submodule's changes come
+    from `git diff` between the two;
+    a submodule without a recorded commit, or whose diff cannot be
+    computed, is extracted in full. Returns (documents, changed,
+    removed_ids): the whole corpus after the update, the documents to
+    upload and the ids to delete.
+
+    Duplicate groups, similarity vectors and image hashes span the whole
+    corpus, so they are recomputed over all documents; a document whose
+    duplicate group moved is uploaded again too. `progress` is called with
+    (stage_name,) before each stage, as in build_index.
+    """
+    if progress:
+        progress("extract")
+    documents = [Document.from_dict(doc) for doc in indexed]
+    if current is None:
+        current = submodule_commits()
+    submodules = {submodule.get("path", ""): submodule for submodule in scan_submodules()}
+    
+    scopes: List[str] = []
+    extracted: List[Document] = []
+    for submodule_path in sorted(set(submodules) | set(commits)):
+        if not submodule_path:
+            continue
+        submodule = submodules.get(submodule_path)
+        if submodule is None or not (BASE_DIR / submodule_path).exists():
+            # Removed from .gitmodules or not checked out: drop its documents
+            scopes.append(submodule_path)
+            continue
         
-        for readme_file in readme_files:
-            if readme_file.exists():
-                md_doc = extract_markdown_content(readme_file, submodule_name)
-                if md_doc:
-                    documents.append(md_doc)
+        old, new = commits.get(submodule_path), current.get(submodule_path)
+        files = changed_files(submodule_path, old, new) if old and new else None
+        if files is None:
+            print(f"No usable history for {submodule_path}, scanning it in full")
+            scopes.append(submodule_path)
+            extract_submodule(submodule, extracted, database_dir)
+            continue
         
-        # Process other markdown files in root
-        for md_file in full_path.glob("*.md"):
-            if md_file.name.lower() not in ["readme.md", "readme_en.md", "readme_zh.md"]:
-                md_doc = extract_markdown_content(md_file, submodule_name)
-                if md_doc:
-                    documents.append(md_doc)
+        submodule_scopes = change_scopes(submodule_path, files)
+        if submodule_scopes:
+            print(f"{submodule_path}: {len(files)} changed files, re-extracting {len(submodule_scopes)} paths")
+        for scope in submodule_scopes:
+            scopes.append(scope)
+            extract_scope(submodule, scope, extracted, database_dir)
     
-    print(f"Extracted {len(documents)} documents")
-    return documents
+    extracted_ids = {doc["id"] for doc in extracted}
+    removed_ids = [doc["id"] for doc in documents if in_scope(doc, scopes) and doc["id"] not in extracted_ids]
+    documents = [doc for doc in documents if not in_scope(doc, scopes) and doc["id"] not in extracted_ids]
+    groups_before = {doc["id"]: (doc.get("canonical_id"), doc.get("duplicate_group")) for doc in documents}
+    documents.extend(extracted)
+    
+    print(f"Re-extracted {len(extracted)} documents, removing {len(removed_ids)}")
+    
+    if progress:
+        progress("dedup")
+    group_count = assign_duplicate_groups(documents)
+    group_sections(documents)
+    print(f"Found {group_count} groups of near-duplicate prompts")
+    
+    if progress:
+        progress("similarity")
+    similarity_count = build_similarity_index(documents)
+    print(f"Built prompt similarity vectors for {similarity_count} cases")
+    
+    if thumbnails:
+        if progress:
+            progress("thumbnails")
+        thumbnail_count = generate_thumbnails(extracted)
+        print(f"Thumbnails ready for {thumbnail_count} documents")
+        hashed_count = write_image_index(documents)
+        print(f"Wrote perceptual hashes for {hashed_count} images")
+    
+    regrouped = [
+        doc for doc in documents
+        if doc["id"] in groups_before
+        and groups_before[doc["id"]] != (doc.get("canonical_id"), doc.get("duplicate_group"))
+    ]
+    return documents, extracted + regrouped, removed_ids
@@ -0,0 +1,498 @@
+"""Indexing jobs run in a separate worker process.
+
+The web app used to index in a daemon thread of its own process, where
+extraction, TF-IDF and thumbnail work competed with request handling for
+the GIL. A job now runs the whole pipeline (build_index, then
+index_documents) in a child process that reports progress events over a
+multiprocessing queue. A listener thread in the web process folds those
+events into the job record: documents extracted per submodule, batches
+uploaded and Meilisearch tasks done. The ETA comes from the measured rate
+of the current phase plus the phase durations of the last successful job.
+Finished jobs are kept in a small JSON history under CACHE_DIR.
+
+With several web workers, the indexing lease in coordination.py makes sure
+only one of them runs a job, and carries that job's record to the others.
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .config import INDEX_JOB_HISTORY_FILE, INDEX_JOB_HISTORY_SIZE
+from .coordination import (
+    INDEX_LEASE,
+    INDEX_VERSION_SIGNAL,
+    Lease,
+    bump_signal,
+    clear_signal,
+    read_signal,
+)
+
+# Pipeline phases in order, named after the progress events that start them
+PHASES = ("extract", "dedup", "similarity", "thumbnails", "upload", "task")
+
+# Share of the progress bar per phase until a job has been timed
+_DEFAULT_PHASE_WEIGHTS = {
+    "extract": 0.3,
+    "dedup": 0.05,
+    "similarity": 0.1,
+    "thumbnails": 0.25,
+    "upload": 0.1,
+    "task": 0.2,
+}
+_POLL_INTERVAL = 0.5
+# Seconds between updates of the job record published in the lease
+_PUBLISH_INTERVAL = 1.0
+
+
+def _cancel_signal(job_id: str) -> str:
+    return f"cancel:{job_id}"
+
+
+def _run_job(events: "multiprocessing.Queue", options: Dict[str, Any]) -> None:
+    """Worker process entry point: index everything, reporting to `events`.
+
+    Every event is a (timestamp, kind, args) tuple, where kind is a phase
+    name from the build_index and index_documents progress callbacks, or
+    "done" / "error" at the end.
+    """
+    def report(kind: str, *args) -> None:
+        events.put((time.time(), kind, args))
+
+    try:
+        from .docstore import write_docstore
+        from .indexer import build_index, source_fingerprint, save_index_state, submodule_commits
+        from .search import get_search_engine, index_settings
+
+        search_engine = get_search_engine()
+        if not search_engine.connect_to_meilisearch():
+            report("error", "Could not connect to Meilisearch")
+            return
+        # A rebuild starts from an empty index with fresh settings
+        if options.get("rebuild", False) and not search_engine.delete_index():
+            report("error", "Could not delete the index")
+            return
+        if not search_engine.create_index():
+            report("error", "Could not create index")
+            return
+
+        commits = submodule_commits()
+        fingerprint = source_fingerprint(index_settings())
+        documents = build_index(
+            thumbnails=options.get("thumbnails", True),
+            progress=report,
+        )
+        if not documents:
+            report("error", "No documents found to index")
+            return
+
+        if not search_engine.index_documents(documents, progress=report):
+            report("error", "Failed to index documents")
+            return
+        # Documents the sources no longer produce
+        if search_engine.delete_stale_documents(doc["id"] for doc in documents) is None:
+            report("error", "Failed to delete stale documents")
+            return
+
+        index_version = search_engine.get_index_version()
+        save_index_state({
+            "fingerprint": fingerprint,
+            "index_version": index_version,
+            "document_count": len(documents),
+            "commits": commits,
+        })
+        write_docstore(documents, index_version)
+        report("done", len(documents))
+    except Exception as e:
+        report("error", str(e))
+
+
+def new_job_record(options: Dict[str, Any], source: str = "web") -> Dict[str, Any]:
+    """A fresh job record.
+
+    `source` is "web" for jobs run by JobManager and "cli" for the
+    `index`, `migrate` and `index-report` commands, which take the same lease.
+    """
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "source": source,
+        "status": "running",
+        "options": options,
+        "started_at": time.time(),
+        "finished_at": None,
+        "phase": None,
+        "phases": {},
+        "submodules": {},
+        "submodules_done": 0,
+        "submodules_total": None,
+        "documents": 0,
+        "batches_uploaded": 0,
+        "batches_total": None,
+        "tasks_done": 0,
+        "tasks_total": None,
+        "task_uids": [],
+        "progress": 0,
+        "estimated_time_remaining": None,
+        "error": None,
+    }
+
+
+class JobManager:
+    """Starts indexing jobs, tracks their progress and keeps their history.
+
+    At most one job runs at a time across all web workers and the CLI: a
+    job only starts once its process holds the indexing lease (see
+    coordination.py). The holder publishes the job record in the lease, so
+    every worker can report its progress and ask for it to be cancelled.
+    Job records are plain dicts, so they can be returned from the API as
+    they are.
+    """
+
+    def __init__(
+        self,
+        history_file: Path = INDEX_JOB_HISTORY_FILE,
+        history_size: int = INDEX_JOB_HISTORY_SIZE
+    ):
+        self.history_file = history_file
+        self.history_size = history_size
+        self.finished: List[Dict[str, Any]] = []
+        self._history_mtime: Optional[float] = None
+        self.current: Optional[Dict[str, Any]] = None
+        self._process: Optional[multiprocessing.Process] = None
+        self._lease = Lease(INDEX_LEASE)
+        self._lock = threading.Lock()
+        # spawn rather than fork: the web process has threads of its own
+        self._context = multiprocessing.get_context("spawn")
+
+    # History
+
+    def _load_history(self) -> List[Dict[str, Any]]:
+        """Finished jobs, reloaded whenever any process has appended to them."""
+        try:
+            mtime = self.history_file.stat().st_mtime
+        except OSError:
+            return self.finished
+        if mtime != self._history_mtime:
+            try:
+                with open(self.history_file, "r", encoding="utf-8") as f:
+                    self.finished = json.load(f)
+                self._history_mtime = mtime
+            except (OSError, ValueError) as e:
+                print(f"Error reading indexing job history: {e}")
+        return self.finished
+
+    def _append_history(self, job: Dict[str, Any]) -> None:
+        # Only the lease holder writes, so appends from several workers don't race
+        jobs = [other for other in self._load_history() if other["id"] != job["id"]]
+        jobs.append(job)
+        try:
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.history_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(jobs[-self.history_size:], f)
+            os.replace(temp, self.history_file)
+        except OSError as e:
+            print(f"Error saving indexing job history: {e}")
+
+    def history(self) -> List[Dict[str, Any]]:
+        """All known jobs, most recent first."""
+        active = self.active()
+        with self._lock:
+            jobs = [copy.deepcopy(job) for job in reversed(self._load_history())]
+        if active is not None and all(job["id"] != active["id"] for job in jobs):
+            jobs.insert(0, active)
+        return jobs
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        active = self.active()
+        if active is not None and active["id"] == job_id:
+            return active
+        with self._lock:
+            for job in self._load_history():
+                if job["id"] == job_id:
+                    return copy.deepcopy(job)
+        return None
+
+    def active(self) -> Optional[Dict[str, Any]]:
+        """The job that is running right now in any process, if any."""
+        with self._lock:
+            if self.current is not None:
+                return copy.deepcopy(self.current)
+        holder = self._lease.holder()
+        return holder["data"] if holder else None
+
+    # Starting and cancelling
+
+    def start(self, rebuild: bool = False, thumbnails: bool = True) -> Tuple[Dict[str, Any], bool]:
+        """Start an indexing job.
+
+        Returns (job, started); if a job is already running here or in
+        another process, that job is returned with started False.
+        """
+        with self._lock:
+            if self.current is not None:
+                return copy.deepcopy(self.current), False
+
+            job = new_job_record({"rebuild": rebuild, "thumbnails": thumbnails})
+            if not self._lease.acquire(job):
+                holder = self._lease.holder()
+                return (holder and holder["data"]) or {"status": "running"}, False
+
+            events = self._context.Queue()
+            process = self._context.Process(
+                target=_run_job,
+                args=(events, dict(job["options"])),
+                name=f"index-job-{job['id']}",
+            )
+            # Not a daemon, since thumbnail generation starts a process pool
+            process.start()
+            job["pid"] = process.pid
+            self.current = job
+            self._process = process
+
+        listener = threading.Thread(
+            target=self._follow,
+            args=(job["id"], process, events),
+            name=f"index-job-{job['id']}",
+            daemon=True,
+        )
+        listener.start()
+        return copy.deepcopy(job), True
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Stop a running job. Returns the job, or None if it is unknown.
+
+        A job running in another process is asked to stop through a signal
+        its holder checks every second.
+        """
+        with self._lock:
+            job = self.current
+            if job is not None and job["id"] == job_id:
+                if job["status"] != "running":
+                    return copy.deepcopy(job)
+                job["status"] = "cancelling"
+                self._process.terminate()
+                pending = [str(uid) for uid in job["task_uids"][job["tasks_done"]:]]
+            else:
+                job = None
+
+        if job is None:
+            job = self.get(job_id)
+            # CLI runs are only stopped from their terminal
+            if job is not None and job["status"] == "running" and job.get("source") == "web":
+                bump_signal(_cancel_signal(job_id))
+                job["status"] = "cancelling"
+            return job
+
+        # Batches already handed to Meilisearch would otherwise still be applied
+        if pending:
+            from .search import get_search_engine
+            try:
+                get_search_engine().client.cancel_tasks({
+                    "uids": pending,
+                    "statuses": ["enqueued", "processing"],
+                })
+            except Exception as e:
+                print(f"Error cancelling Meilisearch tasks: {e}")
+        return self.get(job_id)
+
+    def shutdown(self) -> None:
+        """Cancel the job running in this process, so it does not outlive the web app."""
+        with self._lock:
+            job, process = self.current, self._process
+        if job is not None:
+            self.cancel(job["id"])
+            process.join(timeout=10)
+
+    # Progress
+
+    def _follow(self, job_id: str, process: multiprocessing.Process, events: "multiprocessing.Queue") -> None:
+        """Apply the worker's events to its job until the worker exits.
+
+        However following fails, the job ends up finished and the lease
+        released, so a broken listener cannot leave a job running forever.
+        """
+        try:
+            self._watch(job_id, process, events)
+        except Exception as e:
+            # e.g. a malformed event: stop the worker rather than let it run
+            # unsupervised
+            print(f"Error following indexing job {job_id}: {e}")
+            with self._lock:
+                job = self.current
+                if job["status"] in ("running", "cancelling"):
+                    job["status"] = "failed"
+                    job["error"] = f"Error following the indexing worker: {e}"
+            process.terminate()
+
+        process.join()
+        with self._lock:
+            job = self.current
+            try:
+                if job["status"] == "cancelling":
+                    job["status"] = "cancelled"
+                elif job["status"] == "running":
+                    job["status"] = "failed"
+                    job["error"] = job["error"] or f"Indexing worker exited with code {process.exitcode}"
+                job["finished_at"] = job["finished_at"] or time.time()
+                self._close_phase(job, job["finished_at"])
+                job["estimated_time_remaining"] = None
+                self._append_history(job)
+            except Exception as e:
+                print(f"Error finishing indexing job {job_id}: {e}")
+            finally:
+                # Release before freeing the slot, under the same lock: a
+                # start() that found the slot free would take the lease again
+                # under the same owner, and this release would then drop it
+                try:
+                    self._lease.release()
+                except Exception as e:
+                    print(f"Error releasing the indexing lease: {e}")
+                self.current = None
+                self._process = None
+
+        try:
+            events.close()
+            clear_signal(_cancel_signal(job_id))
+            if job["status"] == "succeeded":
+                # Every worker, this one included, re-warms its caches on this signal
+                bump_signal(INDEX_VERSION_SIGNAL)
+        except Exception as e:
+            print(f"Error finishing indexing job {job_id}: {e}")
+        print(f"Indexing job {job_id} {job['status']}")
+
+    def _watch(self, job_id: str, process: multiprocessing.Process, events: "multiprocessing.Queue") -> None:
+        """Apply events and keep the lease renewed until the worker exits."""
+        published = 0.0
+        while True:
+            try:
+                event = events.get(timeout=_POLL_INTERVAL)
+                with self._lock:
+                    self._apply(self.current, *event)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+
+            # Keep the lease and the job record other workers see up to date
+            if time.monotonic() - published >= _PUBLISH_INTERVAL:
+                published = time.monotonic()
+                try:
+                    with self._lock:
+                        snapshot = copy.deepcopy(self.current)
+                    if not self._lease.renew(snapshot):
+                        print(f"Indexing job {job_id} lost its lease")
+                    if snapshot["status"] == "running" and read_signal(_cancel_signal(job_id)):
+                        self.cancel(job_id)
+                except Exception as e:
+                    print(f"Error publishing indexing job {job_id}: {e}")
+
+    def _apply(self, job: Dict[str, Any], ts: float, kind: str, args: tuple) -> None:
+        if kind == "done":
+            job["status"] = "succeeded" if job["status"] == "running" else job["status"]
+            job["finished_at"] = ts
+            self._close_phase(job, ts)
+            job["documents"] = args[0]
+            job["progress"] = 100
+            return
+        if kind == "error":
+            job["error"] = args[0]
+            if job["status"] == "running":
+                job["status"] = "failed"
+            job["finished_at"] = ts
+            return
+
+        if kind != job["phase"]:
+            self._close_phase(job, ts)
+            job["phase"] = kind
+            job["phases"][kind] = {"started_at": ts, "seconds": None}
+
+        if kind == "extract":
+            done, total, submodule, count = args
+            job["submodules_done"] = done
+            job["submodules_total"] = total
+            job["submodules"][submodule] = count
+            job["documents"] += count
+        elif kind == "upload":
+            done, total, task_uid = args
+            job["batches_uploaded"] = done
+            job["batches_total"] = total
+            job["task_uids"].append(task_uid)
+        elif kind == "task":
+            job["tasks_done"], job["tasks_total"] = args
+
+        self._estimate(job, ts)
+
+    @staticmethod
+    def _close_phase(job: Dict[str, Any], ts: float) -> None:
+        phase = job["phases"].get(job["phase"])
+        if phase is not None and phase["seconds"] is None:
+            phase["seconds"] = round(ts - phase["started_at"], 3)
+
+    def _reference_durations(self, job: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """Phase durations of the last successful job run with the same options."""
+        for other in reversed(self._load_history()):
+            if other["status"] == "succeeded" and other["options"] == job["options"]:
+                return {name: phase["seconds"] or 0.0 for name, phase in other["phases"].items()}
+        return None
+
+    def _estimate(self, job: Dict[str, Any], now: float) -> None:
+        """Update the progress percentage and the ETA from the measured rates."""
+        phases = [name for name in PHASES if name != "thumbnails" or job["options"]["thumbnails"]]
+        current = job["phase"]
+        position = phases.index(current)
+        reference = self._reference_durations(job)
+
+        # Fraction of the current phase that is done, where it can be counted
+        counters = {
+            "extract": (job["submodules_done"], job["submodules_total"]),
+            "upload": (job["batches_uploaded"], job["batches_total"]),
+            "task": (job["tasks_done"], job["tasks_total"]),
+        }
+        done, total = counters.get(current, (0, None))
+        fraction = done / total if total else 0.0
+
+        weights = _DEFAULT_PHASE_WEIGHTS
+        if reference and sum(reference.values()) > 0:
+            weights = reference
+        weight_total = sum(weights.get(name, 0.0) for name in phases) or 1.0
+        completed = sum(weights.get(name, 0.0) for name in phases[:position])
+        progress = (completed + weights.get(current, 0.0) * fraction) / weight_total
+        # 100 is reserved for a finished job
+        job["progress"] = min(99, int(progress * 100))
+
+        # Remaining time of the current phase at its measured rate
+        elapsed = now - job["phases"][current]["started_at"]
+        if fraction > 0:
+            current_remaining = elapsed * (1 - fraction) / fraction
+        elif reference and current in reference:
+            current_remaining = max(0.0, reference[current] - elapsed)
+        else:
+            current_remaining = None
+
+        if reference and current_remaining is not None:
+            later = sum(reference.get(name, 0.0) for name in phases[position + 1:])
+            job["estimated_time_remaining"] = int(current_remaining + later)
+        elif progress > 0:
+            # No timed job yet: extrapolate from the overall rate so far
+            overall = now - job["started_at"]
+            job["estimated_time_remaining"] = int(overall * (1 - progress) / progress)
+        else:
+            job["estimated_time_remaining"] = None
+
+
+# Global job manager instance
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Get or create the global job manager."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
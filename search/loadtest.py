@@ -0,0 +1,429 @@
+"""Load generator for the web app.
+
+Replays a query log, or synthetic queries drawn from a Zipf distribution
+(a few queries very often, a long tail rarely, like real traffic), against
+/api/search, /api/suggestions, /api/case/{id} and /api/submodules. It uses
+a minimal HTTP/1.1 keep-alive client on asyncio streams, so it needs
+nothing beyond the standard library and its own overhead stays small next
+to the server's.
+
+Two modes:
+
+- Closed loop (`concurrency`): that many virtual users send requests back
+  to back. Measures the throughput the server sustains.
+- Open loop (`rate`): requests start on a fixed schedule, whatever the
+  server does. Latency is measured from the scheduled start, so queueing
+  behind a slow server counts against it instead of quietly lowering the
+  offered load.
+
+Results (throughput, p50/p95/p99 latency and error rates, per endpoint and
+overall) can be written as JSON and compared against an earlier run.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+ENDPOINTS = ("search", "suggestions", "case", "submodules")
+DEFAULT_MIX = {"search": 60, "suggestions": 25, "case": 10, "submodules": 5}
+DEFAULT_ZIPF_EXPONENT = 1.1
+PERCENTILES = (50, 95, 99)
+
+# Used when the server has no documents to draw a vocabulary from
+_SEED_WORDS = [
+    "portrait", "anime", "photo", "figure", "style", "sketch", "poster", "logo",
+    "landscape", "product", "character", "3d", "watercolor", "cartoon", "cinematic",
+    "手办", "海报", "人物", "风格", "照片",
+]
+_WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9-]{2,}|[\u4e00-\u9fff]{2,4}")
+_DISCOVERY_LIMIT = 200
+_RESPONSE_TIMEOUT = 30
+
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection, reopened after errors."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, path: str) -> Tuple[int, bytes]:
+        """Send a GET request. Returns (status, body)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            self.writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n".encode("ascii")
+            )
+            await self.writer.drain()
+            return await asyncio.wait_for(self._read_response(), _RESPONSE_TIMEOUT)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            body = b"".join(chunks)
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", "0")))
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+# Workload
+
+class Workload:
+    """Draws (endpoint, path) requests from a query list and a set of case ids.
+
+    Queries are picked by Zipf rank: the query at rank k is chosen with
+    weight 1 / k^exponent. A replayed log keeps its own frequencies instead.
+    """
+
+    def __init__(
+        self,
+        queries: List[str],
+        case_ids: List[str],
+        mix: Dict[str, float] = DEFAULT_MIX,
+        zipf_exponent: Optional[float] = DEFAULT_ZIPF_EXPONENT,
+        seed: int = 0
+    ):
+        if not queries:
+            raise ValueError("The workload needs at least one query")
+        self.queries = queries
+        self.case_ids = case_ids
+        self.random = random.Random(seed)
+
+        mix = {name: weight for name, weight in mix.items() if weight > 0}
+        if not case_ids:
+            mix.pop("case", None)
+        self.endpoints = list(mix)
+        self.endpoint_weights = list(accumulate(mix.values()))
+
+        if zipf_exponent is None:
+            self.query_weights = None
+        else:
+            self.query_weights = list(accumulate(
+                1 / rank ** zipf_exponent for rank in range(1, len(queries) + 1)
+            ))
+
+    def next_request(self) -> Tuple[str, str]:
+        endpoint = self.random.choices(self.endpoints, cum_weights=self.endpoint_weights)[0]
+        if endpoint == "submodules":
+            return endpoint, "/api/submodules"
+        if endpoint == "case":
+            return endpoint, f"/api/case/{quote(self.random.choice(self.case_ids), safe='')}"
+
+        if self.query_weights is None:
+            query = self.random.choice(self.queries)
+        else:
+            query = self.random.choices(self.queries, cum_weights=self.query_weights)[0]
+        if endpoint == "suggestions":
+            # Autocomplete sees prefixes of what users go on to type
+            query = query[:self.random.randint(1, len(query))]
+            return endpoint, f"/api/suggestions?q={quote(query)}"
+        return endpoint, f"/api/search?q={quote(query)}"
+
+
+def load_query_log(path: Path) -> List[str]:
+    """Queries from a log file, one per occurrence.
+
+    Accepts plain text (one query per line) or JSON lines with a "query"
+    and an optional "count", such as the rows of
+    /api/analytics/top-queries written one per line.
+    """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                queries.extend([record["query"]] * int(record.get("count", 1)))
+            else:
+                queries.append(line)
+    return queries
+
+
+async def discover(base_url: str) -> Tuple[List[str], List[str]]:
+    """Harvest case ids and a query vocabulary from the running server.
+
+    Returns (queries, case_ids); queries are ordered by how often their
+    words occur in the sampled documents, most frequent first, so Zipf
+    ranks follow the corpus.
+    """
+    parts = urlsplit(base_url)
+    connection = HTTPConnection(parts.hostname, parts.port or 80)
+    try:
+        status, body = await connection.get(f"/api/search?q=&limit={_DISCOVERY_LIMIT}")
+    except OSError:
+        status, body = 0, b""
+    finally:
+        connection.close()
+
+    hits = json.loads(body).get("hits", []) if status == 200 else []
+    case_ids = [hit["id"] for hit in hits if hit.get("type") == "case" and hit.get("id")]
+
+    counts: Dict[str, int] = {}
+    for hit in hits:
+        text = " ".join(str(hit.get(field) or "") for field in ("title", "title_en", "prompt", "prompt_en"))
+        for word in _WORD_PATTERN.findall(text.lower()):
+            counts[word] = counts.get(word, 0) + 1
+    queries = sorted(counts, key=lambda word: -counts[word]) or list(_SEED_WORDS)
+    return queries, case_ids
+
+
+# Measurement
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Collects per-request outcomes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.statuses: Dict[str, Dict[str, int]] = {name: {} for name in ENDPOINTS}
+
+    def record(self, endpoint: str, status: str, latency_ms: float) -> None:
+        self.latencies[endpoint].append(latency_ms)
+        counts = self.statuses[endpoint]
+        counts[status] = counts.get(status, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name in ENDPOINTS:
+            if self.latencies[name]:
+                endpoints[name] = _summarize(self.latencies[name], self.statuses[name], duration)
+
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        all_statuses: Dict[str, int] = {}
+        for counts in self.statuses.values():
+            for status, count in counts.items():
+                all_statuses[status] = all_statuses.get(status, 0) + count
+        return {
+            "duration_s": round(duration, 3),
+            "overall": _summarize(all_latencies, all_statuses, duration),
+            "endpoints": endpoints,
+        }
+
+
+def _summarize(latencies: List[float], statuses: Dict[str, int], duration: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    # A 404 for an unknown case is an answer, not a failure
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "404")))
+    summary = {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / duration, 2) if duration > 0 else 0.0,
+        "error_rate": round(errors / len(values), 4) if values else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "mean_ms": round(sum(values) / len(values), 2) if values else None,
+        "max_ms": round(values[-1], 2) if values else None,
+    }
+    for q in PERCENTILES:
+        value = percentile(values, q)
+        summary[f"p{q}_ms"] = round(value, 2) if value is not None else None
+    return summary
+
+
+async def _send(connection: HTTPConnection, endpoint: str, path: str, started: float, recorder: Recorder) -> None:
+    try:
+        status, _ = await connection.get(path)
+        outcome = str(status)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        outcome = "connection_error"
+    recorder.record(endpoint, outcome, (time.perf_counter() - started) * 1000)
+
+
+async def _closed_loop(host: str, port: int, workload: Workload, concurrency: int, deadline: float, recorder: Recorder) -> None:
+    async def user():
+        connection = HTTPConnection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                endpoint, path = workload.next_request()
+                await _send(connection, endpoint, path, time.perf_counter(), recorder)
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def _open_loop(
+    host: str,
+    port: int,
+    workload: Workload,
+    rate: float,
+    max_in_flight: int,
+    deadline: float,
+    recorder: Recorder
+) -> int:
+    """Start requests at `rate` per second. Returns how many were skipped
+    because `max_in_flight` requests were already outstanding."""
+    idle: List[HTTPConnection] = []
+    in_flight = set()
+    skipped = 0
+
+    async def run(endpoint: str, path: str, scheduled: float):
+        connection = idle.pop() if idle else HTTPConnection(host, port)
+        try:
+            await _send(connection, endpoint, path, scheduled, recorder)
+        finally:
+            idle.append(connection)
+
+    interval = 1 / rate
+    next_start = time.perf_counter()
+    while next_start < deadline:
+        delay = next_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint, path = workload.next_request()
+        if len(in_flight) >= max_in_flight:
+            skipped += 1
+        else:
+            task = asyncio.ensure_future(run(endpoint, path, next_start))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_start += interval
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+    for connection in idle:
+        connection.close()
+    return skipped
+
+
+async def run_load_test(
+    base_url: str,
+    workload: Workload,
+    duration: float,
+    concurrency: int = 10,
+    rate: Optional[float] = None,
+    warmup: float = 0.0
+) -> Dict[str, Any]:
+    """Run a load test and return its summary.
+
+    With `rate`, runs open loop with at most `concurrency` requests in
+    flight; otherwise runs `concurrency` closed-loop users. Requests made
+    during the first `warmup` seconds are not counted.
+    """
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+
+    if warmup > 0:
+        await _closed_loop(host, port, workload, concurrency, time.perf_counter() + warmup, Recorder())
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration
+    skipped = 0
+    if rate:
+        skipped = await _open_loop(host, port, workload, rate, concurrency, deadline, recorder)
+    else:
+        await _closed_loop(host, port, workload, concurrency, deadline, recorder)
+
+    summary = recorder.summary(time.perf_counter() - started)
+    summary["config"] = {
+        "url": base_url,
+        "mode": "open" if rate else "closed",
+        "rate": rate,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "warmup_s": warmup,
+        "queries": len(workload.queries),
+        "case_ids": len(workload.case_ids),
+        "mix": dict(zip(workload.endpoints, _weights(workload.endpoint_weights))),
+    }
+    if rate:
+        summary["skipped"] = skipped
+    summary["finished_at"] = time.time()
+    return summary
+
+
+def _weights(cumulative: List[float]) -> List[float]:
+    return [b - a for a, b in zip([0.0] + cumulative[:-1], cumulative)]
+
+
+# Regression comparison
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    max_regression: float = 0.1
+) -> List[Dict[str, Any]]:
+    """Compare two summaries, endpoint by endpoint.
+
+    Returns one row per metric with "regressed" set where p95/p99 latency
+    grew, or throughput fell, by more than `max_regression` (a fraction),
+    or where the error rate went up at all. Throughput is only compared
+    between closed-loop runs.
+    """
+    # Open-loop throughput is just the offered rate
+    closed_loop = all(result.get("config", {}).get("mode") == "closed" for result in (baseline, current))
+    metrics = [("p95_ms", True), ("p99_ms", True), ("error_rate", True)]
+    if closed_loop:
+        metrics.insert(2, ("throughput_rps", False))
+
+    rows = []
+    sections = [("overall", baseline.get("overall"), current.get("overall"))]
+    for name in ENDPOINTS:
+        sections.append((name, baseline["endpoints"].get(name), current["endpoints"].get(name)))
+
+    for section, before, after in sections:
+        if not before or not after:
+            continue
+        for metric, higher_is_worse in metrics:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == "error_rate":
+                regressed = new > old
+            elif not old:
+                regressed = False
+            else:
+                change = (new - old) / old
+                regressed = change > max_regression if higher_is_worse else -change > max_regression
+            rows.append({"section": section, "metric": metric, "baseline": old, "current": new, "regressed": regressed})
+    return rows
@@ -0,0 +1,969 @@
+"""In-memory stand-in for the part of the Meilisearch API this package uses.
+
+Serves index creation and lookup, stats, settings, document add/get,
+search, tasks (including cancellation) and health over HTTP, so
+SearchEngine and the web app run against it unchanged with MEILISEARCH_URL
+pointed at it. Beyond what Meilisearch does, it can:
+
+- delay any route by a fixed latency,
+- fail requests to a route with a given status, at a given rate or for the
+  next N requests, or drop the connection without answering,
+- record every call it receives, for tests to assert on,
+- process tasks synchronously (the default, so runs are deterministic) or
+  one at a time with a fixed duration, to exercise task polling.
+
+Search is a plain substring match over the searchable attributes, ranked
+by how early the matching attributes come; it is meant for exercising the
+code paths around search, not for judging relevance. Filters support the
+syntax this package builds: =, !=, <, >, <=, >=, IN [...], NOT, AND, OR and
+parentheses, as strings or nested arrays.
+
+Tests can configure it in-process (MeiliStub.set_latency, inject_fault,
+calls), or over HTTP from another process through /_stub/config,
+/_stub/calls and /_stub/reset.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+MEILISEARCH_VERSION = "1.5.0"
+
+DEFAULT_SETTINGS = {
+    "displayedAttributes": ["*"],
+    "searchableAttributes": ["*"],
+    "filterableAttributes": [],
+    "sortableAttributes": [],
+    "rankingRules": ["words", "typo", "proximity", "attribute", "sort", "exactness"],
+    "stopWords": [],
+    "synonyms": {},
+    "distinctAttribute": None,
+    "typoTolerance": {"enabled": True},
+    "faceting": {"maxValuesPerFacet": 100},
+    "pagination": {"maxTotalHits": 1000},
+}
+
+# (method, path pattern, route name); the route name is what latency,
+# faults and call records refer to
+ROUTES = [
+    ("GET", r"/health", "health"),
+    ("GET", r"/version", "version"),
+    ("GET", r"/indexes", "list_indexes"),
+    ("POST", r"/indexes", "create_index"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)", "get_index"),
+    ("DELETE", r"/indexes/(?P<uid>[^/]+)", "delete_index"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)/stats", "stats"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)/settings", "get_settings"),
+    ("PATCH", r"/indexes/(?P<uid>[^/]+)/settings", "update_settings"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)/settings/(?P<setting>[a-z-]+)", "get_settings"),
+    ("PUT", r"/indexes/(?P<uid>[^/]+)/settings/(?P<setting>[a-z-]+)", "update_settings"),
+    ("PATCH", r"/indexes/(?P<uid>[^/]+)/settings/(?P<setting>[a-z-]+)", "update_settings"),
+    ("DELETE", r"/indexes/(?P<uid>[^/]+)/settings/(?P<setting>[a-z-]+)", "update_settings"),
+    ("POST", r"/indexes/(?P<uid>[^/]+)/documents", "add_documents"),
+    ("PUT", r"/indexes/(?P<uid>[^/]+)/documents", "update_documents"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)/documents", "get_documents"),
+    ("POST", r"/indexes/(?P<uid>[^/]+)/documents/delete-batch", "delete_documents"),
+    ("POST", r"/indexes/(?P<uid>[^/]+)/documents/fetch", "fetch_documents"),
+    ("GET", r"/indexes/(?P<uid>[^/]+)/documents/(?P<document_id>[^/]+)", "get_document"),
+    ("POST", r"/indexes/(?P<uid>[^/]+)/search", "search"),
+    ("GET", r"/tasks", "get_tasks"),
+    ("GET", r"/tasks/(?P<task_uid>\d+)", "get_task"),
+    ("POST", r"/tasks/cancel", "cancel_tasks"),
+]
+_COMPILED_ROUTES = [(method, re.compile(f"^{pattern}$"), name) for method, pattern, name in ROUTES]
+
+
+class StubError(Exception):
+    """An error answered in Meilisearch's error format."""
+
+    def __init__(self, status: int, code: str, message: str, error_type: str = "invalid_request"):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.error_type = error_type
+
+    def body(self) -> Dict[str, str]:
+        return {
+            "message": self.message,
+            "code": self.code,
+            "type": self.error_type,
+            "link": f"https://docs.meilisearch.com/errors#{self.code}",
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+# Filters
+
+_FILTER_TOKEN = re.compile(
+    r"""\s*(?:(?P<punct>\(|\)|\[|\]|,)|(?P<op>!=|>=|<=|=|>|<)"""
+    r"""|'(?P<single>(?:[^'\\]|\\.)*)'|"(?P<double>(?:[^"\\]|\\.)*)"|(?P<word>[^\s()\[\],=!<>]+))"""
+)
+
+
+def _tokenize_filter(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _FILTER_TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise StubError(400, "invalid_search_filter", f"Invalid filter near `{expression[position:]}`")
+        position = match.end()
+        for kind in ("punct", "op", "single", "double", "word"):
+            value = match.group(kind)
+            if value is not None:
+                if kind in ("single", "double"):
+                    tokens.append(("value", re.sub(r"\\(.)", r"\1", value)))
+                else:
+                    tokens.append((kind, value))
+                break
+    return tokens
+
+
+class _FilterParser:
+    """Recursive descent parser turning a filter string into a predicate."""
+
+    def __init__(self, expression: str, filterable: List[str]):
+        self.tokens = _tokenize_filter(expression)
+        self.position = 0
+        self.filterable = filterable
+
+    def parse(self) -> Callable[[Dict], bool]:
+        predicate = self._or()
+        if self.position != len(self.tokens):
+            raise StubError(400, "invalid_search_filter", f"Unexpected `{self.tokens[self.position][1]}` in filter")
+        return predicate
+
+    def _peek_keyword(self, keyword: str) -> bool:
+        if self.position < len(self.tokens):
+            kind, value = self.tokens[self.position]
+            return kind == "word" and value.upper() == keyword
+        return False
+
+    def _next(self) -> Tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise StubError(400, "invalid_search_filter", "Filter ended unexpectedly")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _or(self) -> Callable[[Dict], bool]:
+        parts = [self._and()]
+        while self._peek_keyword("OR"):
+            self.position += 1
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else (lambda doc: any(part(doc) for part in parts))
+
+    def _and(self) -> Callable[[Dict], bool]:
+        parts = [self._not()]
+        while self._peek_keyword("AND"):
+            self.position += 1
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else (lambda doc: all(part(doc) for part in parts))
+
+    def _not(self) -> Callable[[Dict], bool]:
+        if self._peek_keyword("NOT"):
+            self.position += 1
+            inner = self._not()
+            return lambda doc: not inner(doc)
+        return self._primary()
+
+    def _primary(self) -> Callable[[Dict], bool]:
+        kind, value = self._next()
+        if kind == "punct" and value == "(":
+            inner = self._or()
+            if self._next() != ("punct", ")"):
+                raise StubError(400, "invalid_search_filter", "Missing `)` in filter")
+            return inner
+        if kind not in ("word", "value"):
+            raise StubError(400, "invalid_search_filter", f"Expected an attribute, found `{value}`")
+
+        attribute = value
+        if attribute not in self.filterable and "*" not in self.filterable:
+            raise StubError(
+                400, "invalid_search_filter",
+                f"Attribute `{attribute}` is not filterable. Available filterable attributes are: "
+                f"`{', '.join(self.filterable)}`."
+            )
+
+        negate = False
+        if self._peek_keyword("NOT"):
+            self.position += 1
+            negate = True
+        if self._peek_keyword("IN"):
+            self.position += 1
+            values = self._list()
+            return lambda doc: _matches(doc, attribute, lambda field: field in values) != negate
+
+        kind, operator = self._next()
+        if kind != "op" or negate:
+            raise StubError(400, "invalid_search_filter", f"Expected an operator after `{attribute}`")
+        operand = self._next()[1]
+        return lambda doc: _matches(doc, attribute, lambda field: _compare(field, operator, operand))
+
+    def _list(self) -> set:
+        if self._next() != ("punct", "["):
+            raise StubError(400, "invalid_search_filter", "Expected `[` after IN")
+        values = set()
+        while True:
+            kind, value = self._next()
+            if kind == "punct" and value == "]":
+                return values
+            if kind == "punct" and value == ",":
+                continue
+            values.add(value)
+
+
+def _field_values(doc: Dict, attribute: str) -> List[str]:
+    value = doc.get(attribute)
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return ["true" if v is True else "false" if v is False else str(v) for v in values]
+
+
+def _matches(doc: Dict, attribute: str, test: Callable[[str], bool]) -> bool:
+    return any(test(field) for field in _field_values(doc, attribute))
+
+
+def _compare(field: str, operator: str, operand: str) -> bool:
+    if operator == "=":
+        return field == operand
+    if operator == "!=":
+        return field != operand
+    try:
+        left, right = float(field), float(operand)
+    except ValueError:
+        return False
+    return {"<": left < right, ">": left > right, "<=": left <= right, ">=": left >= right}[operator]
+
+
+def compile_filter(expression: Any, filterable: List[str]) -> Optional[Callable[[Dict], bool]]:
+    """Predicate for a filter given as a string or as nested arrays.
+
+    In array form, the outer list is ANDed and inner lists are ORed.
+    """
+    if not expression:
+        return None
+    if isinstance(expression, str):
+        return _FilterParser(expression, filterable).parse()
+    parts = []
+    for item in expression:
+        if isinstance(item, list):
+            alternatives = [compile_filter(alternative, filterable) for alternative in item]
+            parts.append(lambda doc, alternatives=alternatives: any(test(doc) for test in alternatives))
+        else:
+            parts.append(compile_filter(item, filterable))
+    return lambda doc: all(part(doc) for part in parts)
+
+
+# Store
+
+class MeiliStore:
+    """Indexes, documents and tasks, guarded by one lock."""
+
+    def __init__(self, task_duration: float = 0.0):
+        self.task_duration = task_duration
+        self.indexes: Dict[str, Dict[str, Any]] = {}
+        self.tasks: List[Dict[str, Any]] = []
+        self.lock = threading.RLock()
+        self._pending = threading.Condition(self.lock)
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # Tasks
+
+    def enqueue(self, task_type: str, index_uid: Optional[str], apply: Callable[[], Dict], details: Optional[Dict] = None) -> Dict:
+        """Record a task. Returns its summary, as Meilisearch answers with 202."""
+        with self.lock:
+            task = {
+                "uid": len(self.tasks),
+                "indexUid": index_uid,
+                "status": "enqueued",
+                "type": task_type,
+                "details": details or {},
+                "error": None,
+                "canceledBy": None,
+                "duration": None,
+                "enqueuedAt": _now(),
+                "startedAt": None,
+                "finishedAt": None,
+                "_apply": apply,
+            }
+            self.tasks.append(task)
+            summary = {
+                "taskUid": task["uid"],
+                "indexUid": index_uid,
+                "status": "enqueued",
+                "type": task_type,
+                "enqueuedAt": task["enqueuedAt"],
+            }
+            if self.task_duration <= 0:
+                self._process(task)
+            else:
+                self._ensure_worker()
+                self._pending.notify()
+            return summary
+
+    def _process(self, task: Dict) -> None:
+        task["status"] = "processing"
+        task["startedAt"] = _now()
+        try:
+            task["details"].update(task.pop("_apply")() or {})
+            task["status"] = "succeeded"
+        except StubError as e:
+            task["status"] = "failed"
+            task["error"] = e.body()
+        task["finishedAt"] = _now()
+        task["duration"] = "PT0S"
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="meili-stub-tasks", daemon=True)
+            self._worker.start()
+
+    def _work(self) -> None:
+        # Like Meilisearch, process one task at a time in order, except that
+        # cancelations go first
+        while True:
+            with self.lock:
+                while not self._stopped and not any(t["status"] == "enqueued" for t in self.tasks):
+                    self._pending.wait()
+                if self._stopped:
+                    return
+                enqueued = [t for t in self.tasks if t["status"] == "enqueued"]
+                task = next((t for t in enqueued if t["type"] == "taskCancelation"), enqueued[0])
+                task["status"] = "processing"
+                task["startedAt"] = _now()
+            time.sleep(self.task_duration)
+            with self.lock:
+                if task["status"] == "processing":
+                    task["status"] = "enqueued"
+                    self._process(task)
+
+    def stop(self) -> None:
+        with self.lock:
+            self._stopped = True
+            self._pending.notify_all()
+
+    @staticmethod
+    def public_task(task: Dict) -> Dict:
+        return {key: value for key, value in task.items() if not key.startswith("_")}
+
+    # Indexes
+
+    def index(self, uid: str) -> Dict[str, Any]:
+        index = self.indexes.get(uid)
+        if index is None:
+            raise StubError(404, "index_not_found", f"Index `{uid}` not found.")
+        return index
+
+    def create_index(self, uid: str, primary_key: Optional[str]) -> None:
+        if uid in self.indexes:
+            raise StubError(409, "index_already_exists", f"Index `{uid}` already exists.")
+        now = _now()
+        self.indexes[uid] = {
+            "uid": uid,
+            "primaryKey": primary_key,
+            "createdAt": now,
+            "updatedAt": now,
+            "documents": {},
+            "settings": json.loads(json.dumps(DEFAULT_SETTINGS)),
+        }
+
+    def touch(self, index: Dict) -> None:
+        index["updatedAt"] = _now()
+
+    @staticmethod
+    def public_index(index: Dict) -> Dict:
+        return {key: index[key] for key in ("uid", "primaryKey", "createdAt", "updatedAt")}
+
+
+# Search
+
+def _searchable_text(doc: Dict, attributes: List[str]) -> List[str]:
+    if attributes == ["*"]:
+        attributes = list(doc)
+    texts = []
+    for attribute in attributes:
+        value = doc.get(attribute)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = " ".join(str(item) for item in value)
+        texts.append(str(value).lower())
+    return texts
+
+
+def search_documents(index: Dict, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate a search request against an index."""
+    settings = index["settings"]
+    query = params.get("q") or ""
+    terms = query.lower().split()
+    limit = int(params.get("limit", 20))
+    offset = int(params.get("offset", 0))
+    predicate = compile_filter(params.get("filter"), settings["filterableAttributes"])
+    distinct = params.get("distinct") or settings.get("distinctAttribute")
+
+    scored = []
+    for position, doc in enumerate(index["documents"].values()):
+        if predicate is not None and not predicate(doc):
+            continue
+        score = 0
+        if terms:
+            texts = _searchable_text(doc, settings["searchableAttributes"])
+            for term in terms:
+                # Earlier attributes rank higher, as with Meilisearch's attribute rule
+                hit = next((i for i, text in enumerate(texts) if term in text), None)
+                if hit is None:
+                    break
+                score += len(texts) - hit
+            else:
+                scored.append((-score, position, doc))
+            continue
+        scored.append((0, position, doc))
+    scored.sort(key=lambda item: (item[0], item[1]))
+
+    hits = [doc for _, _, doc in scored]
+    if distinct:
+        seen = set()
+        unique = []
+        for doc in hits:
+            key = json.dumps(doc.get(distinct), sort_keys=True)
+            if doc.get(distinct) is None or key not in seen:
+                seen.add(key)
+                unique.append(doc)
+        hits = unique
+
+    retrieve = params.get("attributesToRetrieve")
+    page = hits[offset:offset + limit]
+    if retrieve and retrieve != ["*"]:
+        page = [{key: doc[key] for key in retrieve if key in doc} for doc in page]
+    return {
+        "hits": page,
+        "query": query,
+        "processingTimeMs": 0,
+        "limit": limit,
+        "offset": offset,
+        "estimatedTotalHits": len(hits),
+    }
+
+
+# HTTP server
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_StubHTTPServer"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str) -> None:
+        stub = self.server.stub
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            self._send(400, StubError(400, "malformed_payload", "The payload is not valid JSON").body())
+            return
+
+        if parts.path.startswith("/_stub/"):
+            self._send(*stub.admin(method, parts.path, query, body))
+            return
+
+        route, params = _match_route(method, parts.path)
+        status, payload = stub.handle(route, method, parts.path, params, query, body)
+        if status is None:
+            # Injected connection drop
+            self.close_connection = True
+            self.connection.close()
+            return
+        self._send(status, payload)
+
+    def _send(self, status: int, payload: Any) -> None:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "MeiliStub"
+
+
+def _match_route(method: str, path: str) -> Tuple[Optional[str], Dict[str, str]]:
+    path = path.rstrip("/") or "/"
+    for route_method, pattern, name in _COMPILED_ROUTES:
+        match = pattern.match(path)
+        if match and route_method == method:
+            return name, {key: unquote(value) for key, value in match.groupdict().items()}
+    return None, {}
+
+
+class MeiliStub:
+    """A running stub server.
+
+    Usable as a context manager:
+
+        with MeiliStub(latency={"search": 0.05}) as stub:
+            client = meilisearch.Client(stub.url)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[Dict[str, float]] = None,
+        task_duration: float = 0.0,
+        seed: int = 0,
+        record_bodies: bool = True
+    ):
+        self.host = host
+        self.port = port
+        self.store = MeiliStore(task_duration)
+        self.latency: Dict[str, float] = dict(latency or {})
+        self.faults: List[Dict[str, Any]] = []
+        self.calls: List[Dict[str, Any]] = []
+        self.record_bodies = record_bodies
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[_StubHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MeiliStub":
+        self._server = _StubHTTPServer((self.host, self.port), _Handler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="meili-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Run in the calling thread until interrupted."""
+        self._server = _StubHTTPServer((self.host, self.port), _Handler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.store.stop()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.store.stop()
+
+    def __enter__(self) -> "MeiliStub":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # Configuration
+
+    def set_latency(self, route: str, seconds: float) -> None:
+        """Delay every request to a route ("*" for all routes)."""
+        with self._lock:
+            self.latency[route] = seconds
+
+    def inject_fault(
+        self,
+        route: str,
+        status: Optional[int] = 500,
+        rate: float = 1.0,
+        count: Optional[int] = None,
+        code: str = "internal"
+    ) -> None:
+        """Fail requests to a route ("*" for all routes).
+
+        Each request fails with probability `rate`, for at most `count`
+        requests if given. A status of None drops the connection instead
+        of answering.
+        """
+        with self._lock:
+            self.faults.append({"route": route, "status": status, "rate": rate, "remaining": count, "code": code})
+
+    def clear_faults(self) -> None:
+        with self._lock:
+            self.faults = []
+
+    def reset(self, data: bool = False) -> None:
+        """Forget calls, latencies and faults; with `data`, also indexes and tasks."""
+        with self._lock:
+            self.calls = []
+            self.latency = {}
+            self.faults = []
+        if data:
+            with self.store.lock:
+                self.store.indexes.clear()
+                self.store.tasks.clear()
+
+    def calls_to(self, route: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [call for call in self.calls if call["route"] == route]
+
+    # Request handling
+
+    def _fault_for(self, route: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for fault in self.faults:
+                if fault["route"] not in (route, "*"):
+                    continue
+                if fault["remaining"] is not None and fault["remaining"] <= 0:
+                    continue
+                if self.random.random() >= fault["rate"]:
+                    continue
+                if fault["remaining"] is not None:
+                    fault["remaining"] -= 1
+                return fault
+        return None
+
+    def handle(
+        self,
+        route: Optional[str],
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        query: Dict[str, str],
+        body: Any
+    ) -> Tuple[Optional[int], Any]:
+        started = time.perf_counter()
+        with self._lock:
+            delay = self.latency.get(route, self.latency.get("*", 0.0))
+        if delay:
+            time.sleep(delay)
+
+        fault = self._fault_for(route)
+        if route is None:
+            status, payload = 404, StubError(404, "not_found", f"No stub route for {method} {path}").body()
+        elif fault is not None:
+            status = fault["status"]
+            payload = StubError(status or 0, fault["code"], "Injected fault", "internal").body()
+        else:
+            try:
+                status, payload = getattr(self, f"_route_{route}")(params, query, body)
+            except StubError as e:
+                status, payload = e.status, e.body()
+
+        call = {
+            "route": route,
+            "method": method,
+            "path": path,
+            "query": query,
+            "status": status,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "ts": time.time(),
+        }
+        if self.record_bodies:
+            call["body"] = body
+        with self._lock:
+            self.calls.append(call)
+        return status, payload
+
+    def admin(self, method: str, path: str, query: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        """Configuration endpoints for tests running in another process."""
+        if path == "/_stub/calls" and method == "GET":
+            with self._lock:
+                calls = list(self.calls)
+            if query.get("route"):
+                calls = [call for call in calls if call["route"] == query["route"]]
+            if query.get("bodies") not in ("1", "true"):
+                calls = [{key: value for key, value in call.items() if key != "body"} for call in calls]
+            return 200, {"calls": calls}
+        if path == "/_stub/reset" and method == "POST":
+            self.reset(data=query.get("data") in ("1", "true"))
+            return 200, {"status": "reset"}
+        if path == "/_stub/config" and method == "POST":
+            body = body or {}
+            for route, seconds in (body.get("latency") or {}).items():
+                self.set_latency(route, float(seconds))
+            if body.get("clear_faults"):
+                self.clear_faults()
+            for fault in body.get("faults") or []:
+                self.inject_fault(**fault)
+            with self._lock:
+                return 200, {"latency": self.latency, "faults": self.faults}
+        return 404, StubError(404, "not_found", f"No stub route for {method} {path}").body()
+
+    # Meilisearch routes
+
+    def _route_health(self, params, query, body):
+        return 200, {"status": "available"}
+
+    def _route_version(self, params, query, body):
+        return 200, {"pkgVersion": MEILISEARCH_VERSION, "commitSha": "stub", "commitDate": _now()}
+
+    def _route_list_indexes(self, params, query, body):
+        with self.store.lock:
+            results = [self.store.public_index(index) for index in self.store.indexes.values()]
+        limit, offset = int(query.get("limit", 20)), int(query.get("offset", 0))
+        return 200, {"results": results[offset:offset + limit], "offset": offset, "limit": limit, "total": len(results)}
+
+    def _route_create_index(self, params, query, body):
+        body = body or {}
+        uid = body.get("uid")
+        if not uid:
+            raise StubError(400, "missing_index_uid", "Missing index uid.")
+        primary_key = body.get("primaryKey")
+        return 202, self.store.enqueue(
+            "indexCreation", uid, lambda: self.store.create_index(uid, primary_key), {"primaryKey": primary_key}
+        )
+
+    def _route_get_index(self, params, query, body):
+        with self.store.lock:
+            return 200, self.store.public_index(self.store.index(params["uid"]))
+
+    def _route_delete_index(self, params, query, body):
+        uid = params["uid"]
+
+        def apply():
+            with self.store.lock:
+                index = self.store.index(uid)
+                del self.store.indexes[uid]
+                return {"deletedDocuments": len(index["documents"])}
+
+        return 202, self.store.enqueue("indexDeletion", uid, apply)
+
+    def _route_stats(self, params, query, body):
+        with self.store.lock:
+            index = self.store.index(params["uid"])
+            distribution: Dict[str, int] = {}
+            for doc in index["documents"].values():
+                for field in doc:
+                    distribution[field] = distribution.get(field, 0) + 1
+            indexing = any(
+                task["indexUid"] == params["uid"] and task["status"] in ("enqueued", "processing")
+                for task in self.store.tasks
+            )
+            return 200, {
+                "numberOfDocuments": len(index["documents"]),
+                "isIndexing": indexing,
+                "fieldDistribution": distribution,
+            }
+
+    @staticmethod
+    def _setting_name(params: Dict[str, str]) -> Optional[str]:
+        # Single-setting routes use kebab case: filterable-attributes
+        setting = params.get("setting")
+        if setting is None:
+            return None
+        name = re.sub(r"-(.)", lambda match: match.group(1).upper(), setting)
+        if name not in DEFAULT_SETTINGS:
+            raise StubError(404, "not_found", f"Unknown setting `{setting}`.")
+        return name
+
+    def _route_get_settings(self, params, query, body):
+        name = self._setting_name(params)
+        with self.store.lock:
+            settings = self.store.index(params["uid"])["settings"]
+            return 200, settings if name is None else settings[name]
+
+    def _route_update_settings(self, params, query, body):
+        uid = params["uid"]
+        name = self._setting_name(params)
+        settings = dict(body or {}) if name is None else {name: body}
+
+        def apply():
+            with self.store.lock:
+                index = self.store.index(uid)
+                for key, value in settings.items():
+                    index["settings"][key] = DEFAULT_SETTINGS.get(key) if value is None else value
+                self.store.touch(index)
+            return settings
+
+        return 202, self.store.enqueue("settingsUpdate", uid, apply)
+
+    def _add_documents(self, params, query, body, replace: bool):
+        uid = params["uid"]
+        if not isinstance(body, list):
+            body = [body] if isinstance(body, dict) else []
+        documents = body
+        primary_key = query.get("primaryKey")
+
+        def apply():
+            with self.store.lock:
+                # Adding documents creates the index, as in Meilisearch
+                if uid not in self.store.indexes:
+                    self.store.create_index(uid, primary_key)
+                index = self.store.index(uid)
+                key = index["primaryKey"] or primary_key
+                if key is None:
+                    candidates = [field for field in (documents[0] if documents else {}) if field.lower().endswith("id")]
+                    if len(candidates) != 1:
+                        raise StubError(400, "index_primary_key_no_candidate_found", "Could not infer a primary key.")
+                    key = candidates[0]
+                index["primaryKey"] = key
+                for doc in documents:
+                    if key not in doc:
+                        raise StubError(400, "missing_document_id", f"Document doesn't have a `{key}` attribute.")
+                    doc_id = str(doc[key])
+                    if replace or doc_id not in index["documents"]:
+                        index["documents"][doc_id] = dict(doc)
+                    else:
+                        index["documents"][doc_id].update(doc)
+                self.store.touch(index)
+            return {"receivedDocuments": len(documents), "indexedDocuments": len(documents)}
+
+        return 202, self.store.enqueue(
+            "documentAdditionOrUpdate", uid, apply, {"receivedDocuments": len(documents), "indexedDocuments": None}
+        )
+
+    def _route_add_documents(self, params, query, body):
+        return self._add_documents(params, query, body, replace=True)
+
+    def _route_update_documents(self, params, query, body):
+        return self._add_documents(params, query, body, replace=False)
+
+    def _route_delete_documents(self, params, query, body):
+        uid = params["uid"]
+        document_ids = [str(document_id) for document_id in body or []]
+
+        def apply():
+            with self.store.lock:
+                index = self.store.index(uid)
+                deleted = sum(index["documents"].pop(document_id, None) is not None for document_id in document_ids)
+                self.store.touch(index)
+            return {"deletedDocuments": deleted}
+
+        return 202, self.store.enqueue(
+            "documentDeletion", uid, apply, {"providedIds": len(document_ids), "deletedDocuments": None}
+        )
+
+    @staticmethod
+    def _project(doc: Dict, fields: Optional[str]) -> Dict:
+        if not fields or fields == "*":
+            return doc
+        names = fields.split(",")
+        return {key: doc[key] for key in names if key in doc}
+
+    def _route_get_documents(self, params, query, body):
+        limit, offset = int(query.get("limit", 20)), int(query.get("offset", 0))
+        with self.store.lock:
+            documents = list(self.store.index(params["uid"])["documents"].values())
+        results = [self._project(doc, query.get("fields")) for doc in documents[offset:offset + limit]]
+        return 200, {"results": results, "offset": offset, "limit": limit, "total": len(documents)}
+
+    def _route_fetch_documents(self, params, query, body):
+        body = body or {}
+        limit, offset = int(body.get("limit", 20)), int(body.get("offset", 0))
+        fields = body.get("fields")
+        with self.store.lock:
+            index = self.store.index(params["uid"])
+            predicate = compile_filter(body.get("filter"), index["settings"]["filterableAttributes"])
+            documents = [doc for doc in index["documents"].values() if predicate is None or predicate(doc)]
+        results = [
+            self._project(doc, ",".join(fields) if isinstance(fields, list) else fields)
+            for doc in documents[offset:offset + limit]
+        ]
+        return 200, {"results": results, "offset": offset, "limit": limit, "total": len(documents)}
+
+    def _route_get_document(self, params, query, body):
+        with self.store.lock:
+            doc = self.store.index(params["uid"])["documents"].get(params["document_id"])
+        if doc is None:
+            raise StubError(404, "document_not_found", f"Document `{params['document_id']}` not found.")
+        return 200, self._project(doc, query.get("fields"))
+
+    def _route_search(self, params, query, body):
+        with self.store.lock:
+            index = self.store.index(params["uid"])
+            return 200, search_documents(index, body or {})
+
+    def _route_get_task(self, params, query, body):
+        task_uid = int(params["task_uid"])
+        with self.store.lock:
+            if task_uid >= len(self.store.tasks):
+                raise StubError(404, "task_not_found", f"Task `{task_uid}` not found.")
+            return 200, self.store.public_task(self.store.tasks[task_uid])
+
+    def _select_tasks(self, query: Dict[str, str]) -> List[Dict]:
+        def listed(name: str) -> Optional[set]:
+            return set(query[name].split(",")) if query.get(name) else None
+
+        uids, statuses, types, index_uids = listed("uids"), listed("statuses"), listed("types"), listed("indexUids")
+        return [
+            task for task in self.store.tasks
+            if (uids is None or str(task["uid"]) in uids)
+            and (statuses is None or task["status"] in statuses)
+            and (types is None or task["type"] in types)
+            and (index_uids is None or task["indexUid"] in index_uids)
+        ]
+
+    def _route_get_tasks(self, params, query, body):
+        limit = int(query.get("limit", 20))
+        with self.store.lock:
+            tasks = self._select_tasks(query)
+            if query.get("from"):
+                tasks = [task for task in tasks if task["uid"] <= int(query["from"])]
+            tasks = sorted(tasks, key=lambda task: -task["uid"])
+            page = [self.store.public_task(task) for task in tasks[:limit]]
+        return 200, {
+            "results": page,
+            "total": len(tasks),
+            "limit": limit,
+            "from": page[0]["uid"] if page else None,
+            "next": tasks[limit]["uid"] if len(tasks) > limit else None,
+        }
+
+    def _route_cancel_tasks(self, params, query, body):
+        if not any(query.get(name) for name in ("uids", "statuses", "types", "indexUids")):
+            raise StubError(400, "missing_task_filters", "Query parameters to filter the tasks to cancel are missing.")
+
+        # Hold the lock so the cancelation task gets the uid computed here
+        with self.store.lock:
+            targets = [
+                task for task in self._select_tasks(query)
+                if task["status"] in ("enqueued", "processing")
+            ]
+            cancel_uid = len(self.store.tasks)
+
+            def apply():
+                with self.store.lock:
+                    for task in targets:
+                        if task["status"] in ("enqueued", "processing"):
+                            task["status"] = "canceled"
+                            task["canceledBy"] = cancel_uid
+                            task["finishedAt"] = _now()
+                            task.pop("_apply", None)
+                return {"matchedTasks": len(targets), "canceledTasks": len(targets)}
+
+            return 200, self.store.enqueue("taskCancelation", None, apply)
@@ -0,0 +1,124 @@
+"""Migration from the legacy document shape and before/after size reports.
+
+Legacy case documents carried every field (empty or not) plus a `content`
+field concatenating the case text fields, which were then searched through
+`content`. The current model (see models.py) stores each text field once
+and lists them as searchable attributes instead.
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+from .models import Document, CASE_TEXT_FIELDS
+from .search import SearchEngine, index_settings
+
+LEGACY_FIELDS = (
+    "id",
+    "type",
+    "submodule",
+    "path",
+    "title",
+    "title_en",
+    "prompt",
+    "prompt_en",
+    "author",
+    "author_link",
+    "image",
+    "capability_code",
+    "capability_type",
+    "content",
+    "language",
+    "source_links",
+)
+
+LEGACY_SEARCHABLE_ATTRIBUTES = ["title", "title_en", "prompt", "prompt_en", "author", "content"]
+
+
+def legacy_document(document: Document) -> Dict[str, Any]:
+    """Rebuild the document as the pre-model indexer produced it."""
+    data = {name: document[name] for name in LEGACY_FIELDS}
+    if document.type == "case":
+        data["content"] = " ".join(
+            str(document[name]) for name in CASE_TEXT_FIELDS if document[name]
+        )
+    return data
+
+
+def legacy_settings() -> Dict[str, List[str]]:
+    """Index settings used with legacy documents."""
+    settings = index_settings()
+    settings["searchableAttributes"] = list(LEGACY_SEARCHABLE_ATTRIBUTES)
+    return settings
+
+
+def payload_sizes(documents: List[Document]) -> Dict[str, int]:
+    """Serialized JSON size of the corpus in the legacy and current shapes."""
+    legacy = sum(len(json.dumps(legacy_document(doc), ensure_ascii=False).encode()) for doc in documents)
+    compact = sum(len(json.dumps(doc.to_dict(), ensure_ascii=False).encode()) for doc in documents)
+    return {"documents": len(documents), "legacy_bytes": legacy, "compact_bytes": compact}
+
+
+def measure_indexing(
+    engine: SearchEngine,
+    payload: List[Dict[str, Any]],
+    settings: Dict[str, List[str]],
+    index_uid: str,
+    batch_size: int = 100
+) -> Dict[str, Optional[float]]:
+    """Index a payload into a scratch index and measure time and size.
+
+    The scratch index is deleted afterwards. Size figures come from the
+    index stats and are None on Meilisearch versions that don't report them.
+    """
+    client = engine.client
+    try:
+        client.wait_for_task(client.index(index_uid).delete().task_uid)
+    except Exception:
+        pass
+
+    client.wait_for_task(client.create_index(index_uid, {"primaryKey": "id"}).task_uid)
+    index = client.index(index_uid)
+    try:
+        index.wait_for_task(index.update_settings(settings).task_uid, timeout_in_ms=60000)
+
+        started = time.perf_counter()
+        task_uids = [
+            index.add_documents(payload[i:i + batch_size]).task_uid
+            for i in range(0, len(payload), batch_size)
+        ]
+        for task_uid in task_uids:
+            index.wait_for_task(task_uid, timeout_in_ms=600000, interval_in_ms=100)
+        elapsed = time.perf_counter() - started
+
+        stats = index.get_stats()
+        return {
+            "seconds": round(elapsed, 3),
+            "raw_document_db_size": getattr(stats, "raw_document_db_size", None),
+            "avg_document_size": getattr(stats, "avg_document_size", None),
+        }
+    finally:
+        client.wait_for_task(index.delete().task_uid)
+
+
+def size_report(
+    documents: List[Document],
+    engine: Optional[SearchEngine] = None
+) -> Dict[str, Any]:
+    """Compare the legacy and current document shapes.
+
+    Without an engine only payload sizes are compared; with one, both
+    shapes are indexed into scratch indexes to compare indexing time and
+    stored size.
+    """
+    report: Dict[str, Any] = {"payload": payload_sizes(documents)}
+
+    if engine is not None:
+        base_uid = f"{engine.index_name}_report"
+        report["legacy"] = measure_indexing(
+            engine, [legacy_document(doc) for doc in documents], legacy_settings(), f"{base_uid}_legacy"
+        )
+        report["compact"] = measure_indexing(
+            engine, [doc.to_dict() for doc in documents], index_settings(), f"{base_uid}_compact"
+        )
+
+    return report
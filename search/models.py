@@ -0,0 +1,243 @@
+"""Document model shared by the search indexer and the database extractors."""
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Bump whenever the documents extracted from the same sources change (new
+# fields, different splitting or ids), so `index --skip-if-current` re-indexes.
+# 2: markdown files indexed as heading sections
+# 3: README cases parsed by the submodule extractors
+DOCUMENT_SCHEMA_VERSION = 3
+
+# Case text fields, in ranking order. Meilisearch searches them directly
+# through the searchable-attributes setting, so no document carries a
+# concatenated copy of them.
+CASE_TEXT_FIELDS = (
+    "title",
+    "title_en",
+    "prompt",
+    "prompt_en",
+    "alt_text",
+    "alt_text_en",
+    "prompt_note",
+    "prompt_note_en",
+    "reference_note",
+    "reference_note_en",
+)
+
+# Meilisearch index settings for documents produced by Document.to_dict()
+SEARCHABLE_ATTRIBUTES = [
+    "title",
+    "title_en",
+    "prompt",
+    "prompt_en",
+    "author",
+    "alt_text",
+    "alt_text_en",
+    "prompt_note",
+    "prompt_note_en",
+    "reference_note",
+    "reference_note_en",
+    "section_path",
+    "content",
+]
+FILTERABLE_ATTRIBUTES = [
+    "id",
+    "submodule",
+    "type",
+    "capability_code",
+    "language",
+    "author",
+    "duplicate_group",
+]
+SORTABLE_ATTRIBUTES = [
+    "submodule",
+    "type",
+]
+
+# Fields always present in serialized documents, even when empty
+_REQUIRED_FIELDS = ("id", "type", "submodule", "path", "title", "language")
+
+# Frontmatter keys written by the extractors that map onto document fields
+_ENTRY_FIELD_KEYS = {"author_url": "author_link"}
+
+
+class Document:
+    """A search document / database entry.
+
+    Slotted so that a full corpus held in memory during indexing costs one
+    fixed-size object per document instead of a dict. Also supports
+    mapping-style access (doc["title"], doc.get("title")) so pipeline stages
+    can treat documents and plain dicts alike.
+    """
+
+    id: str
+    type: str
+    submodule: str
+    path: str
+    title: str
+    title_en: str
+    prompt: str
+    prompt_en: str
+    alt_text: str
+    alt_text_en: str
+    prompt_note: str
+    prompt_note_en: str
+    reference_note: str
+    reference_note_en: str
+    author: str
+    author_link: str
+    image: str
+    image_url: str
+    thumbnail_hash: str
+    thumbnails: List[Dict[str, Any]]
+    phash: str
+    dhash: str
+    capability_code: str
+    capability_type: str
+    language: str
+    source_links: List[str]
+    content: str
+    anchor: str
+    section_path: List[str]
+    section_position: int
+    description: str
+    tags: List[str]
+    repo_url: str
+    canonical_id: str
+    duplicate_group: str
+    extra: Dict[str, Any]
+
+    __slots__ = (
+        "id",
+        "type",
+        "submodule",
+        "path",
+        "title",
+        "title_en",
+        "prompt",
+        "prompt_en",
+        "alt_text",
+        "alt_text_en",
+        "prompt_note",
+        "prompt_note_en",
+        "reference_note",
+        "reference_note_en",
+        "author",
+        "author_link",
+        "image",
+        "image_url",
+        "thumbnail_hash",
+        "thumbnails",
+        "phash",
+        "dhash",
+        "capability_code",
+        "capability_type",
+        "language",
+        "source_links",
+        "content",
+        "anchor",
+        "section_path",
+        "section_position",
+        "description",
+        "tags",
+        "repo_url",
+        "canonical_id",
+        "duplicate_group",
+        "extra",
+    )
+
+    _LIST_FIELDS = ("source_links", "tags", "thumbnails", "section_path")
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            if name == "extra":
+                value = fields.pop(name, None) or {}
+            elif name in self._LIST_FIELDS:
+                value = list(fields.pop(name, None) or [])
+            else:
+                value = fields.pop(name, None)
+                value = "" if value is None else value
+            object.__setattr__(self, name, value)
+        if fields:
+            raise TypeError(f"Unknown document fields: {', '.join(sorted(fields))}")
+
+    # Mapping-style access
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for name in self.__slots__:
+            if name != "extra":
+                yield name, getattr(self, name)
+
+    def __repr__(self) -> str:
+        return f"Document(id={self.id!r}, type={self.type!r}, path={self.path!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for Meilisearch, leaving out empty optional fields."""
+        data = {}
+        for name, value in self.items():
+            if value or name in _REQUIRED_FIELDS:
+                data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Document":
+        """Build a document from a Meilisearch hit or a legacy dict.
+
+        The legacy `content` concatenation of case documents is dropped.
+        """
+        fields = {key: value for key, value in data.items() if key in cls.__slots__}
+        extra = {key: value for key, value in data.items() if key not in cls.__slots__}
+        if fields.get("type") == "case":
+            fields.pop("content", None)
+        fields.pop("extra", None)
+        return cls(extra=extra, **fields)
+
+    @classmethod
+    def from_entry(
+        cls,
+        metadata: Dict[str, Any],
+        description: str = "",
+        prompt: str = ""
+    ) -> "Document":
+        """Build a document from database entry frontmatter and body."""
+        fields: Dict[str, Any] = {}
+        extra: Dict[str, Any] = {}
+        for key, value in metadata.items():
+            name = _ENTRY_FIELD_KEYS.get(key, key)
+            if name in cls.__slots__ and name != "extra":
+                fields[name] = value
+            else:
+                extra[key] = value
+        fields["description"] = description
+        fields["prompt"] = prompt
+        return cls(extra=extra, **fields)
+
+    def entry_metadata(self) -> Dict[str, Any]:
+        """Frontmatter for the database entry written by the extractors."""
+        metadata: Dict[str, Any] = {
+            "title": self.title,
+            "author": self.author,
+        }
+        if self.author_link:
+            metadata["author_url"] = self.author_link
+        metadata.update(self.extra)
+        metadata["repo_url"] = self.repo_url
+        metadata["image_url"] = self.image_url
+        metadata["tags"] = list(self.tags)
+        return metadata
@@ -0,0 +1,235 @@
+"""Perceptual image hashes and a BK-tree for visual similarity lookups.
+
+Each case image gets two 64-bit hashes: a DCT-based pHash, which survives
+re-encoding, resizing and mild colour changes, and a gradient dHash used as
+a tie-breaker. Similar images are found by Hamming distance between pHashes
+through a BK-tree, which only visits the subtrees that can hold hashes
+within the query radius instead of comparing against every image.
+Byte-identical images are found through the SHA-256 already computed for
+the thumbnail cache.
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .config import IMAGE_HASH_FILE
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 10
+
+_DCT_SIZE = 32
+_DCT_KEEP = 8
+# Cosine basis for the low-frequency rows of a 32-point DCT-II
+_DCT_BASIS = [
+    [math.cos((2 * x + 1) * u * math.pi / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)]
+    for u in range(_DCT_KEEP)
+]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+def dhash(image: "Image.Image") -> int:
+    """Difference hash: compares horizontally adjacent pixels of a 9x8 thumbnail."""
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def phash(image: "Image.Image") -> int:
+    """DCT hash: signs of the 8x8 lowest frequencies against their median."""
+    small = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    rows = [pixels[y * _DCT_SIZE:(y + 1) * _DCT_SIZE] for y in range(_DCT_SIZE)]
+
+    # Separable 2D DCT, computing only the coefficients that are kept
+    partial = [
+        [sum(p * c for p, c in zip(row, basis)) for basis in _DCT_BASIS]
+        for row in rows
+    ]
+    coefficients = [
+        sum(basis[y] * partial[y][u] for y in range(_DCT_SIZE))
+        for basis in _DCT_BASIS
+        for u in range(_DCT_KEEP)
+    ]
+
+    # The DC term only reflects overall brightness
+    median = sorted(coefficients[1:])[(len(coefficients) - 1) // 2]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def format_hash(value: int) -> str:
+    """Fixed-width hex representation of a hash."""
+    return f"{value:016x}"
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Every node keeps the keys sharing its hash, and its children are indexed
+    by their distance to it. By the triangle inequality, a query with radius
+    r only needs to descend into children at distance d - r .. d + r.
+    """
+
+    def __init__(self):
+        # Node layout: [hash, keys, {distance: child}]
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, key: Any) -> None:
+        """Insert a key under a hash."""
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, key) pairs within radius of a hash."""
+        results = []
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= radius:
+                results.extend((distance, key) for key in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+class ImageIndex:
+    """Visual similarity lookups over the case images of the corpus."""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.by_digest: Dict[str, List[str]] = {}
+        self.tree = BKTree()
+
+        for entry in entries:
+            doc_id = entry["id"]
+            record = {
+                "id": doc_id,
+                "digest": entry["digest"],
+                "phash": int(entry["phash"], 16),
+                "dhash": int(entry["dhash"], 16),
+                "thumbnail": entry.get("thumbnail", ""),
+            }
+            self.entries[doc_id] = record
+            self.by_digest.setdefault(record["digest"], []).append(doc_id)
+            self.tree.add(record["phash"], doc_id)
+
+    def similar(
+        self,
+        doc_id: str,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """Byte-identical and visually similar images for a document.
+
+        Returns None if the document has no hashed image.
+        """
+        record = self.entries.get(doc_id)
+        if record is None:
+            return None
+
+        exact = [other for other in self.by_digest[record["digest"]] if other != doc_id]
+        excluded = set(exact)
+        excluded.add(doc_id)
+
+        similar = []
+        for distance, other in self.tree.search(record["phash"], max_distance):
+            if other in excluded:
+                continue
+            other_record = self.entries[other]
+            similar.append({
+                "id": other,
+                "distance": distance,
+                "dhash_distance": hamming_distance(record["dhash"], other_record["dhash"]),
+                "thumbnail": other_record["thumbnail"],
+            })
+        similar.sort(key=lambda hit: (hit["distance"], hit["dhash_distance"], hit["id"]))
+
+        return {
+            "id": doc_id,
+            "exact": exact,
+            "similar": similar[:limit],
+            "max_distance": max_distance,
+        }
+
+
+def write_image_index(documents: List, path: Path = IMAGE_HASH_FILE) -> int:
+    """Persist the hashes of all documents that have them. Returns the count."""
+    entries = []
+    for doc in documents:
+        if not doc.get("phash"):
+            continue
+        thumbnails = doc.get("thumbnails") or []
+        entries.append({
+            "id": doc["id"],
+            "digest": doc["thumbnail_hash"],
+            "phash": doc["phash"],
+            "dhash": doc["dhash"],
+            "thumbnail": thumbnails[0]["path"] if thumbnails else "",
+        })
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(entries, f, separators=(",", ":"))
+    os.replace(temp, path)
+    return len(entries)
+
+
+_image_index: Optional[ImageIndex] = None
+_image_index_mtime: Optional[float] = None
+
+
+def get_image_index(path: Path = IMAGE_HASH_FILE) -> Optional[ImageIndex]:
+    """Get the image index, reloading it when the indexer rewrites the file.
+
+    Returns None if no image hashes have been written yet.
+    """
+    global _image_index, _image_index_mtime
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+
+    if _image_index is None or mtime != _image_index_mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            _image_index = ImageIndex(json.load(f))
+        _image_index_mtime = mtime
+    return _image_index
@@ -0,0 +1,207 @@
+"""Profiling of indexing runs and single web requests.
+
+A run profile is a cProfile file (NAME-TIMESTAMP.prof) with a text report
+next to it (NAME-TIMESTAMP.txt): wall time per stage, the functions with
+the most cumulative time and, when memory tracing is on, the lines that
+allocated the most. Open the .prof file with `python -m pstats`, snakeviz,
+or render it as a flame graph with flameprof.
+"""
+
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from .config import PROFILE_DIR
+
+# Functions and allocation sites listed in a report
+REPORT_FUNCTIONS = 30
+REPORT_ALLOCATIONS = 25
+
+# Stored profile names, as accepted by the download endpoint
+PROFILE_NAME = re.compile(r"^[a-z0-9-]+\.(prof|txt)$")
+
+
+class StageTimer:
+    """Wall time per named stage of a run.
+
+    Also works as the `progress` callback of build_index and
+    index_documents: each event starts (or continues) the stage it names.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self.current: Optional[str] = None
+        self.started = 0.0
+
+    def stage(self, name: str) -> None:
+        """End the current stage and start `name`."""
+        if name == self.current:
+            return
+        now = time.perf_counter()
+        self._close(now)
+        self.current = name
+        self.started = now
+
+    def stop(self) -> None:
+        self._close(time.perf_counter())
+        self.current = None
+
+    def _close(self, now: float) -> None:
+        if self.current is not None:
+            self.totals[self.current] = self.totals.get(self.current, 0.0) + now - self.started
+
+    def __call__(self, kind: str, *args) -> None:
+        self.stage(kind)
+
+    def summary(self) -> str:
+        total = sum(self.totals.values())
+        lines = [f"{'stage':<24}{'seconds':>10}{'share':>8}"]
+        for name, seconds in self.totals.items():
+            share = seconds / total if total else 0.0
+            lines.append(f"{name:<24}{seconds:>10.3f}{share:>8.1%}")
+        lines.append(f"{'total':<24}{total:>10.3f}")
+        return "\n".join(lines)
+
+
+def profile_slug(name: str) -> str:
+    """File name part for a profile name (e.g. a request path)."""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:60] or "profile"
+
+
+class Profiler:
+    """cProfile, a StageTimer and optionally tracemalloc around one run.
+
+    Disabled, every method is a cheap no-op, so callers can thread it
+    through unconditionally. `stop()` writes the .prof file and the text
+    report to `directory` and returns the report path.
+
+    cProfile only sees the thread that started it; work handed to other
+    threads is profiled by calling it through `run()`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = True,
+        memory: bool = False,
+        directory: Path = PROFILE_DIR
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.memory = memory
+        self.directory = directory
+        self.timer = StageTimer()
+        self.profile = cProfile.Profile() if enabled else None
+        self.report = ""
+        self._memory_before = None
+        self._started_tracing = False
+        # Profiles of calls made through run() on other threads
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self, stage: str = "setup") -> "Profiler":
+        """Start profiling, timing `stage` until the next stage() call."""
+        if not self.enabled:
+            return self
+        if self.memory:
+            # Leave tracing on if someone else (e.g. /api/admin/memory) started it
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            self._memory_before = tracemalloc.take_snapshot()
+        self.timer.stage(stage)
+        self.profile.enable()
+        return self
+
+    def stage(self, name: str) -> None:
+        if self.enabled:
+            self.timer.stage(name)
+
+    def __call__(self, kind: str, *args) -> None:
+        self.stage(kind)
+
+    def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Call `function` on a worker thread, adding its profile to this run's."""
+        if not self.enabled:
+            return function(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: the run's own profiler already sees every thread
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._thread_profiles.append(profile)
+
+    def stop(self) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        self.profile.disable()
+        self.timer.stop()
+
+        sections = [f"Profile of {self.name}", "", self.timer.summary()]
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+        sections += ["", output.getvalue().strip()]
+
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            if self._started_tracing:
+                tracemalloc.stop()
+            sections += ["", f"Top {REPORT_ALLOCATIONS} allocation sites (growth during the run):"]
+            sections += [str(stat) for stat in snapshot.compare_to(self._memory_before, "lineno")[:REPORT_ALLOCATIONS]]
+        self.report = "\n".join(sections) + "\n"
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        base = self.directory / f"{profile_slug(self.name)}-{datetime.now():%Y%m%d-%H%M%S-%f}"
+        stats.dump_stats(str(base.with_suffix(".prof")))
+        report_path = base.with_suffix(".txt")
+        report_path.write_text(self.report, encoding="utf-8")
+        return report_path
+
+
+_previous_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def memory_snapshot(limit: int = REPORT_ALLOCATIONS) -> Dict:
+    """Top allocation sites of the process, tracing from the first call on.
+
+    The first call starts tracemalloc and returns no sites; later calls list
+    the sites holding the most memory and how much each grew since the
+    previous call.
+    """
+    global _previous_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _previous_snapshot = tracemalloc.take_snapshot()
+        return {"tracing_started": True, "sites": []}
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    sites: List[Dict] = []
+    stats = snapshot.compare_to(_previous_snapshot, "lineno") if _previous_snapshot else snapshot.statistics("lineno")
+    for stat in sorted(stats, key=lambda s: s.size, reverse=True)[:limit]:
+        frame = stat.traceback[0]
+        sites.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size": stat.size,
+            "size_diff": getattr(stat, "size_diff", 0),
+            "count": stat.count,
+        })
+    _previous_snapshot = snapshot
+    return {"tracing_started": False, "traced_bytes": current, "peak_bytes": peak, "sites": sites}
+
@@ -1,9 +1,35 @@
 """Search engine module using Meilisearch."""
 
-from typing import List, Dict, Optional, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from meilisearch import Client
 from meilisearch.errors import MeilisearchApiError
 from .config import MEILISEARCH_URL, MEILISEARCH_API_KEY, INDEX_NAME, SEARCH_RESULT_LIMIT
+from .docstore import get_docstore
+from .singleflight import single_flight
+from .models import Document, SEARCHABLE_ATTRIBUTES, FILTERABLE_ATTRIBUTES, SORTABLE_ATTRIBUTES
+
+# Ids per filtered documents request of get_cases_by_ids
+FETCH_BATCH_SIZE = 250
+
+
+def index_settings() -> Dict[str, List[str]]:
+    """Meilisearch settings for the current document model."""
+    return {
+        "searchableAttributes": list(SEARCHABLE_ATTRIBUTES),
+        "filterableAttributes": list(FILTERABLE_ATTRIBUTES),
+        "sortableAttributes": list(SORTABLE_ATTRIBUTES),
+    }
+
+
+def document_fields(document: Any) -> Dict[str, Any]:
+    """Plain dict of a document returned by the Meilisearch client."""
+    # The client's Document objects also carry their raw dict as a private attribute
+    return {key: value for key, value in document if not key.startswith("_")}
+
+
+def quote_filter_value(value: str) -> str:
+    """A string as a quoted Meilisearch filter value."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
 
 
 class SearchEngine:
@@ -58,45 +84,31 @@ class SearchEngine:
                 if e.status_code == 409:
                     # Index already exists, get it
                     self.index = self.client.index(self.index_name)
-                    # Check if index already has documents
-                    try:
-                        stats = self.index.get_stats()
-                        document_count = stats.get("numberOfDocuments", 0)
-                        if document_count > 0:
-                            # Index already exists with documents, skip reconfiguration
-                            print(f"Index '{self.index_name}' already exists with {document_count} documents. Skipping reconfiguration.")
-                            return True
-                    except Exception:
-                        # If we can't get stats, continue with configuration
-                        pass
                 else:
                     raise
             
-            # Only configure attributes if index was just created or is empty
-            # Configure searchable attributes
-            self.index.update_searchable_attributes([
-                "title",
-                "title_en",
-                "prompt",
-                "prompt_en",
-                "author",
-                "content"
-            ])
-            
-            # Configure filterable attributes
-            self.index.update_filterable_attributes([
-                "submodule",
-                "type",
-                "capability_code",
-                "language",
-                "author"
-            ])
+            settings = index_settings()
+            if not index_created:
+                # Existing index: only reconfigure when the settings have drifted,
+                # e.g. an index built before the current document model
+                current = self.index.get_settings()
+                outdated = []
+                for key, value in settings.items():
+                    stored = current.get(key) or []
+                    # Searchable attribute order is the ranking order; the others are sets
+                    if key == "searchableAttributes":
+                        changed = stored != value
+                    else:
+                        changed = sorted(stored) != sorted(value)
+                    if changed:
+                        outdated.append(key)
+                if not outdated:
+                    print(f"Index '{self.index_name}' already exists with current settings. Skipping reconfiguration.")
+                    return True
+                print(f"Migrating settings of index '{self.index_name}': {', '.join(outdated)}")
             
-            # Configure sortable attributes
-            self.index.update_sortable_attributes([
-                "submodule",
-                "type"
-            ])
+            task = self.index.update_settings(settings)
+            self.index.wait_for_task(task.task_uid, timeout_in_ms=60000)
             
             if index_created:
                 print(f"Index '{self.index_name}' created and configured successfully")
@@ -108,8 +120,30 @@ class SearchEngine:
             print(f"Error creating index: {e}")
             return False
     
-    def index_documents(self, documents: List[Dict]) -> bool:
-        """Bulk index documents to Meilisearch."""
+    def delete_index(self) -> bool:
+        """Delete the index with all its documents; create_index() makes a fresh one."""
+        try:
+            task = self.client.delete_index(self.index_name)
+            # Fails harmlessly (index_not_found) when there is no index yet
+            self.client.wait_for_task(task.task_uid, timeout_in_ms=60000)
+            self.index = None
+            return True
+        except Exception as e:
+            print(f"Error deleting index: {e}")
+            return False
+    
+    def index_documents(
+        self,
+        documents: List[Document],
+        progress: Optional[Callable[..., None]] = None
+    ) -> bool:
+        """Bulk index documents to Meilisearch.
+
+        Documents replace any stored document with the same id. `progress`
+        is called with ("upload", batches_uploaded, batches_total, task_uid)
+        after each batch is sent and ("task", tasks_done, tasks_total)
+        after each Meilisearch task finishes.
+        """
         if not self.index:
             if not self.connect_to_meilisearch():
                 return False
@@ -121,18 +155,25 @@ class SearchEngine:
             task_uids = []
             
             for i in range(0, total, batch_size):
-                batch = documents[i:i + batch_size]
+                batch = [
+                    doc.to_dict() if isinstance(doc, Document) else doc
+                    for doc in documents[i:i + batch_size]
+                ]
                 task = self.index.add_documents(batch)
                 task_uids.append(task.task_uid)
                 print(f"Indexed {min(i + batch_size, total)}/{total} documents")
+                if progress:
+                    progress("upload", len(task_uids), (total + batch_size - 1) // batch_size, task.task_uid)
             
             # Wait for all indexing tasks to complete (with longer timeout)
-            for task_uid in task_uids:
+            for done, task_uid in enumerate(task_uids, 1):
                 try:
                     self.index.wait_for_task(task_uid, timeout_in_ms=60000)  # 60 second timeout
                 except Exception as e:
                     print(f"Warning: Task {task_uid} may still be processing: {e}")
                     # Continue anyway - the task might complete later
+                if progress:
+                    progress("task", done, len(task_uids))
             
             print(f"Successfully indexed {total} documents")
             return True
@@ -141,15 +182,74 @@ class SearchEngine:
             print(f"Error indexing documents: {e}")
             return False
     
+    def delete_documents(self, document_ids: List[str]) -> bool:
+        """Delete documents by id, waiting for Meilisearch to apply it."""
+        if not document_ids:
+            return True
+        if not self.index:
+            if not self.connect_to_meilisearch():
+                return False
+        
+        try:
+            task = self.index.delete_documents(document_ids)
+            self.index.wait_for_task(task.task_uid, timeout_in_ms=60000)
+            return True
+        except Exception as e:
+            print(f"Error deleting documents: {e}")
+            return False
+    
+    def get_all_documents(
+        self,
+        batch_size: int = 1000,
+        fields: Optional[List[str]] = None
+    ) -> Optional[List[Dict]]:
+        """Every stored document (only `fields` if given), or None if they could not be read."""
+        if not self.index:
+            if not self.connect_to_meilisearch():
+                return None
+        
+        try:
+            documents = []
+            while True:
+                parameters = {"limit": batch_size, "offset": len(documents)}
+                if fields:
+                    parameters["fields"] = fields
+                page = self.index.get_documents(parameters)
+                documents.extend(document_fields(doc) for doc in page.results)
+                if not page.results or len(documents) >= page.total:
+                    return documents
+        except Exception as e:
+            print(f"Error reading documents: {e}")
+            return None
+    
+    def delete_stale_documents(self, current_ids: Iterable[str]) -> Optional[List[str]]:
+        """Delete every stored document not in `current_ids`, e.g. after a full build.
+
+        Returns the deleted ids, or None if they could not be listed or deleted.
+        """
+        stored = self.get_all_documents(fields=["id"])
+        if stored is None:
+            return None
+        current = set(current_ids)
+        stale = sorted(doc["id"] for doc in stored if doc["id"] not in current)
+        return stale if self.delete_documents(stale) else None
+    
+    # Identical concurrent lookups share one upstream call (see singleflight.py)
+    @single_flight("search")
     def search(
         self,
         query: str,
         language: Optional[str] = None,
         filters: Optional[str] = None,
         limit: Optional[int] = None,
-        offset: int = 0
+        offset: int = 0,
+        collapse_duplicates: bool = False
     ) -> Dict[str, Any]:
-        """Perform search using Meilisearch."""
+        """Perform search using Meilisearch.
+
+        With collapse_duplicates, only the best hit of each near-duplicate
+        group is returned.
+        """
         if not self.index:
             if not self.connect_to_meilisearch():
                 return {"hits": [], "total": 0, "offset": 0, "limit": 0}
@@ -176,6 +276,9 @@ class SearchEngine:
             if filter_parts:
                 search_params["filter"] = " AND ".join(filter_parts)
             
+            if collapse_duplicates:
+                search_params["distinct"] = "duplicate_group"
+            
             # Meilisearch search() takes query as first positional arg, params as second
             results = self.index.search(query, search_params)
             return results
@@ -184,8 +287,22 @@ class SearchEngine:
             print(f"Error performing search: {e}")
             return {"hits": [], "total": 0, "offset": 0, "limit": 0}
     
+    @single_flight("get_case_by_id")
     def get_case_by_id(self, case_id: str) -> Optional[Dict]:
-        """Retrieve specific case by ID."""
+        """Retrieve specific case by ID.
+
+        Served from the local document store when it has the case (see
+        docstore.py), from Meilisearch otherwise.
+        """
+        store = get_docstore()
+        if store is not None:
+            try:
+                document = store.get(case_id)
+                if document is not None:
+                    return document
+            except Exception as e:
+                print(f"Error reading document store: {e}")
+        
         if not self.index:
             if not self.connect_to_meilisearch():
                 return None
@@ -203,6 +320,60 @@ class SearchEngine:
             print(f"Error getting case by ID: {e}")
             return None
     
+    def get_cases_by_ids(
+        self,
+        case_ids: List[str],
+        fields: Optional[List[str]] = None
+    ) -> Optional[Dict[str, Dict]]:
+        """Retrieve many cases at once.
+
+        Cases in the local document store are read from it; the others are
+        fetched with one filtered documents request per FETCH_BATCH_SIZE
+        ids. `fields` limits the attributes returned (`id` is always
+        included). Returns the cases found, by id, or None if Meilisearch
+        could not be queried.
+        """
+        wanted = list(dict.fromkeys(case_ids))
+        projection = ["id", *(name for name in fields if name != "id")] if fields else None
+        found: Dict[str, Dict] = {}
+        
+        store = get_docstore()
+        if store is not None:
+            try:
+                found = store.get_many(wanted)
+            except Exception as e:
+                print(f"Error reading document store: {e}")
+        if projection:
+            found = {
+                case_id: {name: document[name] for name in projection if name in document}
+                for case_id, document in found.items()
+            }
+        
+        missing = [case_id for case_id in wanted if case_id not in found]
+        if not missing:
+            return found
+        
+        if not self.index:
+            if not self.connect_to_meilisearch():
+                return None
+        
+        try:
+            for start in range(0, len(missing), FETCH_BATCH_SIZE):
+                batch = missing[start:start + FETCH_BATCH_SIZE]
+                parameters: Dict[str, Any] = {
+                    "filter": f"id IN [{', '.join(quote_filter_value(case_id) for case_id in batch)}]",
+                    "limit": len(batch),
+                }
+                if projection:
+                    parameters["fields"] = projection
+                for document in self.index.get_documents(parameters).results:
+                    document = document_fields(document)
+                    found[document["id"]] = document
+            return found
+        except Exception as e:
+            print(f"Error getting cases by ID: {e}")
+            return None
+    
     def get_submodules(self) -> List[str]:
         """Get list of all unique submodules."""
         if not self.index:
@@ -250,6 +421,18 @@ class SearchEngine:
             print(f"Error checking index status: {e}")
             return False
     
+    def get_index_version(self) -> Optional[str]:
+        """Get the index's last update time, which changes with every document or settings update."""
+        try:
+            return self.client.get_raw_index(self.index_name).get("updatedAt")
+        except MeilisearchApiError as e:
+            if e.status_code != 404:
+                print(f"Error getting index version: {e}")
+            return None
+        except Exception as e:
+            print(f"Error getting index version: {e}")
+            return None
+    
     def get_indexing_progress(self) -> Dict[str, Any]:
         """Get indexing progress information."""
         if not self.index:
@@ -295,17 +478,8 @@ class SearchEngine:
                     # If we can't get tasks, assume not indexing
                     pass
                 
-                # Estimate time remaining (rough estimate: 1-3 minutes for typical indexing)
+                # Only an indexing job knows enough to estimate the time remaining (see jobs.py)
                 estimated_time_remaining = None
-                if is_indexing and progress < 100:
-                    # Rough estimate: if progress is 0, assume 2-3 minutes
-                    # If progress is > 0, estimate based on remaining percentage
-                    if progress == 0:
-                        estimated_time_remaining = 180  # 3 minutes
-                    else:
-                        # Estimate: remaining percentage * 2 seconds per percent
-                        remaining_percent = 100 - progress
-                        estimated_time_remaining = max(30, int(remaining_percent * 2))
                 
                 return {
                     "indexed": is_indexed,
@@ -322,7 +496,7 @@ class SearchEngine:
                         "progress": 0,
                         "document_count": 0,
                         "is_indexing": False,
-                        "estimated_time_remaining": 180  # 3 minutes estimate
+                        "estimated_time_remaining": None
                     }
                 raise
         except Exception as e:
@@ -335,6 +509,7 @@ class SearchEngine:
                 "estimated_time_remaining": None
             }
     
+    @single_flight("get_suggestions")
     def get_suggestions(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Get search suggestions for autocomplete."""
         if not self.index:
@@ -0,0 +1,317 @@
+""""More like this" over case prompts with TF-IDF and latent semantic analysis.
+
+An offline stage turns the title and prompt text of every case into a
+sparse TF-IDF matrix (CJK runs become character unigrams and bigrams, other
+scripts become words), reduces it with a randomized truncated SVD and
+stores the L2-normalized document vectors as a .npy file. At query time the
+file is memory-mapped and a case's neighbours are one matrix-vector product
+away. With SIMILARITY_COMPONENTS=0 the reduction is skipped and the sparse
+TF-IDF matrix itself is stored and queried.
+"""
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import SIMILARITY_DIR, SIMILARITY_COMPONENTS
+
+INDEX_VERSION = 1
+TEXT_FIELDS = ("title", "title_en", "prompt", "prompt_en")
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+SVD_OVERSAMPLES = 10
+SVD_POWER_ITERATIONS = 2
+
+_META_FILE = "meta.json"
+_VECTORS_FILE = "vectors.npy"
+_SPARSE_FILES = ("indptr.npy", "indices.npy", "data.npy")
+
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+# CJK runs, or runs of other letters and digits
+_TOKEN_PATTERN = re.compile(rf"[{_CJK_RANGES}]+|(?:(?![{_CJK_RANGES}])[^\W_])+")
+_CJK_PATTERN = re.compile(rf"[{_CJK_RANGES}]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or that the this "
+    "to with".split()
+)
+# Non-zero entries per block when multiplying the sparse matrix, bounds temporary memory
+_BLOCK_NONZEROS = 1 << 16
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into terms.
+
+    CJK text has no word boundaries, so each CJK run contributes its
+    characters and character bigrams; other runs of letters and digits are
+    words.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    terms = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        run = match.group()
+        if _CJK_PATTERN.match(run):
+            terms.extend(run)
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif len(run) > 1 and run not in _STOPWORDS:
+            terms.append(run)
+    return terms
+
+
+class SparseMatrix:
+    """Minimal CSR matrix, enough for TF-IDF weighting and the SVD."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, columns: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (len(indptr) - 1, columns)
+        self.rows = np.repeat(np.arange(self.shape[0]), np.diff(indptr))
+
+    def dot(self, dense: np.ndarray) -> np.ndarray:
+        """Product with a dense matrix."""
+        out = np.zeros((self.shape[0], dense.shape[1]), dtype=dense.dtype)
+        first = 0
+        while first < self.shape[0]:
+            # Blocks of whole rows holding about _BLOCK_NONZEROS entries
+            last = int(np.searchsorted(self.indptr, self.indptr[first] + _BLOCK_NONZEROS, side="right")) - 1
+            last = min(max(last, first + 1), self.shape[0])
+            start, end = self.indptr[first], self.indptr[last]
+            if start < end:
+                products = self.data[start:end, None] * dense[self.indices[start:end]]
+                # reduceat needs the start offset of each non-empty row
+                lengths = np.diff(self.indptr[first:last + 1])
+                non_empty = np.flatnonzero(lengths)
+                offsets = self.indptr[first:last][non_empty] - start
+                out[first + non_empty] = np.add.reduceat(products, offsets, axis=0)
+            first = last
+        return out
+
+    def transpose(self) -> "SparseMatrix":
+        order = np.argsort(self.indices, kind="stable")
+        counts = np.bincount(self.indices, minlength=self.shape[1])
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return SparseMatrix(indptr, self.rows[order], self.data[order], self.shape[0])
+
+    def row_dot(self, vector: np.ndarray) -> np.ndarray:
+        """Product with a dense vector."""
+        return np.bincount(
+            self.rows, weights=self.data * vector[self.indices], minlength=self.shape[0]
+        )
+
+
+def tfidf_matrix(texts: Sequence[str]) -> SparseMatrix:
+    """Sublinear TF-IDF matrix with L2-normalized rows.
+
+    Terms in fewer than MIN_DF documents cannot link two documents and terms
+    in more than MAX_DF_RATIO of them carry little signal, so both are
+    dropped from the vocabulary.
+    """
+    counts = [Counter(tokenize(text)) for text in texts]
+    document_frequency: Counter = Counter()
+    for terms in counts:
+        document_frequency.update(terms.keys())
+
+    total = len(texts)
+    max_df = max(MIN_DF, MAX_DF_RATIO * total)
+    vocabulary = sorted(
+        term for term, df in document_frequency.items() if MIN_DF <= df <= max_df
+    )
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+    idf = np.array(
+        [math.log((1 + total) / (1 + document_frequency[term])) + 1 for term in vocabulary],
+        dtype=np.float32,
+    )
+
+    indptr = [0]
+    indices: List[int] = []
+    weights: List[float] = []
+    for terms in counts:
+        row = sorted(
+            (term_ids[term], 1 + math.log(count))
+            for term, count in terms.items()
+            if term in term_ids
+        )
+        indices.extend(term_id for term_id, _ in row)
+        weights.extend(weight for _, weight in row)
+        indptr.append(len(indices))
+
+    index_array = np.array(indices, dtype=np.int32)
+    matrix = SparseMatrix(
+        np.array(indptr, dtype=np.int64),
+        index_array,
+        np.array(weights, dtype=np.float32) * idf[index_array],
+        len(vocabulary),
+    )
+
+    norms = np.sqrt(np.bincount(matrix.rows, weights=matrix.data ** 2, minlength=total))
+    norms[norms == 0] = 1
+    matrix.data = (matrix.data / norms[matrix.rows]).astype(np.float32)
+    return matrix
+
+
+def randomized_svd(matrix: SparseMatrix, components: int, seed: int = 0) -> np.ndarray:
+    """Document coordinates (U * S) of a rank-`components` truncated SVD.
+
+    Uses the randomized range finder of Halko, Martinsson and Tropp with a
+    few power iterations, so only products with the sparse matrix are needed.
+    """
+    transposed = matrix.transpose()
+    rank = min(components + SVD_OVERSAMPLES, min(matrix.shape))
+    rng = np.random.default_rng(seed)
+
+    sample = rng.standard_normal((matrix.shape[1], rank)).astype(np.float32)
+    basis, _ = np.linalg.qr(matrix.dot(sample))
+    for _ in range(SVD_POWER_ITERATIONS):
+        basis, _ = np.linalg.qr(transposed.dot(basis))
+        basis, _ = np.linalg.qr(matrix.dot(basis))
+
+    projected = transposed.dot(basis).T
+    left, singular_values, _ = np.linalg.svd(projected, full_matrices=False)
+    return (basis @ left[:, :components]) * singular_values[:components]
+
+
+def _save_array(directory: Path, name: str, array: np.ndarray) -> None:
+    temp = directory / f"{name}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        np.save(f, array)
+    os.replace(temp, directory / name)
+
+
+def build_similarity_index(
+    documents: List,
+    directory: Path = SIMILARITY_DIR,
+    components: int = SIMILARITY_COMPONENTS
+) -> int:
+    """Build and store the vectors of all case documents. Returns the count."""
+    cases = [doc for doc in documents if doc.get("type") == "case"]
+    texts = [
+        " ".join(str(doc.get(field) or "") for field in TEXT_FIELDS)
+        for doc in cases
+    ]
+    matrix = tfidf_matrix(texts)
+    components = min(components, matrix.shape[0] - 1, matrix.shape[1] - 1)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    if components > 0:
+        vectors = randomized_svd(matrix, components)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        _save_array(directory, _VECTORS_FILE, (vectors / norms).astype(np.float32))
+        mode = "lsa"
+    else:
+        for name, array in zip(_SPARSE_FILES, (matrix.indptr, matrix.indices, matrix.data)):
+            _save_array(directory, name, array)
+        mode = "tfidf"
+
+    # Written last: readers reload when it changes
+    meta = {
+        "version": INDEX_VERSION,
+        "mode": mode,
+        "components": max(components, 0),
+        "terms": matrix.shape[1],
+        "ids": [doc["id"] for doc in cases],
+        "titles": [doc.get("title_en") or doc.get("title") or "" for doc in cases],
+    }
+    temp = directory / f"{_META_FILE}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp, directory / _META_FILE)
+    return len(cases)
+
+
+class SimilarityIndex:
+    """Memory-mapped document vectors answering top-k cosine queries."""
+
+    def __init__(self, directory: Path = SIMILARITY_DIR):
+        with open(directory / _META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported similarity index version: {meta.get('version')}")
+
+        self.mode = meta["mode"]
+        self.ids: List[str] = meta["ids"]
+        self.titles: List[str] = meta["titles"]
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+        if self.mode == "lsa":
+            self.vectors = np.load(directory / _VECTORS_FILE, mmap_mode="r")
+            self.matrix = None
+        else:
+            arrays = [np.load(directory / name, mmap_mode="r") for name in _SPARSE_FILES]
+            self.vectors = None
+            self.matrix = SparseMatrix(*arrays, meta["terms"])
+
+    def _scores(self, positions: List[int]) -> np.ndarray:
+        """Cosine similarity of each given document against all documents."""
+        if self.vectors is not None:
+            return np.asarray(self.vectors[positions]) @ np.asarray(self.vectors).T
+
+        matrix = self.matrix
+        scores = np.empty((len(positions), matrix.shape[0]), dtype=np.float32)
+        for row, position in enumerate(positions):
+            start, end = matrix.indptr[position], matrix.indptr[position + 1]
+            query = np.zeros(matrix.shape[1], dtype=np.float32)
+            query[matrix.indices[start:end]] = matrix.data[start:end]
+            scores[row] = matrix.row_dot(query)
+        return scores
+
+    def most_similar_batch(self, doc_ids: Sequence[str], limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k similar cases for several documents at once.
+
+        Unknown ids are left out of the result.
+        """
+        known = [doc_id for doc_id in doc_ids if doc_id in self.positions]
+        if not known:
+            return {}
+
+        positions = [self.positions[doc_id] for doc_id in known]
+        scores = self._scores(positions)
+        limit = min(limit, len(self.ids) - 1)
+
+        results = {}
+        for row, (doc_id, position) in enumerate(zip(known, positions)):
+            row_scores = scores[row]
+            row_scores[position] = -np.inf
+            if limit <= 0:
+                results[doc_id] = []
+                continue
+            top = np.argpartition(-row_scores, limit - 1)[:limit]
+            top = top[np.argsort(-row_scores[top], kind="stable")]
+            results[doc_id] = [
+                {"id": self.ids[i], "title": self.titles[i], "score": round(float(row_scores[i]), 4)}
+                for i in top
+                if row_scores[i] > 0
+            ]
+        return results
+
+    def most_similar(self, doc_id: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Top-k similar cases, or None if the document is not indexed."""
+        return self.most_similar_batch([doc_id], limit).get(doc_id)
+
+
+_similarity_index: Optional[SimilarityIndex] = None
+_similarity_index_mtime: Optional[float] = None
+
+
+def get_similarity_index(directory: Path = SIMILARITY_DIR) -> Optional[SimilarityIndex]:
+    """Get the similarity index, reloading it after the indexer rebuilds it.
+
+    Returns None if it has not been built yet.
+    """
+    global _similarity_index, _similarity_index_mtime
+    try:
+        mtime = (directory / _META_FILE).stat().st_mtime
+    except OSError:
+        return None
+
+    if _similarity_index is None or mtime != _similarity_index_mtime:
+        _similarity_index = SimilarityIndex(directory)
+        _similarity_index_mtime = mtime
+    return _similarity_index
@@ -0,0 +1,116 @@
+"""Request coalescing for identical concurrent lookups.
+
+When many users run the same query at the same moment (a shared link),
+each request would send the same call to Meilisearch. A single-flight
+group lets the first caller of a key run the call while the others with
+the same key wait for it and share its result, so each distinct lookup is
+in flight at most once per process. Results are shared objects: callers
+must not modify them.
+"""
+
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+from .config import SINGLE_FLIGHT_ENABLED
+
+
+class _Call:
+    """One in-flight call and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, function: Callable, *args, **kwargs) -> Any:
+        """Run `function`, or wait for the running call with the same key."""
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Later callers start a new call rather than reuse this result
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+            }
+
+
+# Groups by name, in creation order
+_groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str) -> Callable[[Callable], Callable]:
+    """Coalesce concurrent calls of a method that have the same arguments.
+
+    The key is the instance and the method's arguments after applying
+    defaults, so `f(q)` and `f(q, limit=20)` share a call when 20 is the
+    default. Calls are only coalesced on the same instance: engines for
+    different indexes (e.g. live and staging) never share results.
+    """
+    group = _groups.setdefault(name, SingleFlight(name))
+
+    def decorator(method: Callable) -> Callable:
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not SINGLE_FLIGHT_ENABLED:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            # Instances hash by identity
+            key = tuple(bound.arguments.items())
+            try:
+                hash(key)
+            except TypeError:
+                # Unhashable arguments (e.g. a list): not worth coalescing
+                return method(self, *args, **kwargs)
+            return group.do(key, method, self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every group: calls made, callers coalesced, calls in flight."""
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,127 @@
+"""Index status shared by every client of one web process.
+
+Each status check costs Meilisearch a stats and a task list request, and
+during a re-index every open page used to poll for it on its own. A single
+StatusBroadcaster now refreshes the status on a fixed interval while anyone
+is listening and pushes changes to all /api/index-status/stream
+subscribers. Plain /api/index-status requests are answered from the same
+snapshot while it is fresh.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from .config import INDEX_STATUS_INTERVAL
+from .jobs import get_job_manager
+from .search import get_search_engine
+from .warmup import get_warmer
+
+
+def collect_index_status() -> Optional[Dict[str, Any]]:
+    """Index progress, merged with the running indexing job if there is one.
+
+    Returns None if Meilisearch is unreachable.
+    """
+    search_engine = get_search_engine()
+
+    if not search_engine.connect_to_meilisearch():
+        return None
+
+    progress_info = search_engine.get_indexing_progress()
+
+    # A running job knows its own progress better than Meilisearch's task list
+    job = get_job_manager().active()
+    if job is not None:
+        progress_info["is_indexing"] = True
+        progress_info["progress"] = job["progress"]
+        progress_info["estimated_time_remaining"] = job["estimated_time_remaining"]
+
+    return {
+        "indexed": progress_info["indexed"],
+        "progress": progress_info["progress"],
+        "document_count": progress_info["document_count"],
+        "is_indexing": progress_info["is_indexing"],
+        "estimated_time_remaining": progress_info["estimated_time_remaining"],
+        "message": "Index is ready" if progress_info["indexed"] else "Index is being created, please wait...",
+        "job": job,
+        "warmup": get_warmer().status()
+    }
+
+
+class StatusBroadcaster:
+    """Polls the index status once per interval and fans it out to subscribers.
+
+    Lives on the event loop: subscribers are asyncio queues holding only
+    the latest status, so a slow client skips intermediate updates instead
+    of piling them up.
+    """
+
+    def __init__(self, interval: float = INDEX_STATUS_INTERVAL):
+        self.interval = interval
+        self.latest: Optional[Dict[str, Any]] = None
+        self.updated_at = 0.0
+        self._subscribers: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber; it receives the current status right away."""
+        subscription: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.append(subscription)
+        if self.updated_at:
+            subscription.put_nowait(self.latest)
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription: asyncio.Queue) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    async def current(self) -> Optional[Dict[str, Any]]:
+        """The latest status, refreshed first if it is older than the interval."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # Concurrent callers share the refresh of whoever got here first
+            if time.monotonic() - self.updated_at >= self.interval:
+                await self._refresh()
+        return self.latest
+
+    async def _refresh(self) -> None:
+        status = await run_in_threadpool(collect_index_status)
+        changed = status != self.latest or not self.updated_at
+        self.latest = status
+        self.updated_at = time.monotonic()
+        if changed:
+            self._publish(status)
+
+    def _publish(self, status: Optional[Dict[str, Any]]) -> None:
+        for subscription in self._subscribers:
+            if subscription.full():
+                subscription.get_nowait()
+            subscription.put_nowait(status)
+
+    async def _poll(self) -> None:
+        try:
+            while self._subscribers:
+                try:
+                    await self.current()
+                except Exception as e:
+                    print(f"Error refreshing index status: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            self._task = None
+
+
+# Global broadcaster instance
+_status_broadcaster: Optional[StatusBroadcaster] = None
+
+
+def get_status_broadcaster() -> StatusBroadcaster:
+    """Get or create the global status broadcaster."""
+    global _status_broadcaster
+    if _status_broadcaster is None:
+        _status_broadcaster = StatusBroadcaster()
+    return _status_broadcaster
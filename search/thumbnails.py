@@ -0,0 +1,194 @@
+"""WebP thumbnail generation with a content-addressed cache.
+
+Thumbnails live under THUMBNAIL_DIR/<aa>/<digest>/<size>.webp, where digest
+is the SHA-256 of the source image bytes. An image whose bytes did not
+change maps to the same directory and is never re-encoded; a changed image
+gets a new digest and a fresh set of thumbnails. The same worker pass
+computes the perceptual hashes of each image (see phash.py) and caches them
+alongside the thumbnails.
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from .config import BASE_DIR, THUMBNAIL_DIR, THUMBNAIL_SIZES, THUMBNAIL_WORKERS
+from .phash import dhash, phash, format_hash
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it documents keep only the full image
+    Image = None
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+WEBP_QUALITY = 80
+_META_FILE = "meta.json"
+_HASH_CHUNK = 1024 * 1024
+# Perceptual hashes are computed from the image decoded and downscaled to
+# this size, independent of THUMBNAIL_SIZES, so every path hashes the same pixels
+_PHASH_SOURCE_SIZE = 256
+# Bumped when that normalization changes; older cached hashes are recomputed
+_PHASH_VERSION = 2
+
+
+def thumbnails_available() -> bool:
+    """Whether Pillow is installed."""
+    return Image is not None
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(digest: str, cache_dir: Path = THUMBNAIL_DIR) -> Path:
+    """Directory holding the thumbnails of one source image."""
+    return cache_dir / digest[:2] / digest
+
+
+def thumbnail_path(digest: str, size: int, cache_dir: Path = THUMBNAIL_DIR) -> Optional[Path]:
+    """Path of a cached thumbnail, or None if the digest or size is not valid."""
+    if not DIGEST_PATTERN.match(digest) or size not in THUMBNAIL_SIZES:
+        return None
+    return cache_dir_for(digest, cache_dir) / f"{size}.webp"
+
+
+def _load_meta(directory: Path, sizes: Sequence[int]) -> Optional[Dict]:
+    """Read cached dimensions if every requested size is present."""
+    try:
+        with open(directory / _META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if all(str(size) in meta and (directory / f"{size}.webp").exists() for size in sizes):
+        return meta
+    return None
+
+
+def _write_meta(directory: Path, meta: Dict) -> None:
+    temp = directory / f"{_META_FILE}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp, directory / _META_FILE)
+
+
+def _hashes(source: Path) -> Dict[str, str]:
+    """Perceptual hashes of an image file, always from the same normalized decode."""
+    with Image.open(source) as image:
+        image.draft("RGB", (_PHASH_SOURCE_SIZE, _PHASH_SOURCE_SIZE))
+        image = image.convert("RGB")
+        image.thumbnail((_PHASH_SOURCE_SIZE, _PHASH_SOURCE_SIZE), Image.LANCZOS)
+        return {
+            "phash": format_hash(phash(image)),
+            "dhash": format_hash(dhash(image)),
+            "phash_version": _PHASH_VERSION,
+        }
+
+
+def _render(source: Path, directory: Path, sizes: Sequence[int]) -> Dict:
+    """Encode all sizes of one image into its cache directory and hash it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    meta: Dict = _hashes(source)
+
+    with Image.open(source) as image:
+        # Decode at reduced resolution where the format supports it (JPEG)
+        image.draft("RGB", (max(sizes), max(sizes)))
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # Largest first, so each smaller size is resampled from the previous one
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            target = directory / f"{size}.webp"
+            temp = target.with_suffix(f".{os.getpid()}.tmp")
+            image.save(temp, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(temp, target)
+            meta[str(size)] = {"width": image.width, "height": image.height}
+
+    _write_meta(directory, meta)
+    return meta
+
+
+def process_image(task: Tuple[str, str, Tuple[int, ...]]) -> Optional[Tuple[str, Dict]]:
+    """Worker entry point: hash a source image and make sure its thumbnails exist.
+
+    Returns (digest, meta) where meta maps each size to {"width", "height"}
+    and holds the "phash" and "dhash" hex strings, or None if the image
+    could not be read.
+    """
+    source, cache_dir, sizes = task
+    source_path = Path(source)
+    try:
+        digest = file_digest(source_path)
+        directory = cache_dir_for(digest, Path(cache_dir))
+        meta = _load_meta(directory, sizes)
+        if meta is None:
+            meta = _render(source_path, directory, sizes)
+        elif meta.get("phash_version") != _PHASH_VERSION:
+            # Cached before perceptual hashes were added, or hashed differently
+            meta.update(_hashes(source_path))
+            _write_meta(directory, meta)
+        return digest, meta
+    except Exception as e:
+        print(f"Error generating thumbnails for {source}: {e}")
+        return None
+
+
+def generate_thumbnails(
+    documents: List,
+    sizes: Sequence[int] = THUMBNAIL_SIZES,
+    workers: Optional[int] = THUMBNAIL_WORKERS,
+    cache_dir: Path = THUMBNAIL_DIR
+) -> int:
+    """Generate thumbnails for every document with an image.
+
+    Sets `thumbnail_hash` and `thumbnails` (a list of {"size", "path",
+    "width", "height"}, smallest first) on each document, along with the
+    `phash` and `dhash` perceptual hashes. Returns the number of documents
+    that got thumbnails.
+    """
+    if Image is None:
+        print("Pillow is not installed, skipping thumbnail generation")
+        return 0
+
+    pending = [doc for doc in documents if doc.get("image")]
+    if not pending:
+        return 0
+
+    sizes = tuple(sorted(sizes))
+    tasks = [(str(BASE_DIR / doc["image"]), str(cache_dir), sizes) for doc in pending]
+
+    # Encoding is CPU bound, so use processes rather than threads
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(process_image, tasks, chunksize=chunksize))
+
+    count = 0
+    for doc, result in zip(pending, results):
+        if result is None:
+            continue
+        digest, meta = result
+        doc["thumbnail_hash"] = digest
+        doc["thumbnails"] = [
+            {
+                "size": size,
+                "path": f"/api/thumb/{digest}/{size}",
+                "width": meta[str(size)]["width"],
+                "height": meta[str(size)]["height"],
+            }
+            for size in sizes
+        ]
+        doc["phash"] = meta["phash"]
+        doc["dhash"] = meta["dhash"]
+        count += 1
+
+    return count
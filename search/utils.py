@@ -2,7 +2,7 @@
 
 import re
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def parse_gitmodules(gitmodules_path: Path) -> List[dict]:
@@ -35,32 +35,87 @@ def parse_gitmodules(gitmodules_path: Path) -> List[dict]:
     return submodules
 
 
-def extract_markdown_text(md_path: Path) -> str:
-    """Extract text content from markdown file."""
-    try:
-        with open(md_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # Remove code blocks
-        content = re.sub(r"```[\s\S]*?```", "", content)
-        content = re.sub(r"`[^`]+`", "", content)
-        
-        # Remove links but keep text
-        content = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", content)
-        
-        # Remove images
-        content = re.sub(r"!\[([^\]]*)\]\([^\)]+\)", "", content)
-        
-        # Remove HTML tags
-        content = re.sub(r"<[^>]+>", "", content)
-        
-        # Clean up whitespace
-        content = re.sub(r"\n\s*\n", "\n\n", content)
+def clean_markdown(content: str) -> str:
+    """Reduce markdown to its plain text."""
+    # Remove code blocks
+    content = re.sub(r"```[\s\S]*?```", "", content)
+    content = re.sub(r"`[^`]+`", "", content)
+    
+    # Remove links but keep text
+    content = re.sub(r"\[([^\]]+)\]\([^\)]+\)", r"\1", content)
+    
+    # Remove images
+    content = re.sub(r"!\[([^\]]*)\]\([^\)]+\)", "", content)
+    
+    # Remove HTML tags
+    content = re.sub(r"<[^>]+>", "", content)
+    
+    # Clean up whitespace
+    content = re.sub(r"\n\s*\n", "\n\n", content)
+    
+    return content.strip()
+
+
+_HEADING = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+
+
+def heading_title(heading: str) -> str:
+    """Plain text of a markdown heading (without the leading #s)."""
+    # Keep the text of inline code, which clean_markdown drops, as GitHub does
+    return clean_markdown(re.sub(r"`([^`]*)`", r"\1", heading.lstrip("#").strip()))
+
+
+def markdown_anchor(heading: str, seen: Dict[str, int]) -> str:
+    """GitHub's anchor for a heading; `seen` numbers repeated anchors."""
+    slug = re.sub(r"[^\w\- ]", "", heading.strip().lower()).replace(" ", "-")
+    count = seen.get(slug, 0)
+    seen[slug] = count + 1
+    return slug if count == 0 else f"{slug}-{count}"
+
+
+def split_markdown_sections(content: str) -> List[Dict[str, Any]]:
+    """Split markdown at its headings.
+
+    Returns one dict per section, in document order, with `title` (the
+    heading as plain text, "" for text before the first heading), `level`,
+    `anchor`, `parents` (titles of the enclosing headings, outermost
+    first) and `text` (the raw markdown under the heading, up to the next
+    heading of any level). Headings inside fenced code blocks are ignored.
+    """
+    sections = [{"title": "", "level": 0, "anchor": "", "parents": [], "lines": []}]
+    stack: List[Tuple[int, str]] = []
+    seen: Dict[str, int] = {}
+    fence = None
+    
+    for line in content.splitlines():
+        fence_match = _FENCE.match(line)
+        if fence_match:
+            if fence is None:
+                fence = fence_match.group(1)
+            elif fence_match.group(1) == fence:
+                fence = None
+        heading = None if fence else _HEADING.match(line)
+        if heading is None:
+            sections[-1]["lines"].append(line)
+            continue
         
-        return content.strip()
-    except Exception as e:
-        print(f"Error reading markdown file {md_path}: {e}")
-        return ""
+        level = len(heading.group(1))
+        title = heading_title(heading.group(2))
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        sections.append({
+            "title": title,
+            "level": level,
+            "anchor": markdown_anchor(title, seen),
+            "parents": [parent for _, parent in stack],
+            "lines": [],
+        })
+        stack.append((level, title))
+    
+    for section in sections:
+        section["text"] = "\n".join(section.pop("lines"))
+    return sections
 
 
 def generate_document_id(submodule: str, doc_type: str, path: str) -> str:
@@ -71,6 +126,11 @@ def generate_document_id(submodule: str, doc_type: str, path: str) -> str:
     return hashlib.md5(combined.encode()).hexdigest()
 
 
+def text_language(text: str) -> str:
+    """"zh" for text containing CJK ideographs, "en" otherwise."""
+    return "zh" if re.search(r"[\u4e00-\u9fff]", text or "") else "en"
+
+
 def determine_language(title: Optional[str], title_en: Optional[str]) -> str:
     """Determine language based on available fields."""
     has_zh = bool(title and title.strip())
@@ -0,0 +1,206 @@
+"""Cache warm-up at startup and whenever the index changes.
+
+A warm-up replays the most frequent recorded queries (see analytics.py),
+plus any configured in WARMUP_QUERIES, through search and suggestions, and
+loads the submodule list and the similarity indexes, so the first real
+users don't pay for cold Meilisearch pages and cold in-process caches. It
+also checks that the document store matches the index (see docstore.py).
+It runs with bounded concurrency and a deadline. The web app runs it at
+startup (reporting not ready on /readyz until it is done), and whenever a
+background watcher sees the index version change: through the shared
+signal every indexing job and `python -m search index` run bumps, so all
+web workers re-warm together, or through Meilisearch's updatedAt for
+changes made any other way.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .analytics import get_analytics
+from .coordination import INDEX_VERSION_SIGNAL, read_signal
+from .config import (
+    WARMUP_ENABLED,
+    WARMUP_QUERY_COUNT,
+    WARMUP_QUERIES,
+    WARMUP_CONCURRENCY,
+    WARMUP_TIMEOUT,
+    WARMUP_POLL_INTERVAL,
+)
+from .search import get_search_engine
+
+# Window of recorded history the replayed queries are taken from
+HISTORY_DAYS = 30
+# Seconds between checks of the index version signal
+SIGNAL_POLL_INTERVAL = 1.0
+
+
+class CacheWarmer:
+    """Runs warm-ups and tracks whether the instance is warm."""
+
+    def __init__(
+        self,
+        query_count: int = WARMUP_QUERY_COUNT,
+        concurrency: int = WARMUP_CONCURRENCY,
+        timeout: float = WARMUP_TIMEOUT,
+        poll_interval: float = WARMUP_POLL_INTERVAL
+    ):
+        self.query_count = query_count
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.ready = threading.Event()
+        self.index_version: Optional[str] = None
+        self.last_run: Dict[str, Any] = {}
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def queries(self) -> List[str]:
+        """Configured queries first, then the most frequent recorded ones."""
+        queries = list(WARMUP_QUERIES)
+        try:
+            recorded = get_analytics().top_queries(days=HISTORY_DAYS, limit=self.query_count)
+            queries.extend(row["query"] for row in recorded)
+        except Exception as e:
+            print(f"Error reading query history for warm-up: {e}")
+
+        seen = set()
+        unique = []
+        for query in queries:
+            if query not in seen:
+                seen.add(query)
+                unique.append(query)
+        return unique[:self.query_count]
+
+    def run(self, reason: str) -> Dict[str, Any]:
+        """Warm caches now. Marks the instance ready when done, even on failure."""
+        with self._run_lock:
+            started = time.perf_counter()
+            result: Dict[str, Any] = {"reason": reason, "started_at": time.time()}
+            try:
+                result.update(self._warm())
+            except Exception as e:
+                print(f"Error during cache warm-up: {e}")
+                result["error"] = str(e)
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            self.last_run = result
+            self.ready.set()
+
+            print(
+                f"Cache warm-up ({reason}): {result.get('completed', 0)} lookups "
+                f"in {result['seconds']}s"
+            )
+            return result
+
+    def _warm(self) -> Dict[str, Any]:
+        # numpy and Pillow are only imported once the app is up
+        from .docstore import check_docstore
+        from .phash import get_image_index
+        from .similarity import get_similarity_index
+
+        engine = get_search_engine()
+        if not engine.connect_to_meilisearch() or not engine.is_indexed():
+            return {"skipped": "index not ready"}
+
+        queries = self.queries()
+        tasks: List[Tuple[Callable, tuple]] = [(engine.get_submodules, ())]
+        tasks.extend((engine.search, (query, "both")) for query in queries)
+        tasks.extend((engine.get_suggestions, (query,)) for query in queries)
+        tasks.append((get_similarity_index, ()))
+        tasks.append((get_image_index, ()))
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup")
+        try:
+            futures = [executor.submit(function, *args) for function, args in tasks]
+            done, not_done = wait(futures, timeout=self.timeout)
+        finally:
+            # Past the deadline, leave whatever is still running to finish on its own
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.index_version = engine.get_index_version()
+        # A store written for another version of the index would serve outdated cases
+        docstore = check_docstore(self.index_version)
+        return {
+            "queries": len(queries),
+            "completed": len(done),
+            "failed": sum(1 for future in done if future.exception() is not None),
+            "timed_out": len(not_done),
+            "index_version": self.index_version,
+            "docstore": docstore,
+        }
+
+    # Index version watcher
+
+    def start_watching(self) -> None:
+        """Re-run the warm-up whenever the index version changes."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="warmup-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self) -> None:
+        # Indexing runs of this deployment bump a shared signal, which is
+        # cheap to poll often; changes made any other way only show in
+        # Meilisearch's updatedAt, which is polled less often
+        index_signal: Optional[int] = None
+        last_poll = time.monotonic()
+        while not self._stop.wait(SIGNAL_POLL_INTERVAL):
+            try:
+                signal = read_signal(INDEX_VERSION_SIGNAL)
+                if index_signal is None:
+                    index_signal = signal
+                elif signal != index_signal:
+                    index_signal = signal
+                    self.run("index version signal")
+                    continue
+                
+                if time.monotonic() - last_poll < self.poll_interval:
+                    continue
+                last_poll = time.monotonic()
+                engine = get_search_engine()
+                version = engine.get_index_version()
+                if version is None or version == self.index_version:
+                    continue
+                # Every indexing batch bumps the version; wait for the last one
+                if engine.get_indexing_progress().get("is_indexing"):
+                    continue
+                self.run("index version changed")
+            except Exception as e:
+                print(f"Error watching index version: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready.is_set(), "last_run": self.last_run}
+
+
+class _DisabledWarmer(CacheWarmer):
+    """Stand-in used when WARMUP_ENABLED is off: always ready, never warms."""
+
+    def __init__(self):
+        super().__init__()
+        self.ready.set()
+
+    def run(self, reason: str) -> Dict[str, Any]:
+        return {"reason": reason, "skipped": "disabled"}
+
+    def start_watching(self) -> None:
+        pass
+
+
+# Global warmer instance
+_warmer: Optional[CacheWarmer] = None
+
+
+def get_warmer() -> CacheWarmer:
+    """Get or create the global cache warmer."""
+    global _warmer
+    if _warmer is None:
+        _warmer = CacheWarmer() if WARMUP_ENABLED else _DisabledWarmer()
+    return _warmer
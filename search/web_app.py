@@ -1,16 +1,28 @@
 """FastAPI web application for the search engine."""
 
-from fastapi import FastAPI, Query, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Query, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.requests import Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from pathlib import Path
+from .analytics import get_analytics
+from .jobs import get_job_manager
 from .search import get_search_engine
-from .indexer import build_index
-from .config import BASE_DIR, GITMODULES_FILE
+from .singleflight import single_flight_stats
+from .status import get_status_broadcaster
+from .config import ADMIN_TOKEN, BASE_DIR, GITMODULES_FILE, PROFILE_DIR, SINGLE_FLIGHT_ENABLED
+from .profiling import PROFILE_NAME, Profiler, memory_snapshot
+from .warmup import get_warmer
 from .utils import parse_gitmodules
+import asyncio
+import contextvars
+import hmac
+import json
 import threading
+import time
 
 app = FastAPI(
     title="Nano Banana Search Engine",
@@ -18,11 +30,137 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Served only when templates/index.html is missing
+FALLBACK_PAGE = Path(__file__).parent / "fallback.html"
+
 # Mount static files
 static_dir = BASE_DIR / "static"
 if static_dir.exists():
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
+
+def is_admin(request: Request) -> bool:
+    """Whether the request carries the admin token; never true when ADMIN_TOKEN is unset."""
+    token = request.headers.get("x-admin-token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def require_admin(request: Request) -> None:
+    """Reject non-admin requests; the admin endpoints don't exist without ADMIN_TOKEN."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+# One profiled request at a time: cProfile allows a single active profiler
+_profile_lock = asyncio.Lock()
+# The profiler of the request being handled, if it is profiled
+_request_profiler: contextvars.ContextVar[Optional[Profiler]] = contextvars.ContextVar("request_profiler", default=None)
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Profile a single request that sends X-Profile along with the admin token.
+
+    X-Profile is a comma-separated list of modes: "cpu" (the default),
+    "memory" (also trace allocations) and "report" (answer with the text
+    report instead of the response). The profile is stored in PROFILE_DIR
+    and named in the X-Profile-Report header. Work done on the event loop
+    thread is profiled, including that of concurrent requests, as is the
+    request's own work handed to worker threads through in_threadpool().
+    """
+    header = request.headers.get("x-profile")
+    if not header or not is_admin(request):
+        return await call_next(request)
+    
+    if _profile_lock.locked():
+        return JSONResponse(status_code=409, content={"detail": "Another request is being profiled"})
+    
+    modes = {mode.strip().lower() for mode in header.split(",")}
+    async with _profile_lock:
+        started = time.perf_counter()
+        profiler = Profiler(f"request {request.method} {request.url.path}", memory="memory" in modes).start("request")
+        token = _request_profiler.set(profiler)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_profiler.reset(token)
+            report_path = profiler.stop()
+    
+    headers = {
+        "X-Profile-Report": report_path.name,
+        "Server-Timing": f"app;dur={(time.perf_counter() - started) * 1000:.1f}",
+    }
+    if "report" in modes:
+        return PlainTextResponse(profiler.report, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
+async def in_threadpool(function, *args, **kwargs):
+    """run_in_threadpool, keeping the call in the profile of a profiled request."""
+    profiler = _request_profiler.get()
+    if profiler is None:
+        return await run_in_threadpool(function, *args, **kwargs)
+    return await run_in_threadpool(profiler.run, function, *args, **kwargs)
+
+@app.on_event("startup")
+async def start_analytics():
+    """Start flushing query analytics in the background."""
+    get_analytics().start()
+
+
+@app.on_event("startup")
+async def warm_caches():
+    """Warm caches in the background (/readyz fails until done), then follow index changes."""
+    warmer = get_warmer()
+    
+    def warm_and_watch():
+        warmer.run("startup")
+        warmer.start_watching()
+    
+    threading.Thread(target=warm_and_watch, name="warmup", daemon=True).start()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: caches are warm and Meilisearch is reachable."""
+    warmer = get_warmer()
+    if not warmer.ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmer.status()})
+    
+    search_engine = get_search_engine()
+    healthy = await in_threadpool(search_engine.client.is_healthy)
+    if not healthy:
+        return JSONResponse(status_code=503, content={"status": "search unavailable"})
+    
+    return {"status": "ready"}
+
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    """Write out buffered query analytics."""
+    get_analytics().stop()
+
+
+@app.on_event("shutdown")
+async def stop_index_job():
+    """Cancel a running indexing job rather than leave its worker behind."""
+    get_job_manager().shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_warmer():
+    """Stop watching the index version."""
+    get_warmer().stop_watching()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Main search page."""
@@ -35,116 +173,8 @@ async def index(request: Request):
             template_content = f.read()
         return HTMLResponse(content=template_content)
     else:
-        # Simple HTML response if template not available
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Nano Banana Search</title>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <style>
-                body { font-family: Arial, sans-serif; max-width: 1200px; margin: 0 auto; padding: 20px; }
-                .search-box { width: 100%; padding: 10px; font-size: 16px; margin-bottom: 20px; }
-                .filters { margin-bottom: 20px; }
-                .filters select, .filters input { margin-right: 10px; padding: 5px; }
-                .results { margin-top: 20px; }
-                .result-item { border: 1px solid #ddd; padding: 15px; margin-bottom: 15px; border-radius: 5px; }
-                .result-title { font-size: 18px; font-weight: bold; color: #2563eb; margin-bottom: 10px; }
-                .result-meta { color: #666; font-size: 14px; margin-bottom: 5px; }
-                .result-prompt { color: #333; margin-top: 10px; }
-            </style>
-        </head>
-        <body>
-            <h1>Nano Banana Search Engine</h1>
-            <input type="text" id="searchQuery" class="search-box" placeholder="Search prompts, cases, and documentation...">
-            <div class="filters">
-                <select id="langFilter">
-                    <option value="both">All Languages</option>
-                    <option value="en">English</option>
-                    <option value="zh">Chinese</option>
-                </select>
-                <select id="submoduleFilter">
-                    <option value="">All Submodules</option>
-                </select>
-            </div>
-            <div id="results" class="results"></div>
-            <script>
-                const searchQuery = document.getElementById('searchQuery');
-                const langFilter = document.getElementById('langFilter');
-                const submoduleFilter = document.getElementById('submoduleFilter');
-                const resultsDiv = document.getElementById('results');
-                
-                let searchTimeout;
-                
-                async function performSearch() {
-                    const query = searchQuery.value.trim();
-                    if (!query) {
-                        resultsDiv.innerHTML = '';
-                        return;
-                    }
-                    
-                    const params = new URLSearchParams({
-                        q: query,
-                        lang: langFilter.value,
-                        submodule: submoduleFilter.value || ''
-                    });
-                    
-                    try {
-                        const response = await fetch(`/api/search?${params}`);
-                        const data = await response.json();
-                        displayResults(data);
-                    } catch (error) {
-                        resultsDiv.innerHTML = '<p>Error performing search</p>';
-                    }
-                }
-                
-                function displayResults(data) {
-                    if (!data.hits || data.hits.length === 0) {
-                        resultsDiv.innerHTML = '<p>No results found</p>';
-                        return;
-                    }
-                    
-                    let html = `<p>Found ${data.total} result(s)</p>`;
-                    data.hits.forEach(hit => {
-                        const title = hit.title_en || hit.title || 'Untitled';
-                        html += `
-                            <div class="result-item">
-                                <div class="result-title">${title}</div>
-                                ${hit.author ? `<div class="result-meta">Author: ${hit.author}</div>` : ''}
-                                ${hit.submodule ? `<div class="result-meta">Submodule: ${hit.submodule}</div>` : ''}
-                                ${hit.prompt_en || hit.prompt ? `<div class="result-prompt">${(hit.prompt_en || hit.prompt).substring(0, 200)}...</div>` : ''}
-                                <div class="result-meta">Path: ${hit.path}</div>
-                            </div>
-                        `;
-                    });
-                    resultsDiv.innerHTML = html;
-                }
-                
-                searchQuery.addEventListener('input', () => {
-                    clearTimeout(searchTimeout);
-                    searchTimeout = setTimeout(performSearch, 300);
-                });
-                
-                langFilter.addEventListener('change', performSearch);
-                submoduleFilter.addEventListener('change', performSearch);
-                
-                // Load submodules
-                fetch('/api/submodules')
-                    .then(r => r.json())
-                    .then(data => {
-                        data.submodules.forEach(sub => {
-                            const option = document.createElement('option');
-                            option.value = sub;
-                            option.textContent = sub;
-                            submoduleFilter.appendChild(option);
-                        });
-                    });
-            </script>
-        </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
+        # Minimal page if the template is not available
+        return HTMLResponse(content=FALLBACK_PAGE.read_text(encoding="utf-8"))
 
 
 @app.get("/api/search")
@@ -153,7 +183,8 @@ async def search_api(
     lang: Optional[str] = Query("both", description="Language filter: zh, en, or both"),
     submodule: Optional[str] = Query(None, description="Filter by submodule (comma-separated for multiple)"),
     limit: Optional[int] = Query(20, description="Number of results"),
-    offset: Optional[int] = Query(0, description="Offset for pagination")
+    offset: Optional[int] = Query(0, description="Offset for pagination"),
+    collapse: bool = Query(False, description="Return one hit per group of near-duplicate prompts, and per markdown file")
 ):
     """Search API endpoint."""
     search_engine = get_search_engine()
@@ -176,13 +207,22 @@ async def search_api(
     
     filter_str = " AND ".join(filters) if filters else None
     
-    # Perform search
-    results = search_engine.search(
+    # Perform search, in a worker thread so identical concurrent searches can share one call
+    started = time.perf_counter()
+    results = await in_threadpool(
+        search_engine.search,
         query=q,
         language=lang,
         filters=filter_str,
         limit=limit,
-        offset=offset
+        offset=offset,
+        collapse_duplicates=collapse
+    )
+    get_analytics().record(
+        "search",
+        q,
+        results.get("estimatedTotalHits", results.get("total", len(results.get("hits", [])))),
+        (time.perf_counter() - started) * 1000
     )
     
     return results
@@ -199,7 +239,9 @@ async def get_suggestions(
     if not search_engine.connect_to_meilisearch():
         raise HTTPException(status_code=503, detail="Search service unavailable")
     
-    suggestions = search_engine.get_suggestions(q, limit=limit)
+    started = time.perf_counter()
+    suggestions = await in_threadpool(search_engine.get_suggestions, q, limit=limit)
+    get_analytics().record("suggestions", q, len(suggestions), (time.perf_counter() - started) * 1000)
     
     return {"suggestions": suggestions}
 
@@ -209,17 +251,119 @@ async def get_case(case_id: str):
     """Get full case details by ID."""
     search_engine = get_search_engine()
     
-    if not search_engine.connect_to_meilisearch():
-        raise HTTPException(status_code=503, detail="Search service unavailable")
-    
-    case = search_engine.get_case_by_id(case_id)
+    # Usually answered by the local document store, without touching Meilisearch
+    case = await in_threadpool(search_engine.get_case_by_id, case_id)
     
     if not case:
+        if not search_engine.connect_to_meilisearch():
+            raise HTTPException(status_code=503, detail="Search service unavailable")
         raise HTTPException(status_code=404, detail="Case not found")
     
     return case
 
 
+# Most ids one /api/cases request may ask for
+CASES_BATCH_LIMIT = 1000
+
+
+class CasesRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None
+
+
+async def fetch_cases(ids: List[str], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Cases in request order (None for misses) and the ids not found."""
+    if len(ids) > CASES_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {CASES_BATCH_LIMIT} ids per request")
+    
+    found = await in_threadpool(get_search_engine().get_cases_by_ids, ids, fields)
+    if found is None:
+        raise HTTPException(status_code=503, detail="Search service unavailable")
+    
+    return {
+        "results": [found.get(case_id) for case_id in ids],
+        "missing": [case_id for case_id in dict.fromkeys(ids) if case_id not in found],
+    }
+
+
+@app.get("/api/cases")
+async def get_cases(
+    ids: str = Query(..., description="Comma-separated case ids"),
+    fields: Optional[str] = Query(None, description="Comma-separated attributes to return (default: all)")
+):
+    """Get several cases in one call, in the order requested."""
+    case_ids = [case_id.strip() for case_id in ids.split(",") if case_id.strip()]
+    names = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    return await fetch_cases(case_ids, names)
+
+
+@app.post("/api/cases")
+async def post_cases(request: CasesRequest):
+    """Get several cases in one call, for id lists too long for a URL."""
+    return await fetch_cases(request.ids, request.fields)
+
+
+@app.get("/api/case/{case_id}/similar")
+async def get_similar_cases(
+    case_id: str,
+    limit: int = Query(10, ge=1, le=100, description="Number of similar cases")
+):
+    """Find cases with similar prompts ("more like this")."""
+    from .similarity import get_similarity_index
+    
+    similarity_index = get_similarity_index()
+    
+    if similarity_index is None:
+        raise HTTPException(status_code=503, detail="Similarity index not built yet")
+    
+    similar = similarity_index.most_similar(case_id, limit=limit)
+    
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Case not found in similarity index")
+    
+    return {"id": case_id, "similar": similar}
+
+
+@app.get("/api/case/{case_id}/similar-images")
+async def get_similar_images(
+    case_id: str,
+    max_distance: int = Query(10, ge=0, le=32, description="Maximum pHash Hamming distance"),
+    limit: int = Query(20, ge=1, le=100, description="Number of similar images")
+):
+    """Find byte-identical and visually similar case images."""
+    from .phash import get_image_index
+    
+    image_index = get_image_index()
+    
+    if image_index is None:
+        raise HTTPException(status_code=503, detail="Image index not built yet")
+    
+    result = image_index.similar(case_id, max_distance=max_distance, limit=limit)
+    
+    if result is None:
+        raise HTTPException(status_code=404, detail="Case has no indexed image")
+    
+    return result
+
+
+@app.get("/api/thumb/{digest}/{size}")
+async def get_thumbnail(digest: str, size: int):
+    """Serve a cached WebP thumbnail."""
+    from .thumbnails import thumbnail_path
+    
+    path = thumbnail_path(digest, size)
+    
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    # Thumbnails are content-addressed, so a URL never changes its content
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
 @app.get("/api/submodules")
 async def get_submodules():
     """List all submodules."""
@@ -233,6 +377,56 @@ async def get_submodules():
     return {"submodules": submodules}
 
 
+@app.get("/api/analytics/top-queries")
+async def get_top_queries(
+    request: Request,
+    endpoint: str = Query("search", description="Endpoint: search or suggestions"),
+    days: float = Query(7, gt=0, description="Time window in days"),
+    limit: int = Query(20, ge=1, le=500, description="Number of queries")
+):
+    """Most frequent queries (admin only)."""
+    require_admin(request)
+    # Aggregating flushes the buffer first: keep the SQLite work off the event loop
+    queries = await in_threadpool(get_analytics().top_queries, endpoint=endpoint, days=days, limit=limit)
+    return {"queries": queries}
+
+
+@app.get("/api/analytics/zero-result-queries")
+async def get_zero_result_queries(
+    request: Request,
+    endpoint: str = Query("search", description="Endpoint: search or suggestions"),
+    days: float = Query(7, gt=0, description="Time window in days"),
+    limit: int = Query(20, ge=1, le=500, description="Number of queries")
+):
+    """Most frequent queries that returned no results (admin only)."""
+    require_admin(request)
+    queries = await in_threadpool(get_analytics().zero_result_queries, endpoint=endpoint, days=days, limit=limit)
+    return {"queries": queries}
+
+
+@app.get("/api/analytics/latency")
+async def get_query_latency(
+    request: Request,
+    endpoint: str = Query("search", description="Endpoint: search or suggestions"),
+    days: float = Query(7, gt=0, description="Time window in days"),
+    limit: int = Query(20, ge=1, le=500, description="Number of queries"),
+    min_count: int = Query(1, ge=1, description="Only queries seen at least this often")
+):
+    """Slowest queries by average latency (admin only)."""
+    require_admin(request)
+    analytics = get_analytics()
+    queries = await in_threadpool(
+        analytics.latency_by_query, endpoint=endpoint, days=days, limit=limit, min_count=min_count
+    )
+    return {"queries": queries, "recorder": analytics.stats()}
+
+
+@app.get("/api/analytics/coalescing")
+async def get_coalescing_stats():
+    """Upstream calls made and identical concurrent requests that shared one, per lookup."""
+    return {"enabled": SINGLE_FLIGHT_ENABLED, "lookups": single_flight_stats()}
+
+
 @app.get("/api/submodule-repos")
 async def get_submodule_repos():
     """Get mapping of submodule names to their original repository URLs."""
@@ -249,54 +443,13 @@ async def get_submodule_repos():
     return {"repositories": repo_map}
 
 
-# Global flag to track if indexing is in progress
-_indexing_in_progress = False
-
-def run_indexing():
-    """Run indexing in background thread."""
-    global _indexing_in_progress
-    _indexing_in_progress = True
-    try:
-        search_engine = get_search_engine()
-        
-        if not search_engine.connect_to_meilisearch():
-            print("Error: Could not connect to Meilisearch")
-            return
-        
-        # Check if index already exists and has documents
-        if search_engine.is_indexed():
-            print("Index already exists with documents. Skipping index creation and document indexing.")
-            return
-        
-        # Create index if needed
-        if not search_engine.create_index():
-            print("Error: Could not create index")
-            return
-        
-        # Build index
-        documents = build_index(rebuild=False)
-        
-        if not documents:
-            print("No documents found to index")
-            return
-        
-        # Index documents
-        if search_engine.index_documents(documents):
-            print(f"Successfully indexed {len(documents)} documents")
-        else:
-            print("Error: Failed to index documents")
-    except Exception as e:
-        print(f"Error during indexing: {e}")
-    finally:
-        _indexing_in_progress = False
-
 @app.post("/api/trigger-index")
-async def trigger_index(background_tasks: BackgroundTasks):
-    """Trigger index creation."""
-    global _indexing_in_progress
-    
-    if _indexing_in_progress:
-        return {"message": "Indexing already in progress", "status": "running"}
+async def trigger_index():
+    """Start an indexing job unless the index already has documents."""
+    job_manager = get_job_manager()
+    job = job_manager.active()
+    if job is not None:
+        return {"message": "Indexing already in progress", "status": "running", "job": job}
     
     search_engine = get_search_engine()
     if not search_engine.connect_to_meilisearch():
@@ -306,41 +459,129 @@ async def trigger_index(background_tasks: BackgroundTasks):
     if search_engine.is_indexed():
         return {"message": "Index already exists", "status": "complete"}
     
-    # Start indexing in background thread
-    thread = threading.Thread(target=run_indexing, daemon=True)
-    thread.start()
-    
-    return {"message": "Indexing started", "status": "started"}
+    job, _ = job_manager.start()
+    return {"message": "Indexing started", "status": "started", "job": job}
+
+
+@app.post("/api/index-jobs")
+async def start_index_job(
+    request: Request,
+    rebuild: bool = Query(False, description="Delete the index and build it from scratch"),
+    thumbnails: bool = Query(True, description="Generate thumbnails")
+):
+    """Start an indexing job in a worker process (admin only)."""
+    require_admin(request)
+    job, started = get_job_manager().start(rebuild=rebuild, thumbnails=thumbnails)
+    if not started:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": "An indexing job is already running", "job": job}
+        )
+    return JSONResponse(status_code=202, content=job)
+
+
+@app.get("/api/index-jobs")
+async def list_index_jobs():
+    """Running and past indexing jobs, most recent first."""
+    return {"jobs": get_job_manager().history()}
+
+
+@app.get("/api/index-jobs/{job_id}")
+async def get_index_job(job_id: str):
+    """Progress of one indexing job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/api/index-jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str, request: Request):
+    """Stop a running indexing job and its pending Meilisearch tasks (admin only)."""
+    require_admin(request)
+    job = await in_threadpool(get_job_manager().cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 
 @app.get("/api/index-status")
 async def get_index_status():
     """Check if the index exists and has documents, with progress information."""
-    global _indexing_in_progress
-    
-    search_engine = get_search_engine()
-    
-    if not search_engine.connect_to_meilisearch():
+    status = await get_status_broadcaster().current()
+    if status is None:
         raise HTTPException(status_code=503, detail="Search service unavailable")
+    return status
+
+
+# Comment line sent when nothing changed, so proxies keep the stream open
+STREAM_KEEPALIVE = 15
+
+@app.get("/api/index-status/stream")
+async def index_status_stream():
+    """Server-Sent Events stream of /api/index-status, sent whenever it changes."""
+    broadcaster = get_status_broadcaster()
+    subscription = broadcaster.subscribe()
     
-    progress_info = search_engine.get_indexing_progress()
-    
-    # If indexing is in progress but we can't detect it from Meilisearch tasks,
-    # use our global flag
-    if _indexing_in_progress and not progress_info["indexed"]:
-        progress_info["is_indexing"] = True
-        if progress_info["progress"] == 0:
-            progress_info["progress"] = 5  # Show some progress
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    status = await asyncio.wait_for(subscription.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if status is None:
+                    yield 'event: unavailable\ndata: {"detail": "Search service unavailable"}\n\n'
+                else:
+                    yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
     
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """Stored profiles, most recent first (admin only)."""
+    require_admin(request)
+    paths = sorted(PROFILE_DIR.glob("*.prof"), key=lambda path: path.stat().st_mtime, reverse=True)
     return {
-        "indexed": progress_info["indexed"],
-        "progress": progress_info["progress"],
-        "document_count": progress_info["document_count"],
-        "is_indexing": progress_info["is_indexing"] or _indexing_in_progress,
-        "estimated_time_remaining": progress_info["estimated_time_remaining"],
-        "message": "Index is ready" if progress_info["indexed"] else "Index is being created, please wait..."
+        "profiles": [
+            {"name": path.name, "report": path.with_suffix(".txt").name, "size": path.stat().st_size}
+            for path in paths
+        ]
     }
 
 
+@app.get("/api/admin/profiles/{name}")
+async def get_profile(name: str, request: Request):
+    """Download a stored .prof file or text report (admin only)."""
+    require_admin(request)
+    path = PROFILE_DIR / name
+    if not PROFILE_NAME.match(name) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if path.suffix == ".txt":
+        return PlainTextResponse(path.read_text(encoding="utf-8"))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+
+@app.get("/api/admin/memory")
+async def get_memory_snapshot(request: Request):
+    """Top allocation sites of this worker and their growth since the last call (admin only).
+
+    The first call starts tracing allocations, which slows the worker down
+    until it restarts.
+    """
+    require_admin(request)
+    return await in_threadpool(memory_snapshot)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -53,7 +53,8 @@ if curl -s http://localhost:7700/health > /dev/null; then
     
     # Run indexing
     if command -v uv &> /dev/null; then
-        uv run python -m search index
+        # Only the files changed by the new commits are re-indexed
+        uv run python -m search index --incremental
         echo -e "${GREEN}Index update completed!${NC}"
     else
         echo -e "${RED}Error: 'uv' not found. Cannot run indexer.${NC}"
@@ -2,16 +2,25 @@
 """
 File watcher for automatic database re-indexing.
 Monitors submodule directories for changes and triggers re-indexing.
+
+Events are filtered by file type, coalesced by path and released as one
+batch once the tree has been quiet for WATCH_DEBOUNCE_SECONDS, or at the
+latest WATCH_MAX_LATENCY_SECONDS after the first change of the batch, so a
+long `git pull` cannot postpone indexing indefinitely. Changes that arrive
+while an index run is in progress are kept for the next run.
 """
 
 import os
-import sys
-import time
+import re
 import subprocess
+import threading
+import time
 import logging
 from pathlib import Path
+from typing import List, Optional, Set
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from search.config import SUPPORTED_FILE_TYPES
 
 # Configure logging
 logging.basicConfig(
@@ -21,52 +30,100 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Debounce settings
-DEBOUNCE_SECONDS = 5  # Wait 5 seconds after last change before re-indexing
-last_change_time = None
-reindex_scheduled = False
+DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', '5'))  # Quiet period before re-indexing
+MAX_LATENCY_SECONDS = float(os.getenv('WATCH_MAX_LATENCY_SECONDS', '60'))  # Re-index at the latest this long after a change
+
+# Files the indexer reads: the supported file types, outside of tool and VCS directories
+INCLUDE_PATTERN = re.compile(
+    r'\.(?:%s)$' % '|'.join(
+        re.escape(extension.lstrip('.'))
+        for extensions in SUPPORTED_FILE_TYPES.values()
+        for extension in extensions
+    ),
+    re.IGNORECASE
+)
+IGNORE_PATTERN = re.compile(r'(?:^|[\\/])(?:\.git|__pycache__|\.venv|node_modules|\.idea|\.vscode)(?:[\\/]|$)')
+
+INDEX_COMMAND = ['uv', 'run', 'python', '-m', 'search', 'index', '--incremental']
+
+
+def is_relevant(path: str) -> bool:
+    """Whether a changed path can affect the index."""
+    return bool(INCLUDE_PATTERN.search(path)) and not IGNORE_PATTERN.search(path)
+
+
+class ChangeBatch:
+    """Changed paths waiting to be indexed, deduplicated by path.
+
+    Filled from the observer thread and drained by the main loop.
+    """
+    
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS, max_latency: float = MAX_LATENCY_SECONDS):
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.condition = threading.Condition()
+        self.paths: Set[str] = set()
+        self.first_change: Optional[float] = None
+        self.last_change: Optional[float] = None
+    
+    def add(self, path: str) -> None:
+        with self.condition:
+            now = time.monotonic()
+            if not self.paths:
+                self.first_change = now
+                logger.info(f"Change detected: {path}")
+            self.paths.add(path)
+            self.last_change = now
+            self.condition.notify()
+    
+    def deadline(self) -> Optional[float]:
+        """When the pending batch is due, or None if nothing is pending."""
+        if not self.paths:
+            return None
+        return min(self.last_change + self.debounce, self.first_change + self.max_latency)
+    
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Block until a batch is due and take it. Returns [] on timeout."""
+        end = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                deadline = self.deadline()
+                if deadline is not None and now >= deadline:
+                    paths = sorted(self.paths)
+                    self.paths = set()
+                    self.first_change = self.last_change = None
+                    return paths
+                if end is not None and now >= end:
+                    return []
+                timeouts = [t - now for t in (deadline, end) if t is not None]
+                self.condition.wait(min(timeouts) if timeouts else None)
 
 
 class RepoChangeHandler(FileSystemEventHandler):
     """Handler for file system events in repository directories."""
     
-    def __init__(self):
+    def __init__(self, batch: ChangeBatch):
         super().__init__()
-        self.ignored_patterns = {
-            '.git', '__pycache__', '.pyc', '.pyo', '.pyd',
-            '.so', '.dll', '.dylib', '.DS_Store', '.venv',
-            'node_modules', '.idea', '.vscode'
-        }
-    
-    def should_ignore(self, path):
-        """Check if the path should be ignored."""
-        path_str = str(path)
-        return any(pattern in path_str for pattern in self.ignored_patterns)
+        self.batch = batch
     
     def on_any_event(self, event):
-        """Handle any file system event."""
-        global last_change_time, reindex_scheduled
-        
-        # Ignore directory events and certain file patterns
-        if event.is_directory or self.should_ignore(event.src_path):
+        """Queue the paths of a file event that can affect the index."""
+        if event.is_directory:
             return
         
-        # Update last change time
-        last_change_time = time.time()
-        
-        if not reindex_scheduled:
-            reindex_scheduled = True
-            logger.info(f"Change detected: {event.src_path}")
-            logger.info(f"Re-indexing scheduled in {DEBOUNCE_SECONDS} seconds...")
+        # Moves touch both the old and the new path
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path and is_relevant(os.fsdecode(path)):
+                self.batch.add(os.fsdecode(path))
 
 
-def run_indexer():
-    """Run the search indexer."""
-    global reindex_scheduled
-    
+def run_indexer(paths: List[str]):
+    """Run the search indexer for a batch of changed paths."""
     try:
-        logger.info("Starting re-indexing...")
+        logger.info(f"Starting re-indexing for {len(paths)} changed files...")
         result = subprocess.run(
-            ["uv", "run", "python", "-m", "search", "index"],
+            INDEX_COMMAND,
             capture_output=True,
             text=True,
             check=True
@@ -78,8 +135,6 @@ def run_indexer():
         logger.error(f"Re-indexing failed: {e}")
         if e.stderr:
             logger.error(e.stderr)
-    finally:
-        reindex_scheduled = False
 
 
 def get_submodule_dirs():
@@ -90,7 +145,7 @@ def get_submodule_dirs():
     # Find all directories starting with 'awesome-' or 'Awesome-'
     for item in base_dir.iterdir():
         if item.is_dir() and (
-            item.name.startswith('awesome-') or 
+            item.name.startswith('awesome-') or
             item.name.startswith('Awesome-')
         ):
             submodule_dirs.append(item)
@@ -101,8 +156,6 @@ def get_submodule_dirs():
 
 def main():
     """Main function to start the file watcher."""
-    global last_change_time
-    
     logger.info("Starting file watcher for auto re-indexing...")
     
     # Get directories to watch
@@ -113,7 +166,8 @@ def main():
         return
     
     # Create observer and event handler
-    event_handler = RepoChangeHandler()
+    batch = ChangeBatch()
+    event_handler = RepoChangeHandler(batch)
     observer = Observer()
     
     # Schedule observers for each directory
@@ -123,18 +177,13 @@ def main():
     # Start observer
     observer.start()
     logger.info(f"Watching {len(watch_dirs)} directories for changes...")
+    logger.info(f"Re-indexing {DEBOUNCE_SECONDS:g}s after the last change, at most {MAX_LATENCY_SECONDS:g}s after the first")
     logger.info("Press Ctrl+C to stop.")
     
     try:
         while True:
-            time.sleep(1)
-            
-            # Check if we should trigger re-indexing
-            if reindex_scheduled and last_change_time:
-                time_since_change = time.time() - last_change_time
-                if time_since_change >= DEBOUNCE_SECONDS:
-                    run_indexer()
-                    last_change_time = None
+            # Changes made while the indexer runs accumulate in the next batch
+            run_indexer(batch.wait())
     
     except KeyboardInterrupt:
         logger.info("Stopping file watcher...")